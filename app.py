@@ -20,9 +20,28 @@ from modules.platform_tasks import PlatformTasks
 from modules.content_creator import ContentCreator
 from modules.account_manager import AccountManager
 from modules.marketing_analyzer import MarketingAnalyzer
+from modules.main_image_renderer import MainImageRenderer
+from modules.watermark_remover import WatermarkRemover
+from modules.image_hash_index import ImageHashIndex
+from modules.reply_matcher import ReplyMatcher
+from modules.analytics_rollup import AnalyticsRollup
+from modules.hot_trend import HotTrendEngine
+from modules.performance_scorer import PerformanceScorer
+from modules.price_engine import PriceEngine
+from modules.matrix_planner import MatrixPlanner
+from modules.account_sessions import AccountSessions
+from modules.task_scheduler import TaskScheduler
+from modules.order_watcher import OrderWatcher
+from modules.account_cloner import AccountCloner
+from modules.shop_crawler import ShopCrawler
+from modules.product_search import ProductSearch
+from modules.account_health import AccountHealth
+from modules.response_cache import response_cache
+from modules.serialization import BSONJSONProvider
 
 # 配置应用
 app = Flask(__name__)
+app.json = BSONJSONProvider(app)
 CORS(app)
 
 # 配置JWT
@@ -30,33 +49,57 @@ app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET', 'xianyu-tool-secret-
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 86400  # 1天过期
 jwt = JWTManager(app)
 
-# 配置日志
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-handler = RotatingFileHandler('logs/app.log', maxBytes=10000000, backupCount=10)
-handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-handler.setLevel(logging.INFO)
-app.logger.addHandler(handler)
-app.logger.setLevel(logging.INFO)
-
-# 连接数据库
-client = MongoClient('mongodb://localhost:27017/')
-db = client['xianyu_tool']
-
-# 初始化各模块
-product_manager = ProductManager(db)
-order_processor = OrderProcessor(db)
-customer_service = CustomerService(db)
-platform_tasks = PlatformTasks(db)
-content_creator = ContentCreator(db)
-account_manager = AccountManager(db)
-marketing_analyzer = MarketingAnalyzer(db)
+# 主图渲染和去水印进程池以 spawn 方式启动，子进程会以 __mp_main__ 导入本文件；
+# 日志、数据库连接和各模块（含批量写入线程）只在 Web 进程中初始化
+if __name__ != '__mp_main__':
+    # 配置日志
+    if not os.path.exists('logs'):
+        os.mkdir('logs')
+    handler = RotatingFileHandler('logs/app.log', maxBytes=10000000, backupCount=10)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    ))
+    handler.setLevel(logging.INFO)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(logging.INFO)
+
+    # 连接数据库
+    client = MongoClient('mongodb://localhost:27017/')
+    db = client['xianyu_tool']
+
+    # 初始化各模块
+    product_manager = ProductManager(db)
+    order_processor = OrderProcessor(db, product_manager)
+    customer_service = CustomerService(db)
+    platform_tasks = PlatformTasks(db)
+    content_creator = ContentCreator(db)
+    account_manager = AccountManager(db)
+    marketing_analyzer = MarketingAnalyzer(db)
+    image_hash_index = ImageHashIndex(db)
+    main_image_renderer = MainImageRenderer(db, image_hash_index)
+    watermark_remover = WatermarkRemover(db, image_hash_index)
+    reply_matcher = ReplyMatcher(db)
+    analytics_rollup = AnalyticsRollup(db)
+    hot_trend = HotTrendEngine(db)
+    performance_scorer = PerformanceScorer(db)
+    price_engine = PriceEngine(db, product_manager)
+    matrix_planner = MatrixPlanner(db, product_manager)
+    account_sessions = AccountSessions(product_manager)
+    task_scheduler = TaskScheduler(db, account_sessions)
+    order_watcher = OrderWatcher(db, account_sessions, order_processor)
+    account_cloner = AccountCloner(db)
+    shop_crawler = ShopCrawler(db, product_manager)
+    product_search = ProductSearch(db)
+    account_health = AccountHealth(db)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'ok',
+        'timestamp': datetime.now().isoformat(),
+        'write_buffer': product_manager.write_buffer.get_stats(),
+        'category_cache': product_manager.category_resolver.get_stats()
+    })
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -102,10 +145,18 @@ def register():
 # 产品管理API路由
 @app.route('/api/products', methods=['GET'])
 @jwt_required()
+@response_cache.cached('products', scopes=('products',))
 def get_products():
     username = get_jwt_identity()
     return product_manager.get_products(username)
 
+@app.route('/api/products/search', methods=['GET'])
+@jwt_required()
+@response_cache.cached('products_search', scopes=('products',))
+def search_products():
+    username = get_jwt_identity()
+    return product_search.search(username, request.args)
+
 @app.route('/api/products', methods=['POST'])
 @jwt_required()
 def add_product():
@@ -140,12 +191,68 @@ def batch_publish():
     data = request.json
     return product_manager.batch_publish(username, data)
 
+@app.route('/api/products/batch/description', methods=['POST'])
+@jwt_required()
+def batch_update_descriptions():
+    username = get_jwt_identity()
+    data = request.json
+    return product_manager.batch_update_descriptions(username, data)
+
+@app.route('/api/products/performance/score', methods=['POST'])
+@jwt_required()
+def score_products():
+    username = get_jwt_identity()
+    data = request.json or {}
+    return performance_scorer.score_products(username, data)
+
+@app.route('/api/products/performance/mark-offline', methods=['POST'])
+@jwt_required()
+def mark_poor_products_offline():
+    username = get_jwt_identity()
+    data = request.json or {}
+    return performance_scorer.mark_poor_offline(username, data)
+
+@app.route('/api/products/batch/price', methods=['POST'])
+@jwt_required()
+def batch_adjust_prices():
+    username = get_jwt_identity()
+    data = request.json
+    return price_engine.adjust_prices(username, data)
+
+@app.route('/api/products/<product_id>/price_history', methods=['GET'])
+@jwt_required()
+def get_price_history(product_id):
+    username = get_jwt_identity()
+    return price_engine.get_price_history(username, product_id)
+
 @app.route('/api/products/hot', methods=['GET'])
 @jwt_required()
 def get_hot_products():
     username = get_jwt_identity()
     keywords = request.args.get('keywords')
-    return product_manager.get_hot_products(username, keywords)
+    mode = request.args.get('mode', 'auto')  # auto 优先截获接口数据，dom 只解析页面
+    return product_manager.get_hot_products(username, keywords, mode)
+
+# 店铺采集API路由
+@app.route('/api/shops', methods=['GET'])
+@jwt_required()
+def get_shops():
+    username = get_jwt_identity()
+    return shop_crawler.get_shops(username)
+
+@app.route('/api/shops/crawl', methods=['POST'])
+@jwt_required()
+def crawl_shops():
+    username = get_jwt_identity()
+    data = request.json
+    return shop_crawler.crawl_shops(username, data)
+
+@app.route('/api/shops/<shop_id>/items', methods=['GET'])
+@jwt_required()
+def get_shop_items(shop_id):
+    username = get_jwt_identity()
+    status = request.args.get('status', 'active')
+    return shop_crawler.get_shop_items(username, shop_id, status)
 
 # 订单处理API路由
 @app.route('/api/orders', methods=['GET'])
@@ -154,6 +261,13 @@ def get_orders():
     username = get_jwt_identity()
     return order_processor.get_orders(username)
 
+@app.route('/api/orders/events', methods=['GET'])
+@jwt_required()
+def get_order_events():
+    username = get_jwt_identity()
+    events = list(db.order_events.find({'username': username}, {'_id': 0}).sort('created_at', -1).limit(200))
+    return jsonify({'success': True, 'events': events})
+
 @app.route('/api/orders/ship', methods=['POST'])
 @jwt_required()
 def ship_orders():
@@ -184,6 +298,7 @@ def reply_message():
 
 @app.route('/api/templates', methods=['GET'])
 @jwt_required()
+@response_cache.cached('templates', scopes=('templates',))
 def get_templates():
     username = get_jwt_identity()
     return customer_service.get_templates(username)
@@ -193,7 +308,21 @@ def get_templates():
 def add_template():
     username = get_jwt_identity()
     data = request.json
-    return customer_service.add_template(username, data)
+    response = customer_service.add_template(username, data)
+    reply_matcher.invalidate(username)
+    response_cache.bump(username, 'templates')
+    return response
+
+@app.route('/api/templates/match', methods=['POST'])
+@jwt_required()
+def match_reply_template():
+    username = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    message = data.get('message') if isinstance(data, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return jsonify({'success': False, 'message': '未提供买家消息'}), 400
+    template = reply_matcher.match(username, message)
+    return jsonify({'success': True, 'template': template})
 
 # 平台任务API路由
 @app.route('/api/tasks/daily', methods=['POST'])
@@ -209,8 +338,23 @@ def polish_products():
     data = request.json
     return platform_tasks.polish_products(username, data)
 
+@app.route('/api/tasks/schedule', methods=['POST'])
+@jwt_required()
+def schedule_tasks():
+    username = get_jwt_identity()
+    data = request.json
+    return task_scheduler.schedule(username, data)
+
+@app.route('/api/tasks/schedule/report', methods=['GET'])
+@jwt_required()
+def get_schedule_report():
+    username = get_jwt_identity()
+    date = request.args.get('date')
+    return task_scheduler.get_report(username, date)
+
 @app.route('/api/stats', methods=['GET'])
 @jwt_required()
+@response_cache.cached('stats', scopes=('products', 'orders'))
 def get_shop_stats():
     username = get_jwt_identity()
     return platform_tasks.get_shop_stats(username)
@@ -226,6 +370,18 @@ def create_main_image():
     template_id = request.form.get('template_id')
     return content_creator.create_main_image(username, file, template_id)
 
+@app.route('/api/images/main/batch', methods=['POST'])
+@jwt_required()
+def create_main_images_batch():
+    username = get_jwt_identity()
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({'success': False, 'message': '没有上传图片'}), 400
+    template_id = request.form.get('template_id')
+    output = request.form.get('output', 'zip')  # zip 或 materials
+    fields = request.form.get('fields', '[]')
+    return main_image_renderer.render_batch(username, files, template_id, output, fields)
+
 @app.route('/api/images/watermark', methods=['POST'])
 @jwt_required()
 def remove_watermark():
@@ -235,6 +391,13 @@ def remove_watermark():
     file = request.files['image']
     return content_creator.remove_watermark(username, file)
 
+@app.route('/api/images/watermark/batch', methods=['POST'])
+@jwt_required()
+def remove_watermark_batch():
+    username = get_jwt_identity()
+    data = request.json
+    return watermark_remover.batch_remove(username, data)
+
 @app.route('/api/materials', methods=['GET'])
 @jwt_required()
 def get_materials():
@@ -249,7 +412,37 @@ def add_material():
         return jsonify({'success': False, 'message': '没有上传文件'}), 400
     file = request.files['file']
     category = request.form.get('category')
-    return content_creator.add_material(username, file, category)
+    started = datetime.now()
+    response = content_creator.add_material(username, file, category)
+    image_hash_index.index_new(username, started)
+    return response
+
+@app.route('/api/materials/<material_id>', methods=['DELETE'])
+@jwt_required()
+def delete_material(material_id):
+    username = get_jwt_identity()
+    return image_hash_index.delete_material(username, material_id)
+
+@app.route('/api/materials/similar', methods=['POST'])
+@jwt_required()
+def find_similar_materials():
+    username = get_jwt_identity()
+    try:
+        max_distance = int(request.form.get('max_distance', 10))
+    except (TypeError, ValueError):
+        max_distance = -1
+    if not 0 <= max_distance <= 64:
+        return jsonify({'success': False, 'message': 'max_distance 必须是 0 到 64 之间的整数'}), 400
+    if 'file' in request.files:
+        file = request.files['file']
+        temp_path = f"/tmp/{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
+        file.save(temp_path)
+        try:
+            return image_hash_index.find_similar(username, path=temp_path, max_distance=max_distance)
+        finally:
+            os.remove(temp_path)
+    material_id = request.form.get('material_id')
+    return image_hash_index.find_similar(username, material_id=material_id, max_distance=max_distance)
 
 # 账号管理API路由
 @app.route('/api/accounts', methods=['GET'])
@@ -265,34 +458,60 @@ def add_account():
     data = request.json
     return account_manager.add_account(username, data)
 
+@app.route('/api/accounts/health', methods=['GET'])
+@jwt_required()
+def get_account_health():
+    username = get_jwt_identity()
+    return account_health.get_health(username)
+
+@app.route('/api/accounts/<account_id>/health/reset', methods=['POST'])
+@jwt_required()
+def reset_account_health(account_id):
+    username = get_jwt_identity()
+    return account_health.reset(username, account_id)
+
 @app.route('/api/accounts/clone', methods=['POST'])
 @jwt_required()
 def clone_accounts():
     username = get_jwt_identity()
     data = request.json
-    return account_manager.clone_accounts(username, data)
+    return account_cloner.clone_accounts(username, data)
 
 # 营销分析API路由
 @app.route('/api/analytics/hot', methods=['GET'])
 @jwt_required()
+@response_cache.cached('analytics_hot', per_user=False, ttl=60)
 def get_hot_analysis():
     username = get_jwt_identity()
-    category = request.args.get('category')
-    return marketing_analyzer.get_hot_analysis(username, category)
+    # 排名按采集时的搜索关键词分组，兼容旧的 category 参数
+    keyword = request.args.get('keyword') or request.args.get('category')
+    return hot_trend.get_hot_analysis(username, keyword)
 
 @app.route('/api/analytics/conversion', methods=['GET'])
 @jwt_required()
+@response_cache.cached('analytics_conversion', scopes=('products', 'orders'), ttl=60)
 def get_conversion_analysis():
     username = get_jwt_identity()
     product_id = request.args.get('product_id')
-    return marketing_analyzer.get_conversion_analysis(username, product_id)
+    days = request.args.get('days', 30)
+    return analytics_rollup.get_conversion_analysis(username, product_id, days)
+
+@app.route('/api/analytics/conversion/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_conversion_rollups():
+    username = get_jwt_identity()
+    return analytics_rollup.rebuild(username)
 
 @app.route('/api/analytics/matrix', methods=['POST'])
 @jwt_required()
 def generate_matrix_strategy():
     username = get_jwt_identity()
     data = request.json
-    return marketing_analyzer.generate_matrix_strategy(username, data)
+    return matrix_planner.generate_matrix_strategy(username, data)
 
 if __name__ == '__main__':
+    # 后台线程只在主进程启动，渲染进程池以 spawn 方式导入本模块时不会重复启动
+    task_scheduler.start()
+    order_watcher.start()
+    product_search.start()
     app.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""爆品排名基准测试：rank() 端到端耗时，包括读取快照、构建DataFrame、计算得分、取展示信息和写入排名"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.hot_trend import HotTrendEngine, WINDOW_HOURS  # noqa: E402
+
+
+class FakeCursor(list):
+    def sort(self, *args, **kwargs):
+        return self
+
+
+class FakeCollection:
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.written = 0
+
+    def aggregate(self, pipeline, **kwargs):
+        return iter(self.rows)
+
+    def find(self, query, *args, **kwargs):
+        ids = query['item_id']['$in']
+        return FakeCursor({'item_id': item_id, 'title': f'商品{item_id}'} for item_id in ids)
+
+    def find_one(self, query, *args, **kwargs):
+        return None
+
+    def bulk_write(self, operations, **kwargs):
+        self.written += len(operations)
+
+
+class FakeDB:
+    pass
+
+
+def benchmark(items=100000, samples=6, keywords=20):
+    rng = np.random.default_rng(0)
+    now = datetime.now()
+    ages = np.sort(rng.uniform(0, WINDOW_HOURS * 3600, (items, samples)), axis=1)[:, ::-1]
+    wants = np.cumsum(rng.integers(0, 20, (items, samples)), axis=1)
+    item_keywords = rng.integers(0, keywords, items)
+    rows = [{
+        'item_id': str(i),
+        'keyword': str(item_keywords[i]),
+        't': now - timedelta(seconds=float(ages[i, j])),
+        'w': int(wants[i, j])
+    } for i in range(items) for j in range(samples)]
+
+    db = FakeDB()
+    db.hot_item_series = FakeCollection(rows)
+    db.analytics = FakeCollection()
+    engine = HotTrendEngine(db)
+
+    start = time.perf_counter()
+    engine.rank(force=True)
+    print(f'{items} 个商品、{len(rows)} 个快照、{db.analytics.written} 个排名，'
+          f'rank() 耗时 {time.perf_counter() - start:.3f}s')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""商品搜索基准测试：在本地 mongod（MONGO_URI 可覆盖）的临时库中生成商品，统计一次搜索的端到端耗时，
+p99 需在 50ms 以内"""
+
+import os
+import sys
+import time
+import uuid
+import random
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, ASCENDING, DESCENDING
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.product_search import ProductSearch, index_fields  # noqa: E402
+
+TARGET_P99_MS = 50
+
+
+def benchmark(count=100000, queries=200):
+    random.seed(0)
+    chars = '九成新二手手机电脑键盘显示器耳机相机镜头书籍衣服鞋包包邮自提全新正品'
+    categories = ['数码', '电脑', '图书', '服饰', '家居']
+    statuses = ['draft', 'published', 'failed']
+    now = datetime.now()
+
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    db = client[f'xianyu_tool_bench_{uuid.uuid4().hex[:8]}']
+    try:
+        db.products.create_index([('username', ASCENDING), ('search_tokens', ASCENDING)])
+        db.products.create_index([('username', ASCENDING), ('updated_at', DESCENDING)])
+        batch = []
+        for i in range(count):
+            product = {
+                'username': 'bench',
+                'title': ''.join(random.choices(chars, k=random.randint(8, 20))),
+                'description': ''.join(random.choices(chars, k=60)),
+                'category': random.choice(categories),
+                'status': random.choice(statuses),
+                'price': round(random.uniform(1, 2000), 2),
+                'updated_at': now - timedelta(seconds=i)
+            }
+            product.update(index_fields(product))
+            batch.append(product)
+            if len(batch) >= 10000:
+                db.products.insert_many(batch)
+                batch = []
+        if batch:
+            db.products.insert_many(batch)
+
+        search = ProductSearch(db)
+        terms = [''.join(random.choices(chars, k=random.randint(2, 4))) for _ in range(queries)]
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            search.query('bench', {'q': term})
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        search.query('bench', {})
+        unfiltered = time.perf_counter() - start
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+    timings.sort()
+    p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000
+    print(f'{count} 个商品，{queries} 次关键词搜索')
+    print(f'平均 {sum(timings) / len(timings) * 1000:.1f}ms，'
+          f'p99 {p99:.1f}ms，'
+          f'无关键词 {unfiltered * 1000:.1f}ms')
+    print(f"p99 目标 {TARGET_P99_MS}ms：{'达标' if p99 <= TARGET_P99_MS else '未达标'}")
+    return p99 <= TARGET_P99_MS
+
+
+if __name__ == '__main__':
+    sys.exit(0 if benchmark() else 1)
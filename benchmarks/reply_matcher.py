@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""自动回复匹配微基准测试：输出每秒可匹配的消息数"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.reply_matcher import ReplyMatcher  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, *args, **kwargs):
+        return [dict(d) for d in self.docs]
+
+    def find_one(self, query, *args, **kwargs):
+        return None
+
+    def count_documents(self, query):
+        return len(self.docs)
+
+
+class FakeDB:
+    pass
+
+
+def benchmark(template_count=5000, message_count=100000):
+    random.seed(0)
+    chars = '的一是不了在人有我他这个们中来上大为和国地到以说时要就出也得里后自'
+    docs = [{
+        '_id': i,
+        'type': 'reply',
+        'name': f'模板{i}',
+        'content': f'回复{i}',
+        'keywords': [''.join(random.choices(chars, k=random.randint(2, 4))) for _ in range(3)],
+        'priority': random.randint(0, 3)
+    } for i in range(template_count)]
+    messages = [''.join(random.choices(chars, k=random.randint(10, 60))) for _ in range(1000)]
+
+    db = FakeDB()
+    db.templates = FakeCollection(docs)
+    matcher = ReplyMatcher(db)
+
+    start = time.perf_counter()
+    matcher._get_compiled('bench')
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(message_count):
+        matcher.match('bench', messages[i % len(messages)])
+    elapsed = time.perf_counter() - start
+
+    print(f'{template_count} 个模板编译耗时 {compile_time:.3f}s')
+    print(f'{message_count} 条消息耗时 {elapsed:.2f}s，{message_count / elapsed:.0f} 条/秒')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""序列化基准测试：比较标准库与当前编码器序列化1万个文档的耗时"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId, Decimal128
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.serialization import default, dumps, orjson  # noqa: E402
+
+
+def benchmark(count=10000):
+    docs = [{
+        '_id': ObjectId(),
+        'username': 'admin',
+        'account_id': ObjectId(),
+        'title': f'测试商品{i}',
+        'price': Decimal128(f'{i}.99'),
+        'tags': ['数码', '二手'],
+        'images': [f'https://img.example.com/{i}.jpg'],
+        'created_at': datetime.now(),
+        'updated_at': datetime.now()
+    } for i in range(count)]
+
+    def legacy():
+        # 原有方式：逐条转换 _id 后再用标准库编码
+        converted = []
+        for doc in docs:
+            doc = dict(doc)
+            doc['_id'] = str(doc['_id'])
+            doc['account_id'] = str(doc['account_id'])
+            converted.append(doc)
+        return json.dumps({'success': True, 'products': converted}, default=default)
+
+    for name, func in (('json', legacy), ('orjson' if orjson else 'json(fallback)',
+                                          lambda: dumps({'success': True, 'products': docs}))):
+        start = time.perf_counter()
+        for _ in range(5):
+            func()
+        print(f'{name}: {(time.perf_counter() - start) / 5 * 1000:.1f}ms / {count} 个文档')
+
+
+if __name__ == '__main__':
+    benchmark()
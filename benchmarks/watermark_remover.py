@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""批量去水印基准测试：输出每核每秒处理图片数"""
+
+import os
+import sys
+import time
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.watermark_remover import WatermarkRemover  # noqa: E402
+
+
+def benchmark(count=200, size=(800, 800), workers=None):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, 'in')
+        os.makedirs(input_dir)
+        for i in range(count):
+            img = rng.integers(0, 200, size + (3,), dtype=np.uint8)
+            cv2.putText(img, 'xianyu', (size[1] - 260, size[0] - 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 4)
+            cv2.imwrite(os.path.join(input_dir, f'{i}.jpg'), img)
+
+        remover = WatermarkRemover(None, workers=workers)
+        paths = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir))
+        start = time.perf_counter()
+        remover.remove_folder(paths, os.path.join(tmp, 'out'))
+        elapsed = time.perf_counter() - start
+
+    per_second = count / elapsed
+    print(f'{count} 张图片，{remover.workers} 个进程，耗时 {elapsed:.2f}s')
+    print(f'{per_second:.1f} 张/秒，{per_second / remover.workers:.1f} 张/秒/核')
+
+
+if __name__ == '__main__':
+    benchmark()
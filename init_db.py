@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 import os
@@ -44,7 +44,7 @@ def init_db():
         db.create_collection('orders')
         db.orders.create_index([('username', ASCENDING)])
         db.orders.create_index([('account_id', ASCENDING)])
-        db.orders.create_index([('order_id', ASCENDING)], unique=True)
+        db.orders.create_index([('order_id', ASCENDING)])
         db.orders.create_index([('created_at', ASCENDING)])
     
     # 创建账号集合
@@ -66,6 +66,9 @@ def init_db():
                 'username': 'admin',
                 'type': 'reply',
                 'name': '商品价格咨询',
+                'keywords': ['价格', '多少钱', '便宜', '优惠', '砍价', '包邮'],
+                'synonyms': {'多少钱': ['几块钱', '什么价']},
+                'priority': 1,
                 'content': '您好，该商品的价格是¥{price}，目前处于促销阶段，欢迎下单',
                 'created_at': datetime.now()
             },
@@ -73,6 +76,8 @@ def init_db():
                 'username': 'admin',
                 'type': 'reply',
                 'name': '商品库存咨询',
+                'keywords': ['有货', '库存', '还在吗', '还有吗', '在吗'],
+                'priority': 0,
                 'content': '您好，该商品目前有货，可以直接下单，我们会尽快安排发货',
                 'created_at': datetime.now()
             },
@@ -80,6 +85,8 @@ def init_db():
                 'username': 'admin',
                 'type': 'reply',
                 'name': '商品质量咨询',
+                'keywords': ['质量', '正品', '新的', '退换', '保修'],
+                'priority': 1,
                 'content': '您好，我们的商品都经过严格质检，请您放心购买，支持收货后七天内无理由退换',
                 'created_at': datetime.now()
             },
@@ -114,6 +121,12 @@ def init_db():
         db.materials.create_index([('username', ASCENDING)])
         db.materials.create_index([('type', ASCENDING)])
         db.materials.create_index([('created_at', ASCENDING)])
+
+    # 创建素材索引版本集合
+    if 'material_index' not in db.list_collection_names():
+        print("创建素材索引版本集合...")
+        db.create_collection('material_index')
+        db.material_index.create_index([('username', ASCENDING)], unique=True)
     
     # 创建分析数据集合
     if 'analytics' not in db.list_collection_names():
@@ -123,6 +136,88 @@ def init_db():
         db.analytics.create_index([('type', ASCENDING)])
         db.analytics.create_index([('created_at', ASCENDING)])
     
+    # 后续新增的索引放在存在性检查之外，升级已有数据库时同样会创建（create_index 是幂等的）
+    db.products.create_index([('updated_at', ASCENDING)])
+    db.orders.create_index([('updated_at', ASCENDING)])
+    db.analytics.create_index([('username', ASCENDING), ('type', ASCENDING), ('day', ASCENDING)])
+    db.materials.create_index([('username', ASCENDING), ('phash', ASCENDING)])
+    db.products.create_index([('username', ASCENDING), ('performance.score', ASCENDING)])
+    db.orders.create_index([('username', ASCENDING), ('title', ASCENDING)])
+    # 订单号在账号内唯一，不同账号的订单不会互相覆盖；旧版本的订单号全局唯一索引改为普通索引
+    if db.orders.index_information().get('order_id_1', {}).get('unique'):
+        db.orders.drop_index('order_id_1')
+        db.orders.create_index([('order_id', ASCENDING)])
+    db.orders.create_index([('account_id', ASCENDING), ('order_id', ASCENDING)], unique=True)
+    db.products.create_index([('username', ASCENDING), ('search_tokens', ASCENDING)])
+    db.products.create_index([('username', ASCENDING), ('search_version', ASCENDING)])
+    db.products.create_index([('username', ASCENDING), ('updated_at', DESCENDING)])
+    db.analytics.create_index([('type', ASCENDING), ('keyword', ASCENDING)])
+    db.products.create_index([('username', ASCENDING), ('account_id', ASCENDING)])
+    
+    # 创建自动化任务队列集合
+    if 'automation_jobs' not in db.list_collection_names():
+        print("创建自动化任务集合...")
+        db.create_collection('automation_jobs')
+        db.automation_jobs.create_index([('status', ASCENDING), ('account_id', ASCENDING), ('created_at', ASCENDING)])
+        db.automation_jobs.create_index([('status', ASCENDING), ('lease_until', ASCENDING)])
+        db.automation_jobs.create_index([('username', ASCENDING), ('created_at', ASCENDING)])
+    
+    if 'account_leases' not in db.list_collection_names():
+        db.create_collection('account_leases')
+        db.account_leases.create_index([('worker', ASCENDING), ('lease_until', ASCENDING)])
+    
+    # 创建订单变更事件集合
+    if 'order_events' not in db.list_collection_names():
+        print("创建订单事件集合...")
+        db.create_collection('order_events')
+        db.order_events.create_index([('username', ASCENDING), ('created_at', ASCENDING)])
+    
+    # 创建定时任务集合
+    if 'scheduled_jobs' not in db.list_collection_names():
+        print("创建定时任务集合...")
+        db.create_collection('scheduled_jobs')
+        db.scheduled_jobs.create_index([('account_id', ASCENDING), ('kind', ASCENDING), ('date', ASCENDING)], unique=True)
+        db.scheduled_jobs.create_index([('status', ASCENDING), ('run_at', ASCENDING)])
+        db.scheduled_jobs.create_index([('username', ASCENDING), ('date', ASCENDING)])
+    
+    # 创建价格历史集合（字段名缩写以节省空间：p商品ID u用户 o原价 n新价 t时间）
+    if 'price_history' not in db.list_collection_names():
+        print("创建价格历史集合...")
+        db.create_collection('price_history')
+        db.price_history.create_index([('p', ASCENDING), ('t', ASCENDING)])
+    
+    # 创建爆品快照集合（每个商品每天一个文档）
+    if 'hot_item_series' not in db.list_collection_names():
+        print("创建爆品快照集合...")
+        db.create_collection('hot_item_series')
+        db.hot_item_series.create_index([('day', ASCENDING)])
+        db.hot_item_series.create_index([('item_id', ASCENDING), ('day', ASCENDING)])
+    
+    # 创建分类路径集合
+    if 'category_paths' not in db.list_collection_names():
+        print("创建分类路径集合...")
+        db.create_collection('category_paths')
+        db.category_paths.create_index([('path', ASCENDING)], unique=True)
+    
+    # 创建店铺采集集合
+    if 'shop_items' not in db.list_collection_names():
+        print("创建店铺采集集合...")
+        db.create_collection('shop_items')
+        db.shop_items.create_index([('shop_id', ASCENDING), ('item_id', ASCENDING)], unique=True)
+        db.shop_items.create_index([('shop_id', ASCENDING), ('status', ASCENDING), ('want_count', DESCENDING)])
+    
+    # 创建店铺列表快照集合
+    if 'shop_pages' not in db.list_collection_names():
+        print("创建店铺列表快照集合...")
+        db.create_collection('shop_pages')
+        db.shop_pages.create_index([('shop_id', ASCENDING), ('page', ASCENDING)], unique=True)
+    
+    # 创建店铺集合
+    if 'shops' not in db.list_collection_names():
+        print("创建店铺集合...")
+        db.create_collection('shops')
+        db.shops.create_index([('usernames', ASCENDING), ('last_crawl_at', DESCENDING)])
+    
     print("数据库初始化完成")
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import datetime
+from flask import jsonify
+from bson import ObjectId
+from bson.errors import InvalidId
+from modules.response_cache import response_cache
+from modules.product_search import ProductSearch
+
+
+class AccountCloner:
+    """账号克隆：在数据库服务端用聚合管道复制商品到目标账号，不经过应用服务器"""
+
+    def __init__(self, db):
+        self.db = db
+        self.product_search = ProductSearch(db)
+
+    def build_pipeline(self, username, source_account_id, targets, price_factor=1.0, price_offset=0.0):
+        """targets 为 [{'account_id': ..., 'prefix': ..., 'suffix': ...}]"""
+        # 时间与其它写入一致使用本地时间，$$NOW 是 UTC
+        now = datetime.now()
+        return [
+            {'$match': {'username': username, 'account_id': source_account_id}},
+            {'$set': {'_target': {'$literal': targets}, 'cloned_from': '$_id'}},
+            {'$unwind': '$_target'},
+            {'$unset': ['_id', 'item_id', 'performance', 'search_version', 'published_at']},
+            {'$set': {
+                'account_id': '$_target.account_id',
+                'status': 'draft',
+                'created_at': now,
+                'updated_at': now,
+                'price': {'$max': [
+                    0.01,
+                    {'$round': [{'$add': [
+                        {'$multiply': [{'$ifNull': ['$price', 0]}, price_factor]},
+                        price_offset
+                    ]}, 2]}
+                ]},
+                'title': {'$concat': ['$_target.prefix', {'$ifNull': ['$title', '']}, '$_target.suffix']}
+            }},
+            {'$unset': '_target'},
+            {'$merge': {'into': 'products', 'whenMatched': 'fail', 'whenNotMatched': 'insert'}}
+        ]
+
+    def clone_accounts(self, username, data):
+        """把源账号的商品克隆到多个目标账号，可选价格偏移和标题变体"""
+        try:
+            source_account_id = data.get('source_account_id')
+            target_account_ids = data.get('target_account_ids', [])
+
+            if not source_account_id or not target_account_ids:
+                return jsonify({
+                    'success': False,
+                    'message': '未提供源账号或目标账号'
+                }), 400
+
+            if source_account_id in target_account_ids:
+                return jsonify({
+                    'success': False,
+                    'message': '目标账号不能包含源账号'
+                }), 400
+
+            account_ids = [source_account_id] + list(target_account_ids)
+            try:
+                object_ids = [ObjectId(aid) for aid in account_ids]
+            except (InvalidId, TypeError):
+                return jsonify({
+                    'success': False,
+                    'message': '账号ID格式错误'
+                }), 400
+            owned = self.db.accounts.count_documents({
+                '_id': {'$in': object_ids},
+                'username': username
+            })
+            if owned != len(set(account_ids)):
+                return jsonify({
+                    'success': False,
+                    'message': '账号不存在或无权限使用'
+                }), 404
+
+            # 标题变体按目标账号轮流使用
+            variants = data.get('title_variants') or [{}]
+            targets = []
+            for index, account_id in enumerate(target_account_ids):
+                variant = variants[index % len(variants)]
+                targets.append({
+                    'account_id': account_id,
+                    'prefix': variant.get('prefix', ''),
+                    'suffix': variant.get('suffix', '')
+                })
+
+            start = time.perf_counter()
+            source_count = self.db.products.count_documents({
+                'username': username,
+                'account_id': source_account_id
+            })
+            self.db.products.aggregate(self.build_pipeline(
+                username,
+                source_account_id,
+                targets,
+                float(data.get('price_factor', 1.0)),
+                float(data.get('price_offset', 0.0))
+            ), allowDiskUse=True)
+            # 克隆后标题带前后缀，为新商品建立词元
+            self.product_search.refresh(username)
+            elapsed = time.perf_counter() - start
+            response_cache.bump(username, 'products')
+
+            return jsonify({
+                'success': True,
+                'message': f'已将 {source_count} 个商品克隆到 {len(targets)} 个账号',
+                'count': source_count * len(targets),
+                'seconds': round(elapsed, 3)
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'账号克隆失败: {str(e)}'
+            }), 500
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+from flask import jsonify
+from bson import ObjectId
+from modules.retry_policy import AUTH, PLATFORM_REJECTION, SELECTOR_MISSING
+
+FAILURE_THRESHOLD = 3     # 连续失败多少次后熔断
+OPEN_SECONDS = 300        # 首次熔断时长，连续熔断时翻倍
+MAX_OPEN_SECONDS = 3600
+PROBE_SECONDS = 300       # 半开探测的占用时长，超时未回报视为探测丢失
+EWMA_ALPHA = 0.2
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+ITEM_KINDS = {PLATFORM_REJECTION, SELECTOR_MISSING}  # 只和单个商品或订单有关的错误类别
+
+
+def account_ok(success, error_kind, step=None):
+    """账号本身是否正常：登录之后单个商品或订单的平台拒绝、页面元素缺失不算账号故障"""
+    if success:
+        return True
+    return step != 'login' and error_kind in ITEM_KINDS
+
+
+def _available(health, now):
+    state = health.get('state', CLOSED)
+    if state == OPEN:
+        return health['open_until'] <= now
+    if state == HALF_OPEN:
+        return health.get('probe_until', now) <= now
+    return True
+
+
+class AccountHealth:
+    """账号健康度与熔断：健康信息存放在账号文档的 health 字段，连续失败后熔断，冷却后放行一次半开探测"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _health(self, account_id):
+        account = self.db.accounts.find_one({'_id': ObjectId(account_id)}, {'health': 1})
+        return (account or {}).get('health') or {}
+
+    def available(self, account_id, now=None):
+        """是否可以向该账号派发任务（不占用半开探测）"""
+        return _available(self._health(account_id), now or datetime.now())
+
+    def allow(self, account_id):
+        """执行前调用：熔断冷却结束时只有一个调用者获得半开探测资格"""
+        health = self._health(account_id)
+        state = health.get('state', CLOSED)
+        if state == CLOSED:
+            return True
+        now = datetime.now()
+        if state == OPEN and health['open_until'] > now:
+            return False
+        if state == HALF_OPEN and health.get('probe_until', now) > now:
+            return False
+        # 以 updated_at 做乐观锁，并发时只有一个调用者成为探测者
+        result = self.db.accounts.update_one(
+            {'_id': ObjectId(account_id), 'health.updated_at': health.get('updated_at')},
+            {'$set': {
+                'health.state': HALF_OPEN,
+                'health.probe_until': now + timedelta(seconds=PROBE_SECONDS),
+                'health.updated_at': now
+            }}
+        )
+        return result.modified_count == 1
+
+    def retry_at(self, account_id):
+        """熔断中的账号最早可以再次尝试的时间"""
+        health = self._health(account_id)
+        if health.get('state') == OPEN:
+            return health['open_until']
+        if health.get('state') == HALF_OPEN:
+            return health.get('probe_until') or datetime.now()
+        return datetime.now()
+
+    def release(self, account_id):
+        """占用了半开探测却没有产生结果（例如商品不存在）时归还探测资格"""
+        self.db.accounts.update_one(
+            {'_id': ObjectId(account_id), 'health.state': HALF_OPEN},
+            {'$set': {'health.probe_until': datetime.now()}}
+        )
+
+    def record(self, account_id, success, latency=None, error_kind=None, error=None):
+        """记录一次登录或自动化操作的结果，用管道更新在数据库端原子计算，多进程并发记录也不会丢失"""
+        now = datetime.now()
+        health = {
+            'success_rate': {'$round': [{'$add': [
+                {'$multiply': [{'$ifNull': ['$health.success_rate', 1.0]}, 1 - EWMA_ALPHA]},
+                EWMA_ALPHA if success else 0
+            ]}, 4]},
+            'samples': {'$add': [{'$ifNull': ['$health.samples', 0]}, 1]},
+            'updated_at': now
+        }
+        if latency is not None:
+            latency_ms = latency * 1000
+            health['latency_ms'] = {'$round': [{'$cond': [
+                {'$eq': [{'$ifNull': ['$health.latency_ms', None]}, None]},
+                latency_ms,
+                {'$add': [{'$multiply': ['$health.latency_ms', 1 - EWMA_ALPHA]}, latency_ms * EWMA_ALPHA]}
+            ]}, 1]}
+
+        if success:
+            health.update({'state': CLOSED, 'consecutive_failures': 0, 'trips': 0, 'last_success_at': now})
+            pipeline = [{'$set': {f'health.{key}': value for key, value in health.items()}}]
+        else:
+            health.update({
+                'consecutive_failures': {'$add': [{'$ifNull': ['$health.consecutive_failures', 0]}, 1]},
+                'last_failure_at': now,
+                'last_error': {'$literal': (error or '')[:200]},
+                'last_error_kind': {'$literal': error_kind}
+            })
+            # 半开探测失败、连续失败达到阈值或登录被拒时熔断，熔断时长随连续熔断次数翻倍
+            trip = {'$or': [
+                {'$eq': ['$health.state', HALF_OPEN]},
+                {'$gte': ['$health.consecutive_failures', FAILURE_THRESHOLD]},
+                error_kind == AUTH
+            ]}
+            trips = {'$add': [{'$ifNull': ['$health.trips', 0]}, 1]}
+            open_ms = {'$multiply': [1000, {'$min': [
+                MAX_OPEN_SECONDS, {'$multiply': [OPEN_SECONDS, {'$pow': [2, {'$subtract': [trips, 1]}]}]}
+            ]}]}
+            pipeline = [
+                {'$set': {f'health.{key}': value for key, value in health.items()}},
+                # 第二阶段读到的是更新后的失败次数和更新前的状态
+                {'$set': {
+                    'health.trips': {'$cond': [trip, trips, {'$ifNull': ['$health.trips', 0]}]},
+                    'health.open_until': {'$cond': [trip, {'$add': [now, open_ms]}, '$health.open_until']},
+                    'health.state': {'$cond': [trip, OPEN, {'$ifNull': ['$health.state', CLOSED]}]}
+                }}
+            ]
+
+        self.db.accounts.update_one({'_id': ObjectId(account_id)}, pipeline)
+
+    def pick_healthy(self, username, account_ids):
+        """从候选账号中选出可派发且成功率最高的账号"""
+        object_ids = [ObjectId(account_id) for account_id in account_ids]
+        candidates = list(self.db.accounts.find({'_id': {'$in': object_ids}, 'username': username}))
+        now = datetime.now()
+        candidates = [account for account in candidates if _available(account.get('health') or {}, now)]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda account: (account.get('health') or {}).get('success_rate', 1.0))
+
+    def get_health(self, username):
+        """账号健康状态列表，熔断中的账号排在前面"""
+        try:
+            accounts = list(self.db.accounts.find({'username': username}, {'password': 0}))
+            now = datetime.now()
+            for account in accounts:
+                health = account.setdefault('health', {})
+                health.setdefault('state', CLOSED)
+                health['score'] = round(health.get('success_rate', 1.0) * 100)
+                health['available'] = _available(health, now)
+            accounts.sort(key=lambda account: (account['health']['available'], account['health']['score']))
+            return jsonify({
+                'success': True,
+                'accounts': accounts
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取账号健康状态失败: {str(e)}'
+            }), 500
+
+    def reset(self, username, account_id):
+        """人工恢复账号（例如修改密码后）"""
+        try:
+            result = self.db.accounts.update_one(
+                {'_id': ObjectId(account_id), 'username': username},
+                {'$set': {
+                    'health.state': CLOSED,
+                    'health.consecutive_failures': 0,
+                    'health.trips': 0,
+                    'health.updated_at': datetime.now()
+                }}
+            )
+            if result.matched_count == 0:
+                return jsonify({
+                    'success': False,
+                    'message': '账号不存在或无权限操作'
+                }), 404
+            return jsonify({
+                'success': True,
+                'message': '账号已恢复'
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'恢复账号失败: {str(e)}'
+            }), 500
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from playwright.sync_api import sync_playwright
+
+SESSION_DIR = 'sessions'
+
+
+class AccountSessions:
+    """账号会话池：Playwright同步接口不能跨线程使用，每个线程持有自己的浏览器和账号上下文，
+    登录状态落盘供各线程和重启后复用"""
+
+    def __init__(self, product_manager, session_dir=SESSION_DIR):
+        self.product_manager = product_manager
+        self.session_dir = session_dir
+        os.makedirs(session_dir, exist_ok=True)
+        self.local = threading.local()
+        self.generations = {}  # 账号ID -> 登录态版本，失效后各线程的旧上下文不再使用
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def _state_path(self, account_id):
+        return os.path.join(self.session_dir, f'{account_id}.json')
+
+    def _browser(self):
+        """当前线程的浏览器，懒加载"""
+        if getattr(self.local, 'browser', None) is None:
+            self.local.playwright = sync_playwright().start()
+            self.local.browser = self.local.playwright.chromium.launch(headless=True)
+            self.local.contexts = {}
+        return self.local.browser
+
+    def account_lock(self, account_id):
+        """同一账号的操作串行执行"""
+        with self.lock:
+            return self.locks.setdefault(str(account_id), threading.Lock())
+
+    def new_page(self, account):
+        """返回该账号已登录的新页面，登录失败时返回 (None, 登录结果)；调用方需持有 account_lock"""
+        account_id = str(account['_id'])
+        browser = self._browser()
+        generation = self.generations.get(account_id, 0)
+        context, context_generation = self.local.contexts.get(account_id, (None, None))
+
+        if context is not None and context_generation != generation:
+            self._close_context(account_id)
+            context = None
+
+        if context is None:
+            state_path = self._state_path(account_id)
+            if os.path.exists(state_path):
+                context = browser.new_context(storage_state=state_path)
+            else:
+                context = browser.new_context()
+                page = context.new_page()
+                login_result = self.product_manager._login_xianyu(page, account['username'], account['password'])
+                page.close()
+                if not login_result['success']:
+                    context.close()
+                    return None, login_result
+                context.storage_state(path=state_path)
+            self.local.contexts[account_id] = (context, generation)
+
+        page = context.new_page()
+        page.set_default_timeout(60000)
+        return page, {'success': True, 'message': '登录成功'}
+
+    def _close_context(self, account_id):
+        context, _ = self.local.contexts.pop(account_id, (None, None))
+        if context is not None:
+            try:
+                context.close()
+            except Exception:
+                pass
+
+    def invalidate(self, account_id):
+        """登录态失效时丢弃会话，所有线程下次都重新登录"""
+        account_id = str(account_id)
+        with self.lock:
+            self.generations[account_id] = self.generations.get(account_id, 0) + 1
+        if getattr(self.local, 'browser', None) is not None:
+            self._close_context(account_id)
+        state_path = self._state_path(account_id)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+    def close(self):
+        """关闭当前线程的浏览器，在持有会话的线程退出前调用"""
+        browser = getattr(self.local, 'browser', None)
+        if browser is None:
+            return
+        for account_id in list(self.local.contexts):
+            self._close_context(account_id)
+        try:
+            browser.close()
+        finally:
+            self.local.playwright.stop()
+            self.local.browser = None
+
+    def is_logged_out(self, page):
+        return 'login.taobao.com' in page.url
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from datetime import datetime, timedelta
+from flask import jsonify
+from bson import ObjectId
+from modules.write_buffer import MAX_DELAY, MAX_HOLD
+from modules.response_cache import response_cache
+
+ROLLUP_TYPE = 'conversion_daily'
+WATERMARK_ID = 'conversion_daily_watermark'
+REFRESH_INTERVAL = 60  # 秒，看板读取时最多每分钟增量刷新一次
+WATERMARK_LAG = 2 * max(MAX_DELAY, MAX_HOLD)  # 秒，水位线落后当前时间，批量写入缓冲中的变更不会被跳过
+ORDER_FIELDS = ('orders', 'revenue', 'shipped')
+
+
+class AnalyticsRollup:
+    """转化分析日汇总：按商品、账号、天增量汇总到 analytics 集合，看板只读汇总数据"""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.refreshed_at = None
+
+    def _get_watermark(self):
+        doc = self.db.analytics.find_one({'_id': WATERMARK_ID})
+        return doc['watermark'] if doc else datetime.min
+
+    def _set_watermark(self, watermark):
+        self.db.analytics.update_one(
+            {'_id': WATERMARK_ID},
+            {'$set': {'watermark': watermark, 'type': 'rollup_watermark', 'updated_at': datetime.now()}},
+            upsert=True
+        )
+
+    def refresh(self):
+        """增量刷新：只重新汇总自上次水位线以来有新增或变更订单的(用户, 天)"""
+        with self.lock:
+            since = self._get_watermark()
+            until = datetime.now() - timedelta(seconds=WATERMARK_LAG)
+
+            # 找出受影响的(用户, 天)，数量远小于订单数
+            affected = list(self.db.orders.aggregate([
+                {'$match': {'updated_at': {'$gt': since, '$lte': until}}},
+                {'$group': {'_id': {
+                    'username': '$username',
+                    'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}
+                }}}
+            ]))
+
+            if affected:
+                # 受影响的整天重新计算，订单状态变更不会被重复累加
+                day_filters = []
+                for item in affected:
+                    day_start = datetime.strptime(item['_id']['day'], '%Y-%m-%d')
+                    day_filters.append({
+                        'username': item['_id']['username'],
+                        'created_at': {'$gte': day_start, '$lt': day_start + timedelta(days=1)}
+                    })
+                self._clear_orders([item['_id'] for item in affected])
+                self._merge_orders({'$or': day_filters})
+                self._drop_empty()
+
+            self._merge_products({'updated_at': {'$gt': since, '$lte': until}}, until)
+            self._set_watermark(until)
+            self.refreshed_at = until
+            return len(affected)
+
+    def _clear_orders(self, groups):
+        """清掉受影响(用户, 天)的订单汇总，订单标题或账号变化后旧分组不会残留"""
+        self.db.analytics.update_many(
+            {'type': ROLLUP_TYPE, '$or': [{'username': g['username'], 'day': g['day']} for g in groups]},
+            {'$unset': {field: '' for field in ORDER_FIELDS}}
+        )
+
+    def _drop_empty(self):
+        """删除既没有订单也没有浏览数据的分组"""
+        self.db.analytics.delete_many({
+            'type': ROLLUP_TYPE, 'orders': {'$exists': False}, 'views': {'$exists': False}
+        })
+
+    def _merge_orders(self, match):
+        # 订单没有商品ID，按标题关联商品
+        self.db.orders.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': {
+                    'type': ROLLUP_TYPE,
+                    'username': '$username',
+                    'account_id': {'$ifNull': ['$account_id', None]},
+                    'product': '$title',
+                    'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}
+                },
+                'orders': {'$sum': 1},
+                'revenue': {'$sum': {'$ifNull': ['$price', 0]}},
+                'shipped': {'$sum': {'$cond': [{'$eq': ['$shipped', True]}, 1, 0]}}
+            }},
+            {'$set': {
+                'type': ROLLUP_TYPE,
+                'username': '$_id.username',
+                'account_id': '$_id.account_id',
+                'product': '$_id.product',
+                'day': '$_id.day',
+                'updated_at': '$$NOW'
+            }},
+            {'$merge': {'into': 'analytics', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'insert'}}
+        ])
+
+    def _merge_products(self, match, now):
+        """记录商品当天的浏览和想要数"""
+        self.db.products.aggregate([
+            {'$match': match},
+            {'$project': {
+                '_id': {
+                    'type': ROLLUP_TYPE,
+                    'username': '$username',
+                    'account_id': {'$ifNull': ['$account_id', None]},
+                    'product': '$title',
+                    'day': now.strftime('%Y-%m-%d')
+                },
+                'type': ROLLUP_TYPE,
+                'username': '$username',
+                'account_id': {'$ifNull': ['$account_id', None]},
+                'product': '$title',
+                'day': now.strftime('%Y-%m-%d'),
+                'views': {'$ifNull': ['$views', 0]},
+                'wants': {'$ifNull': ['$want_count', 0]},
+                'updated_at': '$$NOW'
+            }},
+            {'$merge': {'into': 'analytics', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'insert'}}
+        ])
+
+    def rebuild(self, username):
+        """清空用户的汇总并从其全部历史数据重建，不影响其它用户和全局水位线"""
+        try:
+            with self.lock:
+                self.db.analytics.delete_many({'type': ROLLUP_TYPE, 'username': username})
+                self._merge_orders({'username': username})
+                self._merge_products({'username': username}, datetime.now())
+            count = self.db.analytics.count_documents({'type': ROLLUP_TYPE, 'username': username})
+            response_cache.bump(username, 'orders')
+            return jsonify({
+                'success': True,
+                'message': f'已重建 {count} 个日汇总分组',
+                'count': count
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'重建转化汇总失败: {str(e)}'
+            }), 500
+
+    def get_conversion_analysis(self, username, product_id=None, days=30):
+        """读取日汇总计算转化率，耗时只与时间范围和商品数相关"""
+        try:
+            try:
+                days = int(days)
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'days 必须是整数'
+                }), 400
+
+            if not self.refreshed_at or (datetime.now() - self.refreshed_at).total_seconds() > REFRESH_INTERVAL:
+                self.refresh()
+
+            match = {
+                'type': ROLLUP_TYPE,
+                'username': username,
+                'day': {'$gte': (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')}
+            }
+
+            if product_id:
+                product = self.db.products.find_one(
+                    {'_id': ObjectId(product_id), 'username': username},
+                    {'title': 1}
+                )
+                if not product:
+                    return jsonify({
+                        'success': False,
+                        'message': '商品不存在或无权限查看'
+                    }), 404
+                match['product'] = product['title']
+
+            rows = list(self.db.analytics.aggregate([
+                {'$match': match},
+                {'$group': {
+                    '_id': '$product',
+                    'orders': {'$sum': {'$ifNull': ['$orders', 0]}},
+                    'revenue': {'$sum': {'$ifNull': ['$revenue', 0]}},
+                    'views': {'$max': {'$ifNull': ['$views', 0]}},
+                    'wants': {'$max': {'$ifNull': ['$wants', 0]}}
+                }},
+                {'$sort': {'orders': -1}}
+            ]))
+
+            products = []
+            for row in rows:
+                products.append({
+                    'title': row['_id'],
+                    'orders': row['orders'],
+                    'revenue': row['revenue'],
+                    'views': row['views'],
+                    'wants': row['wants'],
+                    'view_conversion': round(row['orders'] / row['views'], 4) if row['views'] else 0,
+                    'want_conversion': round(row['orders'] / row['wants'], 4) if row['wants'] else 0
+                })
+
+            return jsonify({
+                'success': True,
+                'days': days,
+                'products': products
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取转化分析失败: {str(e)}'
+            }), 500
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from datetime import datetime
+from pymongo import UpdateOne
+from playwright.sync_api import TimeoutError
+from modules.retry_policy import StepError, TIMEOUT
+
+PICKER = '#J_Item_Cate'
+CATE_LIST = '.J_FishCateList'
+LEVEL_TIMEOUT = 10000   # 逐级查找时单级等待上限（毫秒）
+REPLAY_TIMEOUT = 3000   # 按缓存选择器重放时单级等待上限（毫秒）
+
+
+def normalize_path(category):
+    return '>'.join(level.strip() for level in str(category).split('>'))
+
+
+class CategoryResolver:
+    """分类路径缓存：首次逐级按文字查找并记下每级的选择器，之后直接重放；重放失败时作废缓存重新查找"""
+
+    def __init__(self, db, write_buffer):
+        self.db = db
+        self.write_buffer = write_buffer
+        self.cache = {}   # 分类路径 -> 选择器列表
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'failures': 0, 'timeouts': 0,
+                      'hit_seconds': 0.0, 'miss_seconds': 0.0}
+
+    def _cached(self, path):
+        with self.lock:
+            if path in self.cache:
+                return self.cache[path]
+        doc = self.db.category_paths.find_one({'path': path, 'resolved': True}, {'selectors': 1})
+        selectors = doc.get('selectors') if doc else None
+        with self.lock:
+            self.cache[path] = selectors
+        return selectors
+
+    def _save(self, path, resolved, selectors=None, leaf_id=None):
+        now = datetime.now()
+        update = {'$set': {'resolved': resolved, 'updated_at': now}}
+        if resolved:
+            update['$set'].update({'selectors': selectors, 'leaf_id': leaf_id})
+        else:
+            update['$set']['failed_at'] = now
+            update['$unset'] = {'selectors': '', 'leaf_id': ''}
+        with self.lock:
+            self.cache[path] = selectors if resolved else None
+        self.write_buffer.add('category_paths', UpdateOne({'path': path}, update, upsert=True))
+
+    def _invalidate(self, path):
+        self.stats['invalidations'] += 1
+        with self.lock:
+            self.cache[path] = None
+        self.write_buffer.add('category_paths', UpdateOne(
+            {'path': path}, {'$unset': {'selectors': '', 'leaf_id': ''}, '$set': {'updated_at': datetime.now()}}
+        ))
+
+    def _replay(self, page, selectors, leaf):
+        """按缓存的选择器依次点击，最后确认选择器显示的是目标叶子分类"""
+        page.click(PICKER)
+        for selector in selectors:
+            page.click(selector, timeout=REPLAY_TIMEOUT)
+        return leaf in (page.text_content(PICKER) or '')
+
+    def _resolve(self, page, levels):
+        """逐级按文字查找，返回 (选择器列表, 叶子分类ID)；某级列表已加载但没有该分类时返回 (None, None)，
+        列表还没加载出分类项时抛出 TIMEOUT 错误，属于临时失败，不记为无法选中"""
+        page.click(PICKER)
+        selectors = []
+        leaf_id = None
+        for level in levels:
+            # 等待分类列表加载
+            page.wait_for_selector(CATE_LIST)
+            try:
+                element = page.wait_for_selector(f'{CATE_LIST} >> text="{level}"', timeout=LEVEL_TIMEOUT)
+            except TimeoutError:
+                if page.query_selector_all(f'{CATE_LIST} [data-id]'):
+                    return None, None
+                page.keyboard.press('Escape')
+                raise StepError(TIMEOUT, f'分类列表加载超时: {level}', 'category')
+            leaf_id = element.get_attribute('data-id')
+            selectors.append(f'{CATE_LIST} [data-id="{leaf_id}"]' if leaf_id else f'{CATE_LIST} >> text="{level}"')
+            element.click()
+        return selectors, leaf_id
+
+    def select(self, page, category):
+        """在发布页选中分类，返回是否成功；列表已加载却找不到某级分类时记为无法选中，
+        列表加载超时时抛出 TIMEOUT 错误交给重试策略，不写入缓存"""
+        path = normalize_path(category)
+        levels = path.split('>')
+
+        selectors = self._cached(path)
+        if selectors:
+            start = time.perf_counter()
+            try:
+                if self._replay(page, selectors, levels[-1]):
+                    self.stats['hits'] += 1
+                    self.stats['hit_seconds'] += time.perf_counter() - start
+                    return True
+            except TimeoutError:
+                pass
+            # 分类树变化导致缓存失效，关闭选择器后重新逐级查找
+            self._invalidate(path)
+            page.keyboard.press('Escape')
+
+        start = time.perf_counter()
+        try:
+            selectors, leaf_id = self._resolve(page, levels)
+        except StepError:
+            self.stats['timeouts'] += 1
+            raise
+        if selectors is None:
+            self.stats['failures'] += 1
+            self._save(path, False)
+            return False
+        self.stats['misses'] += 1
+        self.stats['miss_seconds'] += time.perf_counter() - start
+        self._save(path, True, selectors, leaf_id)
+        return True
+
+    def get_stats(self):
+        hits, misses = self.stats['hits'], self.stats['misses']
+        return {
+            'paths': len(self.cache),
+            'hits': hits,
+            'misses': misses,
+            'invalidations': self.stats['invalidations'],
+            'failures': self.stats['failures'],
+            'timeouts': self.stats['timeouts'],
+            'avg_hit_ms': round(self.stats['hit_seconds'] / hits * 1000, 1) if hits else 0,
+            'avg_miss_ms': round(self.stats['miss_seconds'] / misses * 1000, 1) if misses else 0
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from flask import jsonify
+from pymongo import UpdateOne
+
+WINDOW_HOURS = 24
+HISTORY_DAYS = 3
+RANK_TTL = 600  # 秒，排名结果缓存时间
+TOP_N = 100
+ALL_KEYWORDS = '全部'
+
+
+class HotTrendEngine:
+    """爆品趋势：采集快照按商品按天分桶存储，向量化计算想要数增速和加速度，按采集时的搜索关键词分组排名"""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+
+    def record_snapshot(self, keyword, products):
+        """记录一次采集结果，每个商品每天一个文档"""
+        now = datetime.now()
+        day = now.strftime('%Y-%m-%d')
+        keyword = keyword or ALL_KEYWORDS
+
+        operations = []
+        for product in products:
+            item_id = product.get('item_id')
+            if not item_id:
+                continue
+            operations.append(UpdateOne(
+                {'_id': f'{item_id}:{day}'},
+                {
+                    '$setOnInsert': {'item_id': item_id, 'day': day},
+                    '$set': {
+                        'keyword': keyword,
+                        'title': product.get('title', ''),
+                        'price': product.get('price', 0),
+                        'image': product.get('image', ''),
+                        'link': product.get('link', ''),
+                        'updated_at': now
+                    },
+                    '$push': {'samples': {'t': now, 'w': product.get('want_count', 0)}}
+                },
+                upsert=True
+            ))
+
+        if operations:
+            self.db.hot_item_series.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def _load_samples(self):
+        """服务端展开分桶，只取计算需要的字段"""
+        since = (datetime.now() - timedelta(days=HISTORY_DAYS)).strftime('%Y-%m-%d')
+        cursor = self.db.hot_item_series.aggregate([
+            {'$match': {'day': {'$gte': since}}},
+            {'$project': {'_id': 0, 'item_id': 1, 'keyword': 1, 'samples': 1}},
+            {'$unwind': '$samples'},
+            {'$project': {'item_id': 1, 'keyword': 1, 't': '$samples.t', 'w': '$samples.w'}}
+        ], allowDiskUse=True)
+        return pd.DataFrame(list(cursor), columns=['item_id', 'keyword', 't', 'w'])
+
+    @staticmethod
+    def score(df, now=None):
+        """对所有商品一次性计算增速(想要/小时)、加速度和得分"""
+        if df.empty:
+            return pd.DataFrame(columns=['item_id', 'keyword', 'want_count',
+                                         'velocity', 'acceleration', 'score'])
+
+        # 时间均为数据库中的本地时间，按同一基准换算
+        now = now or pd.Timestamp(datetime.now()).value / 1e9
+        df = df.copy()
+        df['t'] = pd.to_datetime(df['t']).astype('int64') / 1e9
+        df['w'] = df['w'].astype('float64')
+        df = df[df['t'] >= now - WINDOW_HOURS * 3600].sort_values(['item_id', 't'])
+
+        half = now - WINDOW_HOURS * 1800
+        df['recent'] = df['t'] >= half
+
+        def slope(frame):
+            g = frame.groupby('item_id')
+            first = g[['t', 'w']].first()
+            last = g[['t', 'w']].last()
+            dt = (last['t'] - first['t']) / 3600
+            return ((last['w'] - first['w']) / dt.where(dt > 0)).fillna(0)
+
+        g = df.groupby('item_id')
+        result = pd.DataFrame({
+            'keyword': g['keyword'].last(),
+            'want_count': g['w'].last(),
+            'velocity': slope(df)
+        })
+        v_new = slope(df[df['recent']]).reindex(result.index, fill_value=0)
+        v_old = slope(df[~df['recent']]).reindex(result.index, fill_value=0)
+        result['acceleration'] = (v_new - v_old) / (WINDOW_HOURS / 2)
+
+        # 增速为主，加速度修正，想要总数取对数作为平手时的区分
+        result['score'] = (result['velocity']
+                           + result['acceleration'] * (WINDOW_HOURS / 4)
+                           + np.log1p(result['want_count']) * 0.01)
+        return result.reset_index().sort_values('score', ascending=False)
+
+    def _is_fresh(self):
+        ranking = self.db.analytics.find_one({'type': 'hot_rank', 'keyword': ALL_KEYWORDS}, {'created_at': 1})
+        return bool(ranking) and (datetime.now() - ranking['created_at']).total_seconds() <= RANK_TTL
+
+    def rank(self, force=False):
+        """重新计算全部排名并按关键词存储；等锁期间已有其他调用者算完时直接返回 None"""
+        with self.lock:
+            if not force and self._is_fresh():
+                return None
+
+            scored = self.score(self._load_samples())
+            now = datetime.now()
+
+            groups = [(ALL_KEYWORDS, scored)] + [
+                (keyword, frame) for keyword, frame in scored.groupby('keyword')
+                if keyword != ALL_KEYWORDS
+            ]
+
+            # 取排名靠前商品的展示信息
+            top_ids = set()
+            for _, frame in groups:
+                top_ids.update(frame['item_id'].head(TOP_N))
+            since = (now - timedelta(days=HISTORY_DAYS)).strftime('%Y-%m-%d')
+            info = {
+                doc['item_id']: doc for doc in self.db.hot_item_series.find(
+                    {'item_id': {'$in': list(top_ids)}, 'day': {'$gte': since}},
+                    {'_id': 0, 'item_id': 1, 'title': 1, 'price': 1, 'image': 1, 'link': 1}
+                ).sort('day', 1)
+            }
+
+            operations = []
+            for keyword, frame in groups:
+                items = []
+                for row in frame.head(TOP_N).itertuples(index=False):
+                    item = dict(info.get(row.item_id, {'item_id': row.item_id}))
+                    item.update({
+                        'want_count': int(row.want_count),
+                        'velocity': round(float(row.velocity), 3),
+                        'acceleration': round(float(row.acceleration), 4),
+                        'score': round(float(row.score), 3)
+                    })
+                    items.append(item)
+                operations.append(UpdateOne(
+                    {'type': 'hot_rank', 'keyword': keyword},
+                    {'$set': {'items': items, 'tracked': len(frame), 'created_at': now}},
+                    upsert=True
+                ))
+
+            if operations:
+                self.db.analytics.bulk_write(operations, ordered=False)
+            return len(scored)
+
+    def _rank_in_background(self):
+        """排名过期时在后台重新计算，已有计算在进行时不重复启动"""
+        if self.lock.locked():
+            return
+        thread = threading.Thread(target=self.rank)
+        thread.daemon = True
+        thread.start()
+
+    def get_hot_analysis(self, username, keyword=None):
+        """返回预先计算好的关键词排名，过期时先返回旧结果并在后台重新计算"""
+        try:
+            keyword = keyword or ALL_KEYWORDS
+            ranking = self.db.analytics.find_one({'type': 'hot_rank', 'keyword': keyword})
+
+            stale = not ranking or (datetime.now() - ranking['created_at']).total_seconds() > RANK_TTL
+            if stale:
+                self._rank_in_background()
+
+            if not ranking:
+                return jsonify({
+                    'success': True,
+                    'keyword': keyword,
+                    'ranking': stale,
+                    'products': []
+                })
+
+            return jsonify({
+                'success': True,
+                'keyword': keyword,
+                'tracked': ranking.get('tracked', 0),
+                'ranked_at': ranking['created_at'].isoformat(),
+                'ranking': stale,
+                'products': ranking['items']
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取热销分析失败: {str(e)}'
+            }), 500
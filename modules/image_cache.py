@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import shutil
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+# 平台图片限制
+MAX_IMAGES = 9
+MAX_SIDE = 1600
+JPEG_QUALITY = 85
+
+
+class ImageCache:
+    """发布图片缓存：并发下载远程图片，统一压缩后按内容寻址存储到本地磁盘"""
+
+    def __init__(self, cache_dir='cache/images', max_bytes=2 * 1024 ** 3, workers=8):
+        self.cache_dir = cache_dir
+        self.raw_dir = os.path.join(cache_dir, 'raw')
+        self.processed_dir = os.path.join(cache_dir, 'processed')
+        os.makedirs(self.raw_dir, exist_ok=True)
+        os.makedirs(self.processed_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.pending = {}  # 正在处理的图片，避免同一图片被重复下载和压缩
+
+    def prepare(self, images, timeout=30):
+        """并发准备一组图片（本地路径或URL），返回处理后的本地文件路径列表，保持原有顺序"""
+        futures = []
+        for source in images[:MAX_IMAGES]:
+            if source:
+                futures.append((source, self._submit(source)))
+
+        paths = []
+        for source, future in futures:
+            try:
+                paths.append(future.result(timeout=timeout))
+            except Exception:
+                continue  # 单张图片失败不影响其它图片上传
+
+        self.evict()
+        return paths
+
+    def _submit(self, source):
+        """提交处理任务，相同来源的并发请求共享同一个任务"""
+        with self.lock:
+            future = self.pending.get(source)
+            if future is None:
+                future = self.executor.submit(self._process, source)
+                self.pending[source] = future
+                future.add_done_callback(lambda _: self._release(source))
+            return future
+
+    def _release(self, source):
+        with self.lock:
+            self.pending.pop(source, None)
+
+    def _process(self, source):
+        """获取原图并压缩，结果以内容哈希命名"""
+        raw_path = self._fetch(source)
+
+        content_hash = self._file_hash(raw_path)
+        processed_path = os.path.join(self.processed_dir, f'{content_hash}.jpg')
+        if os.path.exists(processed_path):
+            self._touch(processed_path)
+            return processed_path
+
+        tmp_path = f'{processed_path}.{threading.get_ident()}.tmp'
+        with Image.open(raw_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+            img.save(tmp_path, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp_path, processed_path)
+        return processed_path
+
+    def _fetch(self, source):
+        """本地路径直接使用，URL下载到原图缓存"""
+        if os.path.exists(source):
+            return source
+
+        if source.startswith('//'):
+            source = f'https:{source}'
+
+        url_hash = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        raw_path = os.path.join(self.raw_dir, url_hash)
+        if os.path.exists(raw_path):
+            self._touch(raw_path)
+            return raw_path
+
+        tmp_path = f'{raw_path}.{threading.get_ident()}.tmp'
+        req = urllib.request.Request(source, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(req, timeout=20) as resp, open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(resp, f)
+        os.replace(tmp_path, raw_path)
+        return raw_path
+
+    def _file_hash(self, path):
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def _touch(self, path):
+        """更新访问时间，用于LRU淘汰"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def evict(self):
+        """缓存总大小超过上限时，按最近使用时间淘汰最旧的文件"""
+        entries = []
+        total = 0
+        for directory in (self.raw_dir, self.processed_dir):
+            for entry in os.scandir(directory):
+                if not entry.is_file() or entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        return removed
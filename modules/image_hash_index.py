@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from flask import jsonify
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from PIL import Image
+from modules.process_pool import create_pool
+
+DUPLICATE_DISTANCE = 5
+HASH_SIZE = 8
+
+
+def compute_phash(path):
+    """计算图片的差值哈希（dHash），返回16位十六进制字符串"""
+    with Image.open(path) as img:
+        img = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+        pixels = list(img.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f'{value:016x}'
+
+
+def _hash_material(args):
+    """在工作进程中计算素材哈希"""
+    material_id, path = args
+    try:
+        return material_id, compute_phash(path)
+    except Exception:
+        return material_id, None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """汉明距离BK树，相似查询只访问满足三角不等式的子树"""
+
+    def __init__(self):
+        self.root = None  # [哈希值, 素材ID列表, {距离: 子节点}]
+        self.size = 0
+
+    def add(self, value, material_id):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [material_id], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(material_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [material_id], {}]
+                return
+            node = child
+
+    def remove(self, value, material_id):
+        """删除素材ID，节点本身保留以维持树结构"""
+        node = self.root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                if material_id in node[1]:
+                    node[1].remove(material_id)
+                    self.size -= 1
+                return
+            node = node[2].get(distance)
+
+    def search(self, value, max_distance):
+        """返回 [(距离, 素材ID)]，按距离升序"""
+        results = []
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, material_id) for material_id in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node[2].items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+
+class ImageHashIndex:
+    """素材库感知哈希索引：每个用户一棵BK树，可从素材集合重建；索引版本号变化（含其它进程写入）时重新加载"""
+
+    def __init__(self, db, workers=None):
+        self.db = db
+        self.workers = workers or os.cpu_count() or 1
+        self.trees = {}   # 用户名 -> (BK树, 构建时的索引版本号)
+        self.lock = threading.Lock()
+
+    def _version(self, username):
+        """索引版本号：写入哈希或删除素材时递增，变化说明树已过期"""
+        doc = self.db.material_index.find_one({'username': username}, {'version': 1})
+        return (doc or {}).get('version', 0)
+
+    def _bump(self, username):
+        """哈希写入或素材删除后递增版本号，返回新版本"""
+        doc = self.db.material_index.find_one_and_update(
+            {'username': username},
+            {'$inc': {'version': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc['version']
+
+    def _advance(self, username, version):
+        """本进程的改动已同步到树上：版本号恰好是下一个时更新缓存版本，否则说明有其它写入，丢弃缓存"""
+        with self.lock:
+            cached = self.trees.get(username)
+            if cached is None:
+                return
+            tree, cached_version = cached
+            if version == cached_version + 1:
+                self.trees[username] = (tree, version)
+            else:
+                del self.trees[username]
+
+    def _get_tree(self, username):
+        """获取用户的索引，首次访问或版本号变化后从数据库重建"""
+        version = self._version(username)
+        with self.lock:
+            cached = self.trees.get(username)
+        if cached is not None and cached[1] == version:
+            return cached[0]
+        return self.rebuild(username, version)
+
+    def rebuild(self, username, version=None):
+        """从素材集合重建用户的索引"""
+        version = self._version(username) if version is None else version
+        tree = BKTree()
+        cursor = self.db.materials.find(
+            {'username': username, 'phash': {'$exists': True}},
+            {'phash': 1}
+        )
+        for material in cursor:
+            tree.add(int(material['phash'], 16), str(material['_id']))
+
+        with self.lock:
+            self.trees[username] = (tree, version)
+        return tree
+
+    def index_materials(self, username, materials):
+        """素材入库后计算哈希并加入索引，materials 为 [(素材ID, 路径)]，返回 {素材ID: 近似重复的素材}"""
+        hashed = []
+        for material_id, path in materials:
+            try:
+                hashed.append((str(material_id), compute_phash(path)))
+            except Exception:
+                continue  # 非图片素材不建索引
+        if not hashed:
+            return {}
+
+        tree = self._get_tree(username)
+        duplicates = {}
+        with self.lock:
+            for material_id, phash in hashed:
+                value = int(phash, 16)
+                duplicates[material_id] = [
+                    {'material_id': mid, 'distance': distance}
+                    for distance, mid in tree.search(value, DUPLICATE_DISTANCE) if mid != material_id
+                ]
+                tree.add(value, material_id)
+
+        self.db.materials.bulk_write([
+            UpdateOne({'_id': ObjectId(material_id)}, {'$set': {'phash': phash}})
+            for material_id, phash in hashed
+        ], ordered=False)
+        self._advance(username, self._bump(username))
+        return duplicates
+
+    def index_new(self, username, since):
+        """为 since 之后入库、还没有哈希的素材建索引（用于不经过本模块写入的素材）"""
+        cursor = self.db.materials.find(
+            {'username': username, 'phash': {'$exists': False},
+             'path': {'$exists': True}, 'created_at': {'$gte': since}},
+            {'path': 1}
+        )
+        return self.index_materials(username, [
+            (m['_id'], m['path']) for m in cursor if os.path.exists(m['path'])
+        ])
+
+    def remove_material(self, username, material_id, phash):
+        tree = self._get_tree(username)
+        with self.lock:
+            tree.remove(int(phash, 16), str(material_id))
+        self._advance(username, self._bump(username))
+
+    def delete_material(self, username, material_id):
+        """删除素材及其文件，并从索引中移除"""
+        try:
+            material = self.db.materials.find_one({'_id': ObjectId(material_id), 'username': username})
+            if not material:
+                return jsonify({
+                    'success': False,
+                    'message': '素材不存在或无权限操作'
+                }), 404
+
+            # 先从树中移除再删除文档
+            if material.get('phash'):
+                self.remove_material(username, material_id, material['phash'])
+            self.db.materials.delete_one({'_id': material['_id']})
+            if material.get('path') and os.path.exists(material['path']):
+                os.remove(material['path'])
+
+            return jsonify({
+                'success': True,
+                'message': '素材已删除'
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'删除素材失败: {str(e)}'
+            }), 500
+
+    def find_similar(self, username, path=None, material_id=None, max_distance=10, limit=50):
+        """查找相似素材，可传入图片路径或已有素材ID"""
+        try:
+            if material_id:
+                material = self.db.materials.find_one({
+                    '_id': ObjectId(material_id),
+                    'username': username
+                })
+                if not material or 'phash' not in material:
+                    return jsonify({
+                        'success': False,
+                        'message': '素材不存在或尚未建立索引'
+                    }), 404
+                phash = material['phash']
+            elif path:
+                phash = compute_phash(path)
+            else:
+                return jsonify({
+                    'success': False,
+                    'message': '未提供图片或素材ID'
+                }), 400
+
+            tree = self._get_tree(username)
+            with self.lock:
+                matches = tree.search(int(phash, 16), max_distance)
+            matches = [m for m in matches if m[1] != material_id][:limit]
+
+            materials = {
+                str(m['_id']): m for m in self.db.materials.find(
+                    {'_id': {'$in': [ObjectId(mid) for _, mid in matches]}},
+                    {'filename': 1, 'path': 1, 'category': 1, 'type': 1}
+                )
+            }
+
+            results = []
+            for distance, mid in matches:
+                material = materials.get(mid)
+                if material:
+                    material['_id'] = mid
+                    material['distance'] = distance
+                    results.append(material)
+
+            return jsonify({
+                'success': True,
+                'phash': phash,
+                'materials': results
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'相似素材查询失败: {str(e)}'
+            }), 500
+
+    def backfill(self, username=None, batch_size=1000):
+        """多进程为尚未计算哈希的素材补算哈希，返回补算数量；由 worker.py --backfill-hashes 在 Web 进程之外执行"""
+        query = {'phash': {'$exists': False}, 'path': {'$exists': True}}
+        if username:
+            query['username'] = username
+        cursor = self.db.materials.find(query, {'path': 1, 'username': 1})
+        jobs = []
+        usernames = {}
+        for material in cursor:
+            if os.path.exists(material['path']):
+                jobs.append((str(material['_id']), material['path']))
+                usernames[str(material['_id'])] = material['username']
+
+        updated = 0
+        touched = set()
+        operations = []
+        with create_pool(self.workers) as pool:
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            for material_id, phash in pool.map(_hash_material, jobs, chunksize=chunksize):
+                if phash is None:
+                    continue
+                touched.add(usernames[material_id])
+                operations.append(UpdateOne({'_id': ObjectId(material_id)}, {'$set': {'phash': phash}}))
+                if len(operations) >= batch_size:
+                    updated += self.db.materials.bulk_write(operations, ordered=False).modified_count
+                    operations = []
+
+        if operations:
+            updated += self.db.materials.bulk_write(operations, ordered=False).modified_count
+
+        # Web 进程看到版本号变化后重建索引
+        for name in touched:
+            self._bump(name)
+        return updated
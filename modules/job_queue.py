@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LEASE_SECONDS = 120        # 任务租约时长，工作进程需在此之前续约
+ACCOUNT_LEASE_SECONDS = 600  # 账号亲和租约时长，空闲超过后其它工作进程可接手
+MAX_ATTEMPTS = 3
+
+
+def queue_enabled():
+    """设置 AUTOMATION_QUEUE=1 时自动化任务交给独立工作进程执行"""
+    return os.environ.get('AUTOMATION_QUEUE') == '1'
+
+
+class JobQueue:
+    """自动化任务队列：工作进程通过租约认领按账号划分的任务，同一账号的任务优先交给持有其会话的工作进程"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def enqueue(self, kind, username, account_id, payload, not_before=None):
+        """not_before 用于延后执行（如账号熔断中）"""
+        now = datetime.now()
+        result = self.db.automation_jobs.insert_one({
+            'kind': kind,
+            'username': username,
+            'account_id': str(account_id),
+            'payload': payload,
+            'status': 'queued',
+            'attempts': 0,
+            'not_before': not_before,
+            'created_at': now,
+            'updated_at': now
+        })
+        return str(result.inserted_id)
+
+    def _claimable(self, now):
+        return {
+            '$or': [
+                {'status': 'queued'},
+                {'status': 'running', 'lease_until': {'$lt': now}}  # 租约过期的任务重新认领
+            ],
+            'attempts': {'$lt': MAX_ATTEMPTS},
+            'not_before': {'$not': {'$gt': now}}
+        }
+
+    def claim(self, worker_id, held_accounts=()):
+        """认领一个任务：先找本进程已持有的账号，再找未被其它存活进程持有的账号"""
+        now = datetime.now()
+        update = {
+            '$set': {
+                'status': 'running',
+                'lease_owner': worker_id,
+                'lease_until': now + timedelta(seconds=LEASE_SECONDS),
+                'token': uuid.uuid4().hex,
+                'started_at': now,
+                'updated_at': now
+            },
+            '$inc': {'attempts': 1}
+        }
+
+        if held_accounts:
+            job = self.db.automation_jobs.find_one_and_update(
+                {**self._claimable(now), 'account_id': {'$in': list(held_accounts)}},
+                update, sort=[('created_at', 1)], return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+
+        busy = [lease['_id'] for lease in self.db.account_leases.find(
+            {'worker': {'$ne': worker_id}, 'lease_until': {'$gt': now}}, {'_id': 1}
+        )]
+        job = self.db.automation_jobs.find_one_and_update(
+            {**self._claimable(now), 'account_id': {'$nin': busy}},
+            update, sort=[('created_at', 1)], return_document=ReturnDocument.AFTER
+        )
+        if job and not self.acquire_account(worker_id, job['account_id']):
+            # 并发下账号被其它进程抢先持有，退回任务
+            self.db.automation_jobs.update_one(
+                {'_id': job['_id'], 'token': job['token']},
+                {'$set': {'status': 'queued', 'updated_at': now}, '$inc': {'attempts': -1}}
+            )
+            return None
+        return job
+
+    def acquire_account(self, worker_id, account_id):
+        """获取账号亲和租约，账号已被其它存活进程持有时返回False"""
+        now = datetime.now()
+        try:
+            self.db.account_leases.update_one(
+                {'_id': account_id, '$or': [{'worker': worker_id}, {'lease_until': {'$lt': now}}]},
+                {'$set': {'worker': worker_id, 'lease_until': now + timedelta(seconds=ACCOUNT_LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def heartbeat(self, worker_id, jobs, accounts):
+        """为运行中的任务和持有的账号续约"""
+        now = datetime.now()
+        for job in jobs:
+            self.db.automation_jobs.update_one(
+                {'_id': job['_id'], 'token': job['token']},
+                {'$set': {'lease_until': now + timedelta(seconds=LEASE_SECONDS)}}
+            )
+        if accounts:
+            self.db.account_leases.update_many(
+                {'_id': {'$in': list(accounts)}, 'worker': worker_id},
+                {'$set': {'lease_until': now + timedelta(seconds=ACCOUNT_LEASE_SECONDS)}}
+            )
+
+    def complete(self, job, success, result):
+        """按租约令牌写回结果，租约已被其它进程接手时不会覆盖"""
+        now = datetime.now()
+        if success or job.get('attempts', 0) >= MAX_ATTEMPTS:
+            update = {'status': 'done' if success else 'failed', 'result': result, 'finished_at': now}
+        else:
+            update = {'status': 'queued', 'result': result}
+        update['updated_at'] = now
+        return self.db.automation_jobs.update_one(
+            {'_id': job['_id'], 'token': job['token']},
+            {'$set': update}
+        ).modified_count == 1
+
+    def sweep(self):
+        """租约过期且已用尽重试次数的任务标记失败"""
+        self.db.automation_jobs.update_many(
+            {'status': 'running', 'lease_until': {'$lt': datetime.now()}, 'attempts': {'$gte': MAX_ATTEMPTS}},
+            {'$set': {'status': 'failed', 'result': {'message': '租约过期且重试次数已用尽'},
+                      'finished_at': datetime.now()}}
+        )
+
+    def release(self, worker_id):
+        """工作进程退出时释放持有的账号"""
+        self.db.account_leases.delete_many({'worker': worker_id})
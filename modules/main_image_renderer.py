@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import json
+import uuid
+import zipfile
+import threading
+from collections import deque, OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import Future
+from flask import jsonify, Response, stream_with_context
+from bson import ObjectId
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from modules.process_pool import create_pool
+
+MATERIAL_DIR = 'uploads/materials'
+DEFAULT_SIZE = (800, 800)
+DEFAULT_FONT = '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc'
+TEMPLATE_CACHE_SIZE = 8  # 每个工作进程最多缓存的模板数
+
+# 进程内模板缓存（LRU）：每个工作进程只解码一次模板图层
+_template_cache = OrderedDict()
+
+
+@lru_cache(maxsize=64)
+def _load_font(path, size):
+    """字体对象缓存"""
+    try:
+        return ImageFont.truetype(path or DEFAULT_FONT, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _load_layer(path, size):
+    with Image.open(path) as layer:
+        return layer.convert('RGBA').resize(size, Image.LANCZOS)
+
+
+def _get_template(spec):
+    """按模板ID和版本缓存已解码的图层"""
+    key = (spec['id'], spec['version'])
+    template = _template_cache.get(key)
+    if template is not None:
+        _template_cache.move_to_end(key)
+    else:
+        size = tuple(spec.get('size') or DEFAULT_SIZE)
+        template = {
+            'size': size,
+            'background': _load_layer(spec['background'], size) if spec.get('background') else None,
+            'overlay': _load_layer(spec['overlay'], size) if spec.get('overlay') else None,
+            'frame': tuple(spec.get('frame') or (0, 0, size[0], size[1])),
+            'texts': spec.get('texts', [])
+        }
+        _template_cache[key] = template
+        if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
+
+def _render_one(args):
+    """在工作进程中渲染单张主图，返回JPEG字节"""
+    spec, image_bytes, fields = args
+    template = _get_template(spec)
+
+    if template['background'] is not None:
+        canvas = template['background'].copy()
+    else:
+        canvas = Image.new('RGBA', template['size'], (255, 255, 255, 255))
+
+    # 商品图按比例放入模板的图片区域
+    x, y, w, h = template['frame']
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = ImageOps.exif_transpose(img).convert('RGBA')
+        img = ImageOps.pad(img, (w, h), Image.LANCZOS, color=(255, 255, 255, 0))
+    canvas.alpha_composite(img, (x, y))
+
+    if template['overlay'] is not None:
+        canvas.alpha_composite(template['overlay'])
+
+    draw = ImageDraw.Draw(canvas)
+    for text in template['texts']:
+        try:
+            content = text.get('content', '').format(**fields)
+        except (KeyError, IndexError, ValueError):
+            content = text.get('content', '')
+        font = _load_font(text.get('font'), text.get('size', 36))
+        draw.text(tuple(text.get('position', (0, 0))), content,
+                  font=font, fill=text.get('color', '#ffffff'))
+
+    buffer = io.BytesIO()
+    canvas.convert('RGB').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class _ZipStream(io.RawIOBase):
+    """只追加的输出缓冲：ZipFile 写入后由生成器取走已写出的字节，不可定位时 ZipFile 使用数据描述符"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _outcome(future):
+    """单张图片的结果，返回 (JPEG字节, 错误信息)"""
+    try:
+        return future.result(), None
+    except Exception as e:
+        return None, str(e)
+
+
+class MainImageRenderer:
+    """批量主图渲染：模板图层在工作进程内缓存，按CPU核数并行渲染，渲染结果边完成边写出"""
+
+    def __init__(self, db, image_hash_index=None, workers=None):
+        self.db = db
+        self.image_hash_index = image_hash_index
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        """获取进程池，懒加载模式"""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = create_pool(self.workers)
+            return self.pool
+
+    def _template_spec(self, username, template_id):
+        template = self.db.templates.find_one({
+            '_id': ObjectId(template_id),
+            'username': username,
+            'type': 'main_image'
+        })
+        if not template:
+            return None
+
+        updated_at = template.get('updated_at') or template.get('created_at')
+        return {
+            'id': str(template['_id']),
+            'version': updated_at.isoformat() if updated_at else '',
+            'size': template.get('size'),
+            'background': template.get('background'),
+            'overlay': template.get('overlay'),
+            'frame': template.get('frame'),
+            'texts': template.get('texts', [])
+        }
+
+    def _render(self, spec, files, fields):
+        """按顺序逐张返回 (JPEG字节, 错误信息)，单张失败不影响其它图片；
+        同时在途的任务不超过进程数的两倍，上传图片按需读取"""
+        pool = self._get_pool()
+        pending = deque()
+        for index, file in enumerate(files):
+            image_fields = fields[index] if index < len(fields) else {}
+            try:
+                future = pool.submit(_render_one, (spec, file.read(), image_fields))
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            pending.append(future)
+            if len(pending) >= self.workers * 2:
+                yield _outcome(pending.popleft())
+        while pending:
+            yield _outcome(pending.popleft())
+
+    def _zip_stream(self, names, rendered):
+        """边渲染边输出ZIP，每张图片完成后即发送给客户端，逐张结果写在压缩包末尾的 results.json"""
+        stream = _ZipStream()
+        results = []
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as zf:
+            for name, (data, error) in zip(names, rendered):
+                if error is None:
+                    zf.writestr(name, data)
+                    results.append({'file': name, 'success': True})
+                else:
+                    results.append({'file': name, 'success': False, 'message': f'渲染失败: {error}'})
+                chunk = stream.take()
+                if chunk:
+                    yield chunk
+            zf.writestr('results.json', json.dumps(results, ensure_ascii=False, indent=2))
+        yield stream.take()
+
+    def render_batch(self, username, files, template_id, output='zip', fields=None):
+        """批量渲染主图，结果以ZIP返回或保存为素材；fields 为每张图片文字字段的JSON数组"""
+        try:
+            if not files:
+                return jsonify({
+                    'success': False,
+                    'message': '没有上传图片'
+                }), 400
+
+            try:
+                fields = json.loads(fields) if isinstance(fields, str) else (fields or [])
+            except ValueError:
+                fields = None
+            if not isinstance(fields, list) or not all(isinstance(f, dict) for f in fields):
+                return jsonify({
+                    'success': False,
+                    'message': 'fields 必须是对象数组的JSON'
+                }), 400
+
+            spec = self._template_spec(username, template_id)
+            if not spec:
+                return jsonify({
+                    'success': False,
+                    'message': '模板不存在或无权限使用'
+                }), 404
+
+            names = [f'{os.path.splitext(file.filename or str(i))[0]}_main.jpg'
+                     for i, file in enumerate(files)]
+            rendered = self._render(spec, files, fields)
+
+            if output == 'materials':
+                return self._save_materials(username, names, rendered)
+
+            # 上传文件在生成器中读取，需要保留请求上下文
+            return Response(stream_with_context(self._zip_stream(names, rendered)), mimetype='application/zip',
+                            headers={'Content-Disposition': 'attachment; filename=main_images.zip'})
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'批量生成主图失败: {str(e)}'
+            }), 500
+
+    def _save_materials(self, username, names, rendered):
+        """将渲染结果逐张写入素材目录，再批量入库，失败的图片在 results 中说明原因"""
+        os.makedirs(MATERIAL_DIR, exist_ok=True)
+        materials = []
+        results = []
+        for name, (data, error) in zip(names, rendered):
+            if error is not None:
+                results.append({'file': name, 'success': False, 'message': f'渲染失败: {error}'})
+                continue
+            results.append({'file': name, 'success': True})
+            path = os.path.join(MATERIAL_DIR, f'{uuid.uuid4()}.jpg')
+            with open(path, 'wb') as f:
+                f.write(data)
+            materials.append({
+                'username': username,
+                'type': 'image',
+                'category': 'main_image',
+                'filename': name,
+                'path': path,
+                'size': len(data),
+                'created_at': datetime.now()
+            })
+
+        material_ids = self.db.materials.insert_many(materials).inserted_ids if materials else []
+        duplicates = {}
+        if self.image_hash_index is not None and materials:
+            duplicates = self.image_hash_index.index_materials(
+                username, [(mid, m['path']) for mid, m in zip(material_ids, materials)]
+            )
+
+        return jsonify({
+            'success': bool(materials),
+            'message': f'成功生成 {len(materials)} 张主图，失败 {len(names) - len(materials)} 张',
+            'material_ids': [str(_id) for _id in material_ids],
+            'results': results,
+            'duplicates': {mid: found for mid, found in duplicates.items() if found}
+        })
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import datetime
+import numpy as np
+from flask import jsonify
+from bson import ObjectId
+from modules.product_manager import REGION_MAPPING
+
+DEFAULT_DAILY_QUOTA = 20
+
+
+def solve_assignment(scores, quotas, titles, used_titles):
+    """贪心分配：按得分从高到低，满足账号配额且同账号标题不重复
+
+    scores      商品×账号得分矩阵，-inf 表示不可分配
+    quotas      每个账号剩余配额
+    titles      每个商品的标题
+    used_titles 每个账号已有的标题集合
+    返回每个商品分配到的账号下标，未分配为 -1
+    """
+    n_products, n_accounts = scores.shape
+    assignment = np.full(n_products, -1, dtype=np.int64)
+    remaining = np.asarray(quotas, dtype=np.int64).copy()
+    capacity = int(min(remaining.sum(), n_products))
+    if capacity == 0:
+        return assignment
+
+    flat = scores.ravel()
+    valid = np.flatnonzero(np.isfinite(flat))
+    order = valid[np.argsort(-flat[valid], kind='stable')]
+
+    assigned = 0
+    for index in order:
+        product, account = divmod(int(index), n_accounts)
+        if assignment[product] >= 0 or remaining[account] <= 0:
+            continue
+        title = titles[product]
+        if title in used_titles[account]:
+            continue
+        assignment[product] = account
+        remaining[account] -= 1
+        used_titles[account].add(title)
+        assigned += 1
+        if assigned >= capacity:
+            break
+    return assignment
+
+
+class MatrixPlanner:
+    """矩阵铺货规划：NumPy 构建商品×账号得分矩阵，在约束下求解分配方案"""
+
+    def __init__(self, db, product_manager=None):
+        self.db = db
+        self.product_manager = product_manager
+
+    def _build_scores(self, username, products, accounts):
+        """得分 = 账号在该分类的历史发布占比 - 账号已发布总量的轻微惩罚（均衡负载）"""
+        account_index = {str(a['_id']): j for j, a in enumerate(accounts)}
+        categories = sorted({(p.get('category') or '').split('>')[0].strip() for p in products})
+        category_index = {c: i for i, c in enumerate(categories)}
+
+        # 每个账号已发布的分类分布和标题
+        affinity = np.zeros((len(categories), len(accounts)))
+        load = np.zeros(len(accounts))
+        used_titles = [set() for _ in accounts]
+        published = self.db.products.find(
+            {'username': username, 'account_id': {'$in': list(account_index)}, 'status': 'published'},
+            {'account_id': 1, 'category': 1, 'title': 1}
+        )
+        for product in published:
+            j = account_index[product['account_id']]
+            used_titles[j].add(product.get('title', ''))
+            load[j] += 1
+            i = category_index.get((product.get('category') or '').split('>')[0].strip())
+            if i is not None:
+                affinity[i, j] += 1
+
+        affinity = affinity / np.maximum(affinity.sum(axis=0, keepdims=True), 1)
+        load = load / max(load.max(), 1)
+
+        product_categories = np.array([
+            category_index[(p.get('category') or '').split('>')[0].strip()] for p in products
+        ], dtype=np.int64)
+        scores = affinity[product_categories] - 0.1 * load[np.newaxis, :]
+
+        # 同分时打散，避免全部集中在前几个账号
+        rng = np.random.default_rng(0)
+        scores += rng.uniform(0, 1e-3, scores.shape)
+        return scores, used_titles
+
+    def _published_today(self, username, accounts):
+        """每个账号今天已发布的商品数"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        counts = {row['_id']: row['count'] for row in self.db.products.aggregate([
+            {'$match': {
+                'username': username,
+                'account_id': {'$in': [str(a['_id']) for a in accounts]},
+                'status': 'published',
+                'published_at': {'$gte': today}
+            }},
+            {'$group': {'_id': '$account_id', 'count': {'$sum': 1}}}
+        ])}
+        return np.array([counts.get(str(a['_id']), 0) for a in accounts], dtype=np.int64)
+
+    def plan(self, username, data):
+        product_query = {'username': username}
+        if data.get('product_ids'):
+            product_query['_id'] = {'$in': [ObjectId(pid) for pid in data['product_ids']]}
+        else:
+            product_query['status'] = 'draft'
+        products = list(self.db.products.find(product_query, {'title': 1, 'category': 1}))
+
+        account_query = {'username': username}
+        if data.get('account_ids'):
+            account_query['_id'] = {'$in': [ObjectId(aid) for aid in data['account_ids']]}
+        accounts = list(self.db.accounts.find(account_query, {'_id': 1, 'username': 1}))
+
+        regions = [r for r in data.get('regions', list(REGION_MAPPING)) if r in REGION_MAPPING]
+        regions = regions or ['random']
+        quota = int(data.get('daily_quota', DEFAULT_DAILY_QUOTA))
+
+        if not products or not accounts:
+            return [], products, accounts
+
+        scores, used_titles = self._build_scores(username, products, accounts)
+        # 配额扣除账号今天已经发布的数量
+        quotas = np.maximum(quota - self._published_today(username, accounts), 0)
+        assignment = solve_assignment(
+            scores,
+            quotas,
+            [p.get('title', '') for p in products],
+            used_titles
+        )
+
+        # 地区分散：每个账号的商品轮流分配地区，账号之间错开起点
+        groups = {}
+        counters = np.zeros(len(accounts), dtype=np.int64)
+        for i, j in enumerate(assignment):
+            if j < 0:
+                continue
+            region = regions[(j + counters[j]) % len(regions)]
+            counters[j] += 1
+            groups.setdefault((int(j), region), []).append(str(products[i]['_id']))
+
+        plan = [{
+            'account_id': str(accounts[j]['_id']),
+            'account': accounts[j].get('username'),
+            'region': region,
+            'product_ids': product_ids
+        } for (j, region), product_ids in sorted(groups.items())]
+        return plan, products, accounts
+
+    def generate_matrix_strategy(self, username, data):
+        """生成铺货方案，execute=true 时直接提交批量发布"""
+        try:
+            start = time.perf_counter()
+            plan, products, accounts = self.plan(username, data)
+            elapsed = time.perf_counter() - start
+            assigned = sum(len(group['product_ids']) for group in plan)
+
+            message = f'已为 {assigned}/{len(products)} 个商品分配 {len(accounts)} 个账号'
+            if data.get('execute') and self.product_manager:
+                rejected = 0
+                for group in plan:
+                    response = self.product_manager.batch_publish(username, {
+                        'account_id': group['account_id'],
+                        'product_ids': group['product_ids'],
+                        'region': group['region'],
+                        'delay': data.get('delay', 0)
+                    })
+                    if isinstance(response, tuple):
+                        response = response[0]
+                    result = response.get_json()
+                    failed = [r for r in result.get('preflight', []) if not r['ok']]
+                    rejected += len(failed)
+                    group['submitted'] = result['success']
+                    group['task_id'] = result.get('task_id')
+                    group['message'] = result['message']
+                    group['rejected'] = failed
+                message += f'，已提交发布，{rejected} 个商品未通过发布前检查'
+
+            return jsonify({
+                'success': True,
+                'message': message,
+                'seconds': round(elapsed, 3),
+                'unassigned': len(products) - assigned,
+                'plan': plan
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'生成矩阵策略失败: {str(e)}'
+            }), 500
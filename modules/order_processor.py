@@ -11,12 +11,32 @@ from bson import ObjectId
 from playwright.sync_api import sync_playwright
 import threading
 import time
+import hashlib
+from pymongo import InsertOne, UpdateOne
+from modules.response_cache import response_cache
+from modules.job_queue import JobQueue, queue_enabled
+from modules.response_capture import capture_json, parse_order_rows, ORDER_API_PATTERNS
+from modules.write_buffer import WriteBuffer
+from modules.retry_policy import StepError, classify, PLATFORM_REJECTION
+from modules.account_health import AccountHealth, account_ok
+from modules.product_manager import ProductManager
+
+MAX_DEFERRALS = 3  # 账号熔断时发货任务最多延后的次数
+
+def order_fingerprint(*fields):
+    """订单行内容指纹"""
+    return hashlib.sha1('|'.join(str(f) for f in fields).encode('utf-8')).hexdigest()[:16]
 
 class OrderProcessor:
-    def __init__(self, db):
+    def __init__(self, db, product_manager=None):
         self.db = db
+        # 登录和页面打开复用同一个商品管理器及其浏览器，不再每个任务新建
+        self.product_manager = product_manager or ProductManager(db)
         self.browser = None
         self.browser_lock = threading.Lock()
+        self.job_queue = JobQueue(db) if queue_enabled() else None
+        self.write_buffer = WriteBuffer.shared(db)
+        self.account_health = AccountHealth(db)
     
     def _get_browser(self):
         """获取浏览器实例，懒加载模式"""
@@ -30,10 +50,6 @@ class OrderProcessor:
         """获取用户的所有订单"""
         try:
             orders = list(self.db.orders.find({'username': username}).sort('created_at', -1))
-            for order in orders:
-                order['_id'] = str(order['_id'])
-                if 'account_id' in order and order['account_id']:
-                    order['account_id'] = str(order['account_id'])
             
             return jsonify({
                 'success': True,
@@ -45,8 +61,8 @@ class OrderProcessor:
                 'message': f'获取订单失败: {str(e)}'
             }), 500
     
-    def fetch_orders(self, username, account_id):
-        """从咸鱼平台抓取订单"""
+    def fetch_orders(self, username, account_id, mode='auto', sessions=None):
+        """从咸鱼平台抓取订单，传入 sessions 时复用账号的已登录会话"""
         try:
             # 验证账号是否存在
             account = self.db.accounts.find_one({
@@ -61,77 +77,63 @@ class OrderProcessor:
                 }
             
             # 执行订单抓取
-            browser = self._get_browser()
-            page = browser.new_page()
-            
-            # 登录咸鱼
-            from modules.product_manager import ProductManager
-            product_manager = ProductManager(self.db)
-            login_result = product_manager._login_xianyu(page, account['username'], account['password'])
+            if sessions is not None:
+                page, login_result = sessions.new_page(account)
+                if page is None:
+                    return login_result
+            else:
+                browser = self._get_browser()
+                page = browser.new_page()
+                
+                # 登录咸鱼
+                login_result = self.product_manager._login_xianyu(page, account['username'], account['password'])
+                
+                if not login_result['success']:
+                    page.close()
+                    return login_result
             
-            if not login_result['success']:
+            # 访问订单页面并抓取订单信息
+            orders = []
+            order_rows = self._load_sold_rows(page, mode)
+            if sessions is not None and sessions.is_logged_out(page):
                 page.close()
-                return login_result
-            
-            # 访问订单页面
-            page.goto('https://sell.2.taobao.com/auction/merchandise/soldlist.htm')
-            page.wait_for_load_state('networkidle')
+                sessions.invalidate(account_id)
+                return {
+                    'success': False,
+                    'message': '登录状态已失效，将在下次抓取时重新登录'
+                }
             
-            # 抓取订单信息
-            orders = []
-            order_rows = page.query_selector_all('.order-item')
+            # 一次查询已存在的订单号
+            existing_ids = set(self.db.orders.distinct('order_id', {
+                'account_id': account_id,
+                'order_id': {'$in': [row['order_id'] for row in order_rows]}
+            }))
             
-            for row in order_rows:
-                try:
-                    order_id_el = row.query_selector('.order-id')
-                    order_id = order_id_el.text_content().strip() if order_id_el else ''
-                    
-                    # 检查订单是否已存在
-                    existing_order = self.db.orders.find_one({
-                        'order_id': order_id,
-                        'account_id': account_id
-                    })
-                    
-                    if existing_order:
-                        continue
-                    
-                    title_el = row.query_selector('.item-title')
-                    title = title_el.text_content().strip() if title_el else '未知商品'
-                    
-                    price_el = row.query_selector('.item-price')
-                    price = float(price_el.text_content().replace('¥', '').strip()) if price_el else 0
-                    
-                    status_el = row.query_selector('.order-status')
-                    status = status_el.text_content().strip() if status_el else '未知状态'
-                    
-                    buyer_el = row.query_selector('.buyer-name')
-                    buyer = buyer_el.text_content().strip() if buyer_el else '未知买家'
-                    
-                    time_el = row.query_selector('.order-time')
-                    order_time = time_el.text_content().strip() if time_el else ''
-                    
-                    # 保存到数据库
-                    order_data = {
-                        'username': username,
-                        'account_id': account_id,
-                        'order_id': order_id,
-                        'title': title,
-                        'price': price,
-                        'status': status,
-                        'buyer': buyer,
-                        'order_time': order_time,
-                        'created_at': datetime.now(),
-                        'updated_at': datetime.now(),
-                        'shipped': False
-                    }
-                    
-                    self.db.orders.insert_one(order_data)
-                    orders.append(order_data)
-                except Exception as e:
+            for row_data in order_rows:
+                if row_data['order_id'] in existing_ids:
                     continue
+                existing_ids.add(row_data['order_id'])
+                
+                # 保存到数据库
+                order_data = {
+                    '_id': ObjectId(),
+                    'username': username,
+                    'account_id': account_id,
+                    'created_at': datetime.now(),
+                    'updated_at': datetime.now(),
+                    'shipped': False
+                }
+                order_data.update(row_data)
+                
+                self.write_buffer.add('orders', InsertOne(order_data))
+                orders.append(order_data)
             
             page.close()
             
+            if orders:
+                self.write_buffer.flush('orders')
+                response_cache.bump(username, 'orders')
+            
             return {
                 'success': True,
                 'message': f'成功获取 {len(orders)} 个新订单',
@@ -143,6 +145,61 @@ class OrderProcessor:
                 'message': f'获取订单失败: {str(e)}'
             }
     
+    def _load_sold_rows(self, page, mode='auto'):
+        """打开已卖出列表并提取订单行，优先解析页面自身的数据接口，未截获时退回DOM解析"""
+        url = 'https://sell.2.taobao.com/auction/merchandise/soldlist.htm'
+        
+        if mode != 'dom':
+            rows = parse_order_rows(capture_json(page, url, ORDER_API_PATTERNS))
+            if rows:
+                for row in rows:
+                    row['fingerprint'] = order_fingerprint(
+                        row['order_id'], row['title'], row['price'], row['status'], row['buyer']
+                    )
+                return rows
+        else:
+            page.goto(url)
+        
+        page.wait_for_load_state('networkidle')
+        
+        rows = []
+        for row in page.query_selector_all('.order-item'):
+            try:
+                rows.append(self._parse_order_row(row))
+            except Exception:
+                continue
+        return rows
+    
+    def _parse_order_row(self, row):
+        """解析已卖出列表中的一行订单，附带内容指纹用于变更检测"""
+        order_id_el = row.query_selector('.order-id')
+        order_id = order_id_el.text_content().strip() if order_id_el else ''
+        
+        title_el = row.query_selector('.item-title')
+        title = title_el.text_content().strip() if title_el else '未知商品'
+        
+        price_el = row.query_selector('.item-price')
+        price = float(price_el.text_content().replace('¥', '').strip()) if price_el else 0
+        
+        status_el = row.query_selector('.order-status')
+        status = status_el.text_content().strip() if status_el else '未知状态'
+        
+        buyer_el = row.query_selector('.buyer-name')
+        buyer = buyer_el.text_content().strip() if buyer_el else '未知买家'
+        
+        time_el = row.query_selector('.order-time')
+        order_time = time_el.text_content().strip() if time_el else ''
+        
+        return {
+            'order_id': order_id,
+            'title': title,
+            'price': price,
+            'status': status,
+            'buyer': buyer,
+            'order_time': order_time,
+            'fingerprint': order_fingerprint(order_id, title, price, status, buyer)
+        }
+    
     def ship_orders(self, username, data):
         """发货处理"""
         try:
@@ -182,28 +239,121 @@ class OrderProcessor:
                     'message': '账号不存在或无权限使用'
                 }), 404
             
-            # 异步执行发货任务
-            def shipping_task():
-                results = []
-                browser = self._get_browser()
-                page = browser.new_page()
-                
-                # 登录咸鱼
-                from modules.product_manager import ProductManager
-                product_manager = ProductManager(self.db)
-                login_result = product_manager._login_xianyu(page, account['username'], account['password'])
-                
-                if not login_result['success']:
-                    page.close()
-                    return
-                
-                for order_id_str in order_ids:
+            task_id, not_before = self._dispatch_shipping(
+                username, account, order_ids, logistics_company, logistics_number
+            )
+            
+            message = f'已提交 {len(order_ids)} 个订单的发货'
+            if not_before:
+                message += f"，账号熔断中，将于 {not_before.strftime('%H:%M:%S')} 后执行"
+            
+            return jsonify({
+                'success': True,
+                'message': f'{message}，请稍后查看结果',
+                'task_id': task_id
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'发货处理失败: {str(e)}'
+            }), 500
+    
+    def _dispatch_shipping(self, username, account, order_ids, logistics_company, logistics_number, deferrals=0):
+        """派发发货任务，账号熔断中时延后到可以重试的时间，返回 (任务ID, 延后到的时间)"""
+        account_id = str(account['_id'])
+        not_before = None
+        if not self.account_health.available(account_id):
+            not_before = self.account_health.retry_at(account_id)
+        
+        if self.job_queue is not None:
+            # 交给独立的自动化工作进程执行
+            task_id = self.job_queue.enqueue('ship', username, account_id, {
+                'order_ids': order_ids,
+                'logistics_company': logistics_company,
+                'logistics_number': logistics_number,
+                'deferrals': deferrals
+            }, not_before)
+            return task_id, not_before
+        
+        # 启动异步任务
+        args = (username, account, order_ids, logistics_company, logistics_number, deferrals)
+        if not_before:
+            thread = threading.Timer(max((not_before - datetime.now()).total_seconds(), 0), self.run_shipping_task, args)
+        else:
+            thread = threading.Thread(target=self.run_shipping_task, args=args)
+        thread.daemon = True
+        thread.start()
+        return None, not_before
+    
+    def _defer_shipping(self, username, account, order_ids, logistics_company, logistics_number, deferrals):
+        """账号熔断时延后剩余订单，超过延后次数则放弃"""
+        if deferrals >= MAX_DEFERRALS:
+            return [{
+                'order_id': order_id_str,
+                'success': False,
+                'message': '账号持续不可用，已放弃发货'
+            } for order_id_str in order_ids]
+        
+        task_id, not_before = self._dispatch_shipping(
+            username, account, order_ids, logistics_company, logistics_number, deferrals + 1
+        )
+        message = f"账号熔断中，将于 {not_before.strftime('%H:%M:%S')} 后重试" if not_before else '账号熔断中，已延后'
+        return [{
+            'order_id': order_id_str,
+            'success': False,
+            'deferred': True,
+            'message': message,
+            'task_id': task_id
+        } for order_id_str in order_ids]
+    
+    def run_shipping_task(self, username, account, order_ids, logistics_company, logistics_number, deferrals=0,
+                          sessions=None):
+        """用一个已登录页面依次处理一个账号下的订单发货，账号熔断后剩余订单延后；
+        传入 sessions 时复用账号的已登录会话，调用方需持有该账号的 account_lock"""
+        account_id = str(account['_id'])
+        if not self.account_health.allow(account_id):
+            return self._defer_shipping(username, account, order_ids, logistics_company, logistics_number, deferrals)
+        
+        results = []
+        
+        # 登录咸鱼，超时和导航错误会重试
+        product_manager = self.product_manager
+        policy = product_manager.retry_policy
+        login_attempts = []
+        start = time.time()
+        try:
+            page = product_manager._open_page(account, login_attempts, sessions)
+            # 登录成功即说明账号可用，同时结束可能占用的半开探测
+            self.account_health.record(account_id, True, time.time() - start)
+        except StepError as e:
+            self.account_health.record(account_id, False, error_kind=e.kind, error=str(e))
+            if not self.account_health.available(account_id):
+                return self._defer_shipping(username, account, order_ids, logistics_company, logistics_number, deferrals)
+            return [{
+                'order_id': order_id_str,
+                'success': False,
+                'message': f'账号登录失败: {str(e)}',
+                'error_kind': e.kind,
+                'attempts': login_attempts
+            } for order_id_str in order_ids]
+        
+        # 每个订单要操作浏览器数秒，批处理期间暂缓定时写入，结束时一次写入
+        try:
+            with self.write_buffer.hold('orders'):
+                for index, order_id_str in enumerate(order_ids):
+                    if index and not self.account_health.allow(account_id):
+                        results.extend(self._defer_shipping(
+                            username, account, order_ids[index:], logistics_company, logistics_number, deferrals
+                        ))
+                        break
+                    attempts = []
+                    start = time.time()
                     try:
                         order = self.db.orders.find_one({
                             '_id': ObjectId(order_id_str),
                             'username': username
                         })
-                        
+                
                         if not order:
                             results.append({
                                 'order_id': order_id_str,
@@ -211,114 +361,135 @@ class OrderProcessor:
                                 'message': '订单不存在或无权限操作'
                             })
                             continue
-                        
+                
                         # 咸鱼订单号
                         xianyu_order_id = order.get('order_id')
-                        
+                
                         # 访问订单详情页
-                        page.goto(f'https://sell.2.taobao.com/auction/merchandise/soldOrderDetail.htm?orderId={xianyu_order_id}')
-                        page.wait_for_load_state('networkidle')
-                        
+                        def open_order():
+                            page.goto(f'https://sell.2.taobao.com/auction/merchandise/soldOrderDetail.htm?orderId={xianyu_order_id}')
+                            page.wait_for_load_state('networkidle')
+                            return page.query_selector('button.ship-btn')
+                        ship_button = policy.run('open', open_order, attempts)
+                        product_manager._check_session(page, account, sessions)
+                
                         # 点击发货按钮
-                        ship_button = page.query_selector('button.ship-btn')
                         if ship_button:
-                            ship_button.click()
-                            page.wait_for_selector('div.logistics-panel')
-                            
-                            # 选择物流公司
-                            page.click('div.logistics-company-select')
-                            page.wait_for_selector('ul.company-list')
-                            
-                            # 查找并选择匹配的物流公司
-                            companies = page.query_selector_all('li.company-item')
-                            company_found = False
-                            
-                            for company in companies:
-                                company_name = company.text_content().strip()
-                                if logistics_company in company_name:
-                                    company.click()
-                                    company_found = True
-                                    break
-                            
-                            if not company_found:
-                                # 选择第一个公司
-                                companies[0].click()
-                            
-                            # 输入物流单号
-                            page.fill('input.logistics-number-input', logistics_number)
-                            
-                            # 点击确认发货
-                            page.click('button.confirm-ship-btn')
-                            
-                            # 等待操作结果
-                            page.wait_for_timeout(2000)
-                            
-                            # 检查是否发货成功
-                            if '已发货' in page.content():
-                                # 更新数据库
-                                self.db.orders.update_one(
-                                    {'_id': ObjectId(order_id_str)},
-                                    {'$set': {
-                                        'shipped': True,
-                                        'logistics_company': logistics_company,
-                                        'logistics_number': logistics_number,
-                                        'ship_time': datetime.now(),
-                                        'updated_at': datetime.now()
-                                    }}
-                                )
-                                
-                                results.append({
-                                    'order_id': order_id_str,
-                                    'success': True,
-                                    'message': '发货成功'
-                                })
-                            else:
-                                results.append({
-                                    'order_id': order_id_str,
-                                    'success': False,
-                                    'message': '发货操作未成功'
-                                })
+                            def fill_logistics():
+                                page.query_selector('button.ship-btn').click()
+                                page.wait_for_selector('div.logistics-panel')
+                        
+                                # 选择物流公司
+                                page.click('div.logistics-company-select')
+                                page.wait_for_selector('ul.company-list')
+                        
+                                # 查找并选择匹配的物流公司
+                                companies = page.query_selector_all('li.company-item')
+                                company_found = False
+                        
+                                for company in companies:
+                                    company_name = company.text_content().strip()
+                                    if logistics_company in company_name:
+                                        company.click()
+                                        company_found = True
+                                        break
+                        
+                                if not company_found:
+                                    # 选择第一个公司
+                                    companies[0].click()
+                        
+                                # 输入物流单号
+                                page.fill('input.logistics-number-input', logistics_number)
+                            policy.run('logistics', fill_logistics, attempts)
+                    
+                            # 点击确认发货，提交不是幂等操作，不重试
+                            def confirm():
+                                page.click('button.confirm-ship-btn')
+                        
+                                # 等待操作结果
+                                page.wait_for_timeout(2000)
+                        
+                                # 检查是否发货成功
+                                if '已发货' not in page.content():
+                                    raise StepError(PLATFORM_REJECTION, '发货操作未成功')
+                            policy.run('confirm', confirm, attempts, retry=False)
+                    
+                            # 更新数据库
+                            self.write_buffer.add('orders', UpdateOne(
+                                {'_id': ObjectId(order_id_str)},
+                                {'$set': {
+                                    'shipped': True,
+                                    'logistics_company': logistics_company,
+                                    'logistics_number': logistics_number,
+                                    'ship_time': datetime.now(),
+                                    'updated_at': datetime.now()
+                                }}
+                            ))
+                    
+                            self.account_health.record(account_id, True, time.time() - start)
+                            results.append({
+                                'order_id': order_id_str,
+                                'success': True,
+                                'message': '发货成功',
+                                'attempts': attempts
+                            })
                         else:
                             results.append({
                                 'order_id': order_id_str,
                                 'success': False,
-                                'message': '该订单状态不支持发货'
+                                'message': '该订单状态不支持发货',
+                                'error_kind': PLATFORM_REJECTION,
+                                'attempts': attempts
                             })
-                        
+                
                         # 间隔一下，避免操作过快
                         time.sleep(2)
+                    except StepError as e:
+                        self.account_health.record(account_id, account_ok(False, e.kind, e.step), time.time() - start,
+                                                   e.kind, str(e))
+                        results.append({
+                            'order_id': order_id_str,
+                            'success': False,
+                            'message': f'发货过程出错: {str(e)}' if e.__cause__ else str(e),
+                            'error_kind': e.kind,
+                            'attempts': attempts
+                        })
+                        if page.is_closed():
+                            # 复用的会话被登出，重新登录后继续处理剩余订单
+                            try:
+                                page = product_manager._open_page(account, attempts, sessions)
+                            except StepError as login_error:
+                                results.extend({
+                                    'order_id': remaining_id,
+                                    'success': False,
+                                    'message': f'账号登录失败: {str(login_error)}',
+                                    'error_kind': login_error.kind
+                                } for remaining_id in order_ids[index + 1:])
+                                break
                     except Exception as e:
                         results.append({
                             'order_id': order_id_str,
                             'success': False,
-                            'message': f'发货过程出错: {str(e)}'
+                            'message': f'发货过程出错: {str(e)}',
+                            'error_kind': classify(e),
+                            'attempts': attempts
                         })
-                
+        finally:
+            # 非会话页面独占一个浏览器上下文，关闭页面时一并关闭
+            if not page.is_closed():
                 page.close()
-                
-                # 将结果保存到任务历史
-                self.db.shipping_tasks.insert_one({
-                    'username': username,
-                    'account_id': account_id,
-                    'order_ids': order_ids,
-                    'results': results,
-                    'created_at': datetime.now()
-                })
-            
-            # 启动异步任务
-            thread = threading.Thread(target=shipping_task)
-            thread.daemon = True
-            thread.start()
-            
-            return jsonify({
-                'success': True,
-                'message': f'已开始处理 {len(order_ids)} 个订单的发货，请稍后查看结果'
-            })
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'message': f'发货处理失败: {str(e)}'
-            }), 500
+        response_cache.bump(username, 'orders')
+        
+        # 将结果保存到任务历史
+        self.db.shipping_tasks.insert_one({
+            'username': username,
+            'account_id': account_id,
+            'order_ids': order_ids,
+            'results': results,
+            'created_at': datetime.now()
+        })
+        
+        return results
     
     def generate_qrcode(self, username, data):
         """生成商品二维码"""
@@ -380,7 +551,7 @@ class OrderProcessor:
                 'created_at': datetime.now()
             }
             
-            self.db.qrcodes.insert_one(qr_data)
+            self.write_buffer.add('qrcodes', InsertOne(qr_data))
             
             return jsonify({
                 'success': True,
@@ -404,6 +575,17 @@ class OrderProcessor:
             results = []
             for account in accounts:
                 account_id = str(account['_id'])
+                if self.job_queue is not None:
+                    # 每个账号一个任务，由持有该账号会话的工作进程执行
+                    job_id = self.job_queue.enqueue('fetch_orders', username, account_id, {})
+                    results.append({
+                        'account': account.get('username'),
+                        'account_id': account_id,
+                        'success': True,
+                        'message': '已提交抓取任务',
+                        'task_id': job_id
+                    })
+                    continue
                 result = self.fetch_orders(username, account_id)
                 results.append({
                     'account': account.get('username'),
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from datetime import datetime
+from pymongo import UpdateOne
+from modules.response_cache import response_cache
+from modules.retry_policy import StepError, classify, AUTH, NAVIGATION
+from modules.account_health import AccountHealth, account_ok
+
+FAST_INTERVAL = 120     # 秒，有未完成订单时的轮询间隔
+SLOW_INTERVAL = 1800    # 秒，空闲账号的最长轮询间隔
+CLOSED_STATUSES = ('交易成功', '交易关闭', '已退款')
+
+
+class OrderWatcher:
+    """订单状态监控：按账号自适应轮询已卖出列表，只写入指纹发生变化的订单"""
+
+    def __init__(self, db, sessions, order_processor):
+        self.db = db
+        self.sessions = sessions
+        self.order_processor = order_processor
+        self.account_health = AccountHealth(db)
+        self.next_poll = {}   # 账号ID -> 下次轮询时间戳
+        self.intervals = {}   # 账号ID -> 当前轮询间隔
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def subscribe(self, callback):
+        """注册订单变更回调，参数为变更事件字典"""
+        self.listeners.append(callback)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.wait(5):
+            try:
+                accounts = list(self.db.accounts.find({}, {'username': 1, 'password': 1}))
+            except Exception:
+                continue
+            for account in accounts:
+                account_id = str(account['_id'])
+                if self.next_poll.get(account_id, 0) > time.time():
+                    continue
+                try:
+                    self._poll(account)
+                except Exception:
+                    # 数据库暂时不可用等异常不能让监控线程退出，稍后再试
+                    self.next_poll[account_id] = time.time() + FAST_INTERVAL
+        # 会话按线程持有浏览器，退出前关闭本线程的浏览器
+        self.sessions.close()
+
+    def _poll(self, account):
+        """轮询一个账号并记录健康度，熔断中的账号等冷却结束后再轮询"""
+        account_id = str(account['_id'])
+        if not self.account_health.allow(account_id):
+            self.next_poll[account_id] = self.account_health.retry_at(account_id).timestamp()
+            return
+
+        start = time.time()
+        try:
+            with self.sessions.account_lock(account_id):
+                changes = self.poll_account(account)
+        except Exception as e:
+            kind = classify(e)
+            step = e.step if isinstance(e, StepError) else None
+            self.account_health.record(account_id, account_ok(False, kind, step), error_kind=kind, error=str(e))
+            self._backoff(account_id)
+            return
+
+        self.account_health.record(account_id, True, time.time() - start)
+        self._reschedule(account_id, changes)
+
+    def _backoff(self, account_id):
+        """失败后按间隔翻倍退避，账号熔断时不早于冷却结束"""
+        interval = min(self.intervals.get(account_id, FAST_INTERVAL) * 2, SLOW_INTERVAL)
+        self.intervals[account_id] = interval
+        next_poll = time.time() + interval
+        if not self.account_health.available(account_id):
+            next_poll = max(next_poll, self.account_health.retry_at(account_id).timestamp())
+        self.next_poll[account_id] = next_poll
+
+    def _reschedule(self, account_id, changes):
+        """有变化或有未完成订单时加快，否则逐步放慢到最长间隔"""
+        has_open = self.db.orders.count_documents({
+            'account_id': account_id,
+            'status': {'$nin': list(CLOSED_STATUSES)}
+        }, limit=1) > 0
+
+        if changes or has_open:
+            interval = FAST_INTERVAL
+        else:
+            interval = min(self.intervals.get(account_id, FAST_INTERVAL) * 2, SLOW_INTERVAL)
+
+        self.intervals[account_id] = interval
+        self.next_poll[account_id] = time.time() + interval
+
+    def poll_account(self, account):
+        """抓取一个账号的订单列表并写入变化，返回变化的订单数；登录失败或登录态失效时抛出 StepError"""
+        account_id = str(account['_id'])
+
+        page, login_result = self.sessions.new_page(account)
+        if page is None:
+            raise StepError(AUTH, login_result.get('message', '登录失败'), 'login')
+
+        try:
+            rows = self.order_processor._load_sold_rows(page)
+            if self.sessions.is_logged_out(page):
+                self.sessions.invalidate(account_id)
+                raise StepError(NAVIGATION, '登录状态已失效，将在下次轮询时重新登录')
+        finally:
+            page.close()
+
+        return self.apply_rows(account['username'], account_id, rows)
+
+    def apply_rows(self, username, account_id, rows):
+        """一次查询比对已存指纹，只对新增和变化的订单批量写入，返回状态变化（含新增）的订单数"""
+        rows = [row for row in rows if row.get('order_id')]
+        if not rows:
+            return 0
+
+        stored = {
+            doc['order_id']: doc for doc in self.db.orders.find(
+                {'account_id': account_id, 'order_id': {'$in': [row['order_id'] for row in rows]}},
+                {'order_id': 1, 'fingerprint': 1, 'status': 1}
+            )
+        }
+
+        now = datetime.now()
+        operations = []
+        events = []
+        for row in rows:
+            existing = stored.get(row['order_id'])
+            if existing and existing.get('fingerprint') == row['fingerprint']:
+                continue
+
+            if existing:
+                operations.append(UpdateOne(
+                    {'_id': existing['_id']},
+                    {'$set': {
+                        'status': row['status'],
+                        'price': row['price'],
+                        'fingerprint': row['fingerprint'],
+                        'updated_at': now
+                    }}
+                ))
+            else:
+                new_order = {
+                    'username': username,
+                    'account_id': account_id,
+                    'created_at': now,
+                    'updated_at': now,
+                    'shipped': False
+                }
+                new_order.update(row)
+                operations.append(UpdateOne(
+                    {'account_id': account_id, 'order_id': row['order_id']},
+                    {'$setOnInsert': new_order},
+                    upsert=True
+                ))
+
+            # 只有状态变化才通知，指纹变化（旧文档没有指纹、价格格式不同等）只更新存储
+            if existing and existing.get('status') == row['status']:
+                continue
+            events.append({
+                'username': username,
+                'account_id': account_id,
+                'order_id': row['order_id'],
+                'old_status': existing.get('status') if existing else None,
+                'new_status': row['status'],
+                'created_at': now
+            })
+
+        if operations:
+            self.db.orders.bulk_write(operations, ordered=False)
+            response_cache.bump(username, 'orders')
+        if events:
+            self.db.order_events.insert_many([dict(event) for event in events], ordered=False)
+            for event in events:
+                for callback in self.listeners:
+                    try:
+                        callback(event)
+                    except Exception:
+                        continue
+
+        return len(events)
+
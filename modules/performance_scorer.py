@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from flask import jsonify
+from pymongo import UpdateOne
+from modules.response_cache import response_cache
+
+DEFAULT_WEIGHTS = {
+    'orders_per_day': 0.5,
+    'wants': 0.3,
+    'views': 0.2
+}
+DEFAULT_THRESHOLDS = {
+    'min_days': 7,      # 上架不满该天数的商品不参与差品判断
+    'score': 30,        # 得分低于该值判定为差品
+    'max_orders': 0     # 订单数超过该值的商品不判定为差品
+}
+
+
+class PerformanceScorer:
+    """差品检测：一次聚合取得全部商品及其订单数，向量化打分并批量写回"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _load(self, username):
+        """商品关联订单数在服务端完成（订单按标题关联商品），子管道只统计本用户的订单数，不取回订单文档"""
+        cursor = self.db.products.aggregate([
+            {'$match': {'username': username, 'status': {'$ne': 'offline'}}},
+            {'$lookup': {
+                'from': 'orders',
+                'let': {'title': '$title'},
+                'pipeline': [
+                    {'$match': {'username': username, '$expr': {'$eq': ['$title', '$$title']}}},
+                    {'$count': 'count'}
+                ],
+                'as': 'orders'
+            }},
+            {'$project': {
+                'title': 1,
+                'status': 1,
+                'created_at': 1,
+                'wants': {'$ifNull': ['$want_count', 0]},
+                'views': {'$ifNull': ['$views', 0]},
+                'orders': {'$ifNull': [{'$arrayElemAt': ['$orders.count', 0]}, 0]}
+            }}
+        ], allowDiskUse=True)
+        return pd.DataFrame(list(cursor), columns=['_id', 'title', 'status', 'created_at',
+                                                  'wants', 'views', 'orders'])
+
+    @staticmethod
+    def score(df, weights=None, thresholds=None, now=None):
+        """按各指标在全部商品中的百分位加权得到 0-100 分"""
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        now = now or datetime.now()
+
+        df = df.copy()
+        created = pd.to_datetime(df['created_at']).fillna(pd.Timestamp(now))
+        df['days_listed'] = ((pd.Timestamp(now) - created).dt.total_seconds() / 86400).clip(lower=0)
+        df['orders_per_day'] = df['orders'] / np.maximum(df['days_listed'], 1)
+
+        # 未知指标的权重不计入总权重，否则会压低所有商品的得分
+        weights = {metric: weight for metric, weight in weights.items() if metric in df}
+        total_weight = sum(weights.values()) or 1
+        df['score'] = 0.0
+        for metric, weight in weights.items():
+            if len(df):
+                df['score'] += df[metric].rank(pct=True, method='average') * weight
+        df['score'] = (df['score'] / total_weight * 100).round(2)
+
+        df['poor'] = ((df['days_listed'] >= thresholds['min_days'])
+                      & (df['score'] < thresholds['score'])
+                      & (df['orders'] <= thresholds['max_orders']))
+        return df
+
+    def score_products(self, username, data):
+        """为用户全部商品打分并写回商品文档"""
+        try:
+            df = self.score(self._load(username), data.get('weights'), data.get('thresholds'))
+
+            now = datetime.now()
+            operations = [
+                UpdateOne({'_id': row._id}, {'$set': {
+                    'performance': {
+                        'score': float(row.score),
+                        'days_listed': round(float(row.days_listed), 1),
+                        'orders': int(row.orders),
+                        'poor': bool(row.poor),
+                        'scored_at': now
+                    }
+                }})
+                for row in df.itertuples(index=False)
+            ]
+            for i in range(0, len(operations), 1000):
+                self.db.products.bulk_write(operations[i:i + 1000], ordered=False)
+            response_cache.bump(username, 'products')
+
+            poor = df[df['poor']].sort_values('score')
+            return jsonify({
+                'success': True,
+                'message': f'已评分 {len(df)} 个商品，其中差品 {len(poor)} 个',
+                'count': len(df),
+                'poor_count': len(poor),
+                'poor_products': [
+                    {'_id': str(row._id), 'title': row.title, 'score': float(row.score),
+                     'days_listed': round(float(row.days_listed), 1), 'orders': int(row.orders)}
+                    for row in poor.head(200).itertuples(index=False)
+                ]
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'商品评分失败: {str(e)}'
+            }), 500
+
+    def mark_poor_offline(self, username, data):
+        """把已评分为差品（或低于指定分数）的商品在库中标记为下线，不操作平台上的在售商品"""
+        try:
+            query = {'username': username, 'status': {'$ne': 'offline'}}
+            if data.get('threshold') is not None:
+                query['performance.score'] = {'$lt': float(data['threshold'])}
+            else:
+                query['performance.poor'] = True
+
+            if data.get('dry_run'):
+                return jsonify({
+                    'success': True,
+                    'dry_run': True,
+                    'count': self.db.products.count_documents(query)
+                })
+
+            result = self.db.products.update_many(query, {'$set': {
+                'status': 'offline',
+                'updated_at': datetime.now()
+            }})
+            response_cache.bump(username, 'products')
+
+            return jsonify({
+                'success': True,
+                'message': f'已将 {result.modified_count} 个差品标记为下线，平台上的商品需另行下架',
+                'count': result.modified_count,
+                'platform_updated': False
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'标记差品下线失败: {str(e)}'
+            }), 500
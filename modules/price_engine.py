@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import threading
+from datetime import datetime
+import numpy as np
+from flask import jsonify
+from bson import ObjectId
+from pymongo import UpdateOne
+from playwright.sync_api import sync_playwright
+from modules.response_cache import response_cache
+
+MIN_PRICE = 0.01
+
+
+def apply_rules(prices, categories, rules):
+    """对一组价格按顺序向量化应用调价规则
+
+    规则类型：
+    percent  按百分比降价，value为降幅（10表示降10%）
+    cut_to   降至指定价格（高于该价格的降到该价格）
+    floor    最低价保护，不低于value
+    round_99 尾数取.99（不高于原价），低于1元的价格不处理
+    每条规则可带 category，只作用于该分类路径开头的商品
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    categories = np.asarray([c or '' for c in categories], dtype=object)
+    result = prices.copy()
+
+    for rule in rules:
+        mask = np.ones(len(result), dtype=bool)
+        if rule.get('category'):
+            prefix = rule['category']
+            mask = np.fromiter((c.startswith(prefix) for c in categories), dtype=bool, count=len(categories))
+
+        rule_type = rule.get('type')
+        value = float(rule.get('value', 0))
+        if rule_type == 'percent':
+            adjusted = result * (1 - value / 100)
+        elif rule_type == 'cut_to':
+            adjusted = np.minimum(result, value)
+        elif rule_type == 'floor':
+            adjusted = np.maximum(result, value)
+        elif rule_type == 'round_99':
+            adjusted = np.where(result >= 1, np.floor(result + 0.01) - 0.01, result)
+        else:
+            raise ValueError(f'未知的调价规则: {rule_type}')
+
+        result = np.where(mask, adjusted, result)
+
+    return np.maximum(np.round(result, 2), MIN_PRICE)
+
+
+class PriceEngine:
+    """批量调价：规则向量化计算，预览后一次批量写入并记录价格历史"""
+
+    def __init__(self, db, product_manager):
+        self.db = db
+        self.product_manager = product_manager
+
+    def _evaluate(self, username, data):
+        query = {'username': username}
+        if data.get('product_ids'):
+            query['_id'] = {'$in': [ObjectId(pid) for pid in data['product_ids']]}
+        if data.get('category'):
+            query['category'] = {'$regex': f"^{re.escape(data['category'])}"}
+
+        products = list(self.db.products.find(query, {'title': 1, 'price': 1, 'category': 1}))
+        old_prices = np.array([float(p.get('price') or 0) for p in products], dtype=np.float64)
+        new_prices = apply_rules(old_prices, [p.get('category') for p in products], data.get('rules', []))
+        changed = np.flatnonzero(np.abs(new_prices - old_prices) >= 0.005)
+        return products, old_prices, new_prices, changed
+
+    def adjust_prices(self, username, data):
+        """调价：默认只返回预览差异，confirm=true 时写入"""
+        try:
+            if not data.get('rules'):
+                return jsonify({
+                    'success': False,
+                    'message': '未提供调价规则'
+                }), 400
+
+            products, old_prices, new_prices, changed = self._evaluate(username, data)
+
+            diff = [{
+                'product_id': str(products[i]['_id']),
+                'title': products[i].get('title', ''),
+                'old_price': float(old_prices[i]),
+                'new_price': float(new_prices[i])
+            } for i in changed]
+
+            if not data.get('confirm'):
+                return jsonify({
+                    'success': True,
+                    'preview': True,
+                    'count': len(diff),
+                    'changes': diff
+                })
+
+            now = datetime.now()
+            operations = [
+                UpdateOne({'_id': products[i]['_id'], 'username': username},
+                          {'$set': {'price': float(new_prices[i]), 'updated_at': now}})
+                for i in changed
+            ]
+            history = [{
+                'p': products[i]['_id'],
+                'u': username,
+                'o': float(old_prices[i]),
+                'n': float(new_prices[i]),
+                't': now
+            } for i in changed]
+
+            if operations:
+                self.db.products.bulk_write(operations, ordered=False)
+                self.db.price_history.insert_many(history, ordered=False)
+                response_cache.bump(username, 'products')
+
+            if data.get('sync') and diff:
+                self.sync_prices(username, [item['product_id'] for item in diff])
+
+            return jsonify({
+                'success': True,
+                'message': f'成功调整 {len(diff)} 个商品价格',
+                'count': len(diff),
+                'changes': diff
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'批量调价失败: {str(e)}'
+            }), 500
+
+    def get_price_history(self, username, product_id, limit=100):
+        """查询单个商品的价格历史"""
+        try:
+            records = self.db.price_history.find(
+                {'p': ObjectId(product_id), 'u': username}
+            ).sort('t', -1).limit(limit)
+
+            return jsonify({
+                'success': True,
+                'history': [{
+                    'old_price': r['o'],
+                    'new_price': r['n'],
+                    'created_at': r['t'].isoformat()
+                } for r in records]
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取价格历史失败: {str(e)}'
+            }), 500
+
+    def sync_prices(self, username, product_ids):
+        """按账号分组同步新价格到平台，后台线程持有自己的浏览器，逐个账号串行同步"""
+        products = self.db.products.find(
+            {'_id': {'$in': [ObjectId(pid) for pid in product_ids]},
+             'username': username, 'item_id': {'$exists': True}},
+            {'item_id': 1, 'price': 1, 'account_id': 1}
+        )
+
+        by_account = {}
+        for product in products:
+            if product.get('account_id'):
+                by_account.setdefault(product['account_id'], []).append(product)
+
+        if by_account:
+            thread = threading.Thread(target=self._sync_accounts, args=(username, by_account))
+            thread.daemon = True
+            thread.start()
+
+        return len(by_account)
+
+    def _sync_accounts(self, username, by_account):
+        """Playwright同步接口不能跨线程使用，浏览器在本线程内启动和关闭"""
+        playwright = sync_playwright().start()
+        browser = playwright.chromium.launch(headless=True)
+        try:
+            for account_id, items in by_account.items():
+                try:
+                    self._sync_account(browser, username, account_id, items)
+                except Exception:
+                    continue
+        finally:
+            browser.close()
+            playwright.stop()
+
+    def _sync_account(self, browser, username, account_id, items):
+        results = []
+        account = self.db.accounts.find_one({'_id': ObjectId(account_id), 'username': username})
+        if not account:
+            return
+
+        # 每个账号使用独立的上下文，登录状态互不影响
+        context = browser.new_context()
+        page = context.new_page()
+        try:
+            login_result = self.product_manager._login_xianyu(page, account['username'], account['password'])
+            if not login_result['success']:
+                return
+
+            for item in items:
+                try:
+                    page.goto(f"https://2.taobao.com/publish/edit.htm?itemId={item['item_id']}")
+                    page.wait_for_load_state('networkidle')
+                    page.fill('#price', str(item['price']))
+                    page.click('#J_PublishSubmit')
+                    page.wait_for_selector('.publish-success', timeout=10000)
+                    results.append({'product_id': str(item['_id']), 'success': True, 'message': '价格同步成功'})
+                except Exception as e:
+                    results.append({'product_id': str(item['_id']), 'success': False,
+                                    'message': f'价格同步失败: {str(e)}'})
+                time.sleep(2)
+        finally:
+            context.close()
+            self.db.publish_tasks.insert_one({
+                'username': username,
+                'account_id': account_id,
+                'type': 'price_sync',
+                'product_ids': [str(item['_id']) for item in items],
+                'results': results,
+                'created_at': datetime.now()
+            })
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 所有进程池统一使用 spawn 启动：Web 进程中有数据库连接、批量写入线程和 Playwright 线程，
+# fork 出的子进程会继承这些线程持有的锁；子进程以 __mp_main__ 导入入口文件，入口文件需跳过初始化
+START_METHOD = 'spawn'
+
+
+def create_pool(workers):
+    """创建以 START_METHOD 启动的进程池"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
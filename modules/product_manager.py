@@ -12,6 +12,31 @@ from playwright.sync_api import sync_playwright, TimeoutError
 import threading
 import time
 from bson import ObjectId
+from pymongo import UpdateOne
+from modules.image_cache import ImageCache, MAX_IMAGES
+from modules.template_engine import compile_template
+from modules.hot_trend import HotTrendEngine
+from modules.response_cache import response_cache
+from modules.job_queue import JobQueue, queue_enabled
+from modules.response_capture import capture_json, parse_search_items, SEARCH_API_PATTERNS
+from modules.write_buffer import WriteBuffer
+from modules.product_search import ProductSearch, index_fields, touches_text
+from modules.publish_preflight import PublishPreflight, PRICE_MIN, PRICE_MAX
+from modules.category_resolver import CategoryResolver, normalize_path
+from modules.retry_policy import (RetryPolicy, StepError, classify, AUTH, TIMEOUT, NAVIGATION,
+                                  SELECTOR_MISSING, PLATFORM_REJECTION)
+from modules.account_health import AccountHealth, account_ok
+
+MAX_DEFERRALS = 3  # 账号熔断时任务最多延后的次数
+
+# 发布地区选项
+REGION_MAPPING = {
+    'beijing': '北京',
+    'shanghai': '上海',
+    'guangzhou': '广州',
+    'shenzhen': '深圳',
+    'hangzhou': '杭州'
+}
 
 class ProductManager:
     def __init__(self, db):
@@ -19,6 +44,15 @@ class ProductManager:
         self.browser = None
         self.browser_lock = threading.Lock()
         self.max_retry = 3
+        self.image_cache = ImageCache()
+        self.hot_trend = HotTrendEngine(db)
+        self.job_queue = JobQueue(db) if queue_enabled() else None
+        self.write_buffer = WriteBuffer.shared(db)
+        self.preflight = PublishPreflight(db)
+        self.category_resolver = CategoryResolver(db, self.write_buffer)
+        self.retry_policy = RetryPolicy(self.max_retry)
+        self.account_health = AccountHealth(db)
+        self.product_search = ProductSearch(db)
     
     def _get_browser(self):
         """获取浏览器实例，懒加载模式"""
@@ -31,9 +65,7 @@ class ProductManager:
     def get_products(self, username):
         """获取用户的所有商品"""
         try:
-            products = list(self.db.products.find({'username': username}))
-            for product in products:
-                product['_id'] = str(product['_id'])
+            products = list(self.db.products.find({'username': username}, {'search_tokens': 0, 'search_version': 0}))
             
             return jsonify({
                 'success': True,
@@ -52,8 +84,10 @@ class ProductManager:
             product_data['created_at'] = datetime.now()
             product_data['updated_at'] = datetime.now()
             product_data['status'] = 'draft'  # 草稿状态
+            product_data.update(index_fields(product_data))
             
             result = self.db.products.insert_one(product_data)
+            response_cache.bump(username, 'products')
             
             return jsonify({
                 'success': True,
@@ -70,6 +104,8 @@ class ProductManager:
         """更新商品信息"""
         try:
             product_data['updated_at'] = datetime.now()
+            if touches_text(product_data):
+                product_data['search_version'] = 0  # 写入后立即重建词元，失败时由启动时的补建处理
             
             # 确保用户只能更新自己的商品
             result = self.db.products.update_one(
@@ -83,6 +119,10 @@ class ProductManager:
                     'message': '商品不存在或无权限修改'
                 }), 404
             
+            if touches_text(product_data):
+                self.product_search.refresh(username, [ObjectId(product_id)])
+            response_cache.bump(username, 'products')
+            
             return jsonify({
                 'success': True,
                 'message': '商品更新成功'
@@ -108,6 +148,8 @@ class ProductManager:
                     'message': '商品不存在或无权限删除'
                 }), 404
             
+            response_cache.bump(username, 'products')
+            
             return jsonify({
                 'success': True,
                 'message': '商品删除成功'
@@ -173,11 +215,13 @@ class ProductManager:
                         else:
                             product[field] = row[field]
                 
+                product.update(index_fields(product))
                 products.append(product)
             
             # 批量插入数据库
             if products:
                 self.db.products.insert_many(products)
+                response_cache.bump(username, 'products')
                 
             os.remove(temp_path)
             
@@ -196,9 +240,73 @@ class ProductManager:
                 'message': f'商品导入失败: {str(e)}'
             }), 500
     
+    def batch_update_descriptions(self, username, data):
+        """用描述模板批量重写商品描述，结果一次性批量写回"""
+        try:
+            template_id = data.get('template_id')
+            product_ids = data.get('product_ids')  # 不传则处理全部商品
+            defaults = data.get('defaults', {})
+            batch_size = 1000
+
+            template = self.db.templates.find_one({
+                '_id': ObjectId(template_id),
+                'username': username,
+                'type': 'description'
+            })
+
+            if not template:
+                return jsonify({
+                    'success': False,
+                    'message': '模板不存在或无权限使用'
+                }), 404
+
+            compiled = compile_template(template['content'])
+
+            query = {'username': username}
+            if product_ids:
+                query['_id'] = {'$in': [ObjectId(pid) for pid in product_ids]}
+
+            # 只取模板用到的字段
+            projection = {field: 1 for field in compiled.fields}
+            cursor = self.db.products.find(query, projection).batch_size(batch_size)
+
+            now = datetime.now()
+            updated = 0
+            operations = []
+            for product in cursor:
+                operations.append(UpdateOne(
+                    {'_id': product['_id']},
+                    {'$set': {
+                        'description': compiled.render(product, defaults),
+                        'search_version': 0,
+                        'updated_at': now
+                    }}
+                ))
+                if len(operations) >= batch_size:
+                    updated += self.db.products.bulk_write(operations, ordered=False).modified_count
+                    operations = []
+
+            if operations:
+                updated += self.db.products.bulk_write(operations, ordered=False).modified_count
+
+            self.product_search.refresh(username)
+            response_cache.bump(username, 'products')
+
+            return jsonify({
+                'success': True,
+                'message': f'成功更新 {updated} 个商品描述',
+                'count': updated
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'批量更新描述失败: {str(e)}'
+            }), 500
+    
     def batch_publish(self, username, data):
         """批量发布商品"""
-        product_ids = data.get('product_ids', [])
+        # 去重并保持顺序，重复的商品ID只发布一次
+        product_ids = list(dict.fromkeys(str(pid) for pid in data.get('product_ids') or []))
         account_id = data.get('account_id')
         delay = data.get('delay', 0)  # 延迟秒数
         region = data.get('region', 'random')  # 发布地区
@@ -208,6 +316,17 @@ class ProductManager:
                 'success': False,
                 'message': '未提供商品ID列表'
             }), 400
+        
+        try:
+            price_min = float(data.get('price_min', PRICE_MIN))
+            price_max = float(data.get('price_max', PRICE_MAX))
+        except (TypeError, ValueError):
+            price_min = price_max = None
+        if price_min is None or not 0 <= price_min <= price_max:
+            return jsonify({
+                'success': False,
+                'message': '价格范围无效，price_min 和 price_max 必须是数字且 0 ≤ price_min ≤ price_max'
+            }), 400
             
         # 验证账号是否存在
         account = self.db.accounts.find_one({
@@ -221,181 +340,323 @@ class ProductManager:
                 'message': '账号不存在或无权限使用'
             }), 404
         
-        # 异步执行发布任务
-        def publish_task():
-            results = []
-            for product_id in product_ids:
+        # 发布前检查，只有通过的商品进入浏览器发布
+        passed, report = self.preflight.check(username, product_ids, price_min, price_max)
+        rejected = len(report) - len(passed)
+        
+        if data.get('dry_run'):
+            return jsonify({
+                'success': True,
+                'message': f'{len(passed)} 个商品可以发布，{rejected} 个未通过检查',
+                'dry_run': True,
+                'preflight': report
+            })
+        
+        if not passed:
+            return jsonify({
+                'success': False,
+                'message': '没有通过发布前检查的商品',
+                'preflight': report
+            }), 400
+        
+        # 账号熔断中时改派给候选账号，没有可用账号时延后执行
+        fallback_ids = [aid for aid in data.get('fallback_account_ids', []) if aid != account_id]
+        task_id, dispatched_id, not_before = self._dispatch_publish(
+            username, account, passed, region, delay, fallback_ids
+        )
+        
+        message = f'已提交发布 {len(passed)} 个商品，{rejected} 个未通过检查'
+        if dispatched_id != account_id:
+            message += '，原账号熔断中，已改派到其它账号'
+        elif not_before:
+            message += f"，账号熔断中，将于 {not_before.strftime('%H:%M:%S')} 后执行"
+        
+        return jsonify({
+            'success': True,
+            'message': f'{message}，请稍后查看结果',
+            'task_id': task_id,
+            'account_id': dispatched_id,
+            'preflight': report
+        })
+    
+    def _dispatch_publish(self, username, account, product_ids, region, delay, fallback_ids=(), deferrals=0):
+        """按账号健康状态派发发布任务，返回 (任务ID, 实际使用的账号ID, 延后到的时间)"""
+        account_id = str(account['_id'])
+        not_before = None
+        if not self.account_health.available(account_id):
+            fallback = self.account_health.pick_healthy(username, fallback_ids) if fallback_ids else None
+            if fallback:
+                fallback_ids = [aid for aid in fallback_ids if aid != str(fallback['_id'])] + [account_id]
+                account, account_id = fallback, str(fallback['_id'])
+            else:
+                not_before = self.account_health.retry_at(account_id)
+        
+        if self.job_queue is not None:
+            # 交给独立的自动化工作进程执行
+            task_id = self.job_queue.enqueue('publish', username, account_id, {
+                'product_ids': product_ids,
+                'region': region,
+                'delay': delay,
+                'fallback_account_ids': list(fallback_ids),
+                'deferrals': deferrals
+            }, not_before)
+            return task_id, account_id, not_before
+        
+        # 启动异步任务
+        args = (username, account, product_ids, region, delay, fallback_ids, deferrals)
+        if not_before:
+            thread = threading.Timer(max((not_before - datetime.now()).total_seconds(), 0), self.run_publish_task, args)
+        else:
+            thread = threading.Thread(target=self.run_publish_task, args=args)
+        thread.daemon = True
+        thread.start()
+        return str(uuid.uuid4()), account_id, not_before
+    
+    def run_publish_task(self, username, account, product_ids, region='random', delay=0,
+                         fallback_ids=(), deferrals=0, sessions=None):
+        """依次发布一个账号下的商品并记录任务结果，账号熔断后剩余商品改派或延后；
+        传入 sessions（AccountSessions）时复用账号的已登录会话，调用方需持有该账号的 account_lock"""
+        account_id = str(account['_id'])
+        results = []
+        # 每个商品要操作浏览器数秒，批处理期间暂缓定时写入，结束时一次写入
+        with self.write_buffer.hold('products'):
+            for index, product_id in enumerate(product_ids):
+                if not self.account_health.allow(account_id):
+                    results.extend(self._defer_publish(
+                        username, account, product_ids[index:], region, delay, fallback_ids, deferrals
+                    ))
+                    break
                 try:
                     # 获取商品信息
                     product = self.db.products.find_one({
                         '_id': ObjectId(product_id),
                         'username': username
                     })
-                    
+                
                     if not product:
+                        # 没有用到账号，归还可能占用的半开探测
+                        self.account_health.release(account_id)
                         results.append({
                             'product_id': product_id,
                             'success': False,
                             'message': '商品不存在或无权限操作'
                         })
                         continue
-                    
+                
                     # 执行发布操作
-                    result = self._publish_product(account, product, region)
+                    start = time.time()
+                    result = self._publish_product(account, product, region, sessions)
+                    self.account_health.record(
+                        account_id, account_ok(result['success'], result.get('error_kind'), result.get('step')),
+                        time.time() - start, result.get('error_kind'), result['message']
+                    )
                     results.append({
                         'product_id': product_id,
                         'success': result['success'],
                         'message': result['message'],
-                        'item_id': result.get('item_id')
+                        'item_id': result.get('item_id'),
+                        'error_kind': result.get('error_kind'),
+                        'attempts': result.get('attempts', [])
                     })
-                    
+                
                     # 更新数据库中商品状态
                     update_data = {
                         'status': 'published' if result['success'] else 'failed',
                         'updated_at': datetime.now()
                     }
-                    
+                
                     if result['success'] and 'item_id' in result:
                         update_data['item_id'] = result['item_id']
-                    
-                    self.db.products.update_one(
+                        update_data['account_id'] = account_id
+                        update_data['published_at'] = update_data['updated_at']
+                
+                    self.write_buffer.add('products', UpdateOne(
                         {'_id': ObjectId(product_id)},
                         {'$set': update_data}
-                    )
-                    
+                    ))
+                
                     # 应用延迟
                     if delay > 0:
                         time.sleep(delay)
-                        
+            
                 except Exception as e:
+                    self.account_health.release(account_id)
                     results.append({
                         'product_id': product_id,
                         'success': False,
                         'message': f'发布失败: {str(e)}'
                     })
-            
-            # 将结果保存到任务历史
-            self.db.publish_tasks.insert_one({
-                'username': username,
-                'account_id': account_id,
-                'product_ids': product_ids,
-                'results': results,
-                'created_at': datetime.now()
-            })
         
-        # 启动异步任务
-        thread = threading.Thread(target=publish_task)
-        thread.daemon = True
-        thread.start()
+        response_cache.bump(username, 'products')
         
-        return jsonify({
-            'success': True,
-            'message': f'已开始发布 {len(product_ids)} 个商品，请稍后查看结果',
-            'task_id': str(uuid.uuid4())
+        # 将结果保存到任务历史
+        self.db.publish_tasks.insert_one({
+            'username': username,
+            'account_id': account_id,
+            'product_ids': product_ids,
+            'results': results,
+            'created_at': datetime.now()
         })
+        
+        return results
+    
+    def _defer_publish(self, username, account, product_ids, region, delay, fallback_ids, deferrals):
+        """账号熔断时把剩余商品改派或延后，超过延后次数则放弃"""
+        if deferrals >= MAX_DEFERRALS:
+            return [{
+                'product_id': product_id,
+                'success': False,
+                'message': '账号持续不可用，已放弃发布'
+            } for product_id in product_ids]
+        
+        task_id, account_id, not_before = self._dispatch_publish(
+            username, account, product_ids, region, delay, fallback_ids, deferrals + 1
+        )
+        if account_id != str(account['_id']):
+            message = '账号熔断中，已改派到其它账号'
+        else:
+            message = f"账号熔断中，将于 {not_before.strftime('%H:%M:%S')} 后重试" if not_before else '账号熔断中，已延后'
+        return [{
+            'product_id': product_id,
+            'success': False,
+            'deferred': True,
+            'message': message,
+            'task_id': task_id
+        } for product_id in product_ids]
     
-    def _publish_product(self, account, product, region):
-        """使用Playwright自动化发布单个商品"""
+    def _publish_product(self, account, product, region, sessions=None):
+        """使用Playwright自动化发布单个商品，各步骤按错误类别单独重试"""
+        attempts = []
+        page = None
+        policy = self.retry_policy
         try:
-            browser = self._get_browser()
-            page = browser.new_page()
-            
-            # 设置超时时间
-            page.set_default_timeout(60000)  # 60秒
-            
             # 登录咸鱼
-            login_result = self._login_xianyu(page, account['username'], account['password'])
-            if not login_result['success']:
-                page.close()
-                return login_result
+            page = self._open_page(account, attempts, sessions)
             
             # 前往发布页面
-            page.goto('https://2.taobao.com/publish/publish.htm')
-            page.wait_for_load_state('networkidle')
+            def open_publish_page():
+                page.goto('https://2.taobao.com/publish/publish.htm')
+                page.wait_for_load_state('networkidle')
+            policy.run('open', open_publish_page, attempts)
+            self._check_session(page, account, sessions)
             
             # 填写商品信息
-            page.fill('#title', product['title'])
-            page.fill('#desc', product['description'])
-            page.fill('#price', str(product['price']))
+            def fill_form():
+                page.fill('#title', product['title'])
+                page.fill('#desc', product['description'])
+                page.fill('#price', str(product['price']))
+            policy.run('fill', fill_form, attempts)
             
             # 选择分类
             if 'category' in product:
-                # 根据分类路径点击分类选择器
-                categories = product['category'].split('>')
-                page.click('#J_Item_Cate')
-                
-                for category in categories:
-                    # 等待分类列表加载
-                    page.wait_for_selector('.J_FishCateList')
-                    # 选择对应分类
-                    page.click(f'text="{category.strip()}"')
+                # 已解析过的分类路径直接按缓存的选择器选中
+                def select_category():
+                    if not self.category_resolver.select(page, product['category']):
+                        raise StepError(SELECTOR_MISSING, f"分类路径无法选中: {normalize_path(product['category'])}")
+                policy.run('category', select_category, attempts)
             
             # 上传图片
             if 'images' in product and product['images']:
-                for image_url in product['images'][:9]:  # 最多9张图片
-                    # 如果是本地路径
-                    if os.path.exists(image_url):
-                        file_input = page.query_selector('input[type="file"]')
-                        file_input.set_input_files(image_url)
-                    else:
-                        # 如果是URL，需要先下载再上传
-                        pass  # 实现略复杂，这里省略
+                # 远程图片并发下载，统一压缩后一次性上传（最多9张图片）
+                image_paths = self.image_cache.prepare(product['images'][:MAX_IMAGES])
+                if image_paths:
+                    policy.run('images', lambda: page.query_selector('input[type="file"]').set_input_files(image_paths), attempts)
             
             # 设置地区
             if region != 'random':
-                page.click('#J_FishRegion')
-                page.wait_for_selector('.city-container')
+                def select_region():
+                    page.click('#J_FishRegion')
+                    page.wait_for_selector('.city-container')
+                    
+                    # 选择对应城市
+                    if region in REGION_MAPPING:
+                        page.click(f'text="{REGION_MAPPING[region]}"')
+                    else:
+                        # 随机选择一个城市
+                        cities = page.query_selector_all('.city-item')
+                        import random
+                        random_city = random.choice(cities)
+                        random_city.click()
+                policy.run('region', select_region, attempts)
+            
+            # 点击发布按钮，提交不是幂等操作，不重试
+            def submit():
+                page.click('#J_PublishSubmit')
                 
-                # 选择对应城市
-                region_mapping = {
-                    'beijing': '北京',
-                    'shanghai': '上海',
-                    'guangzhou': '广州',
-                    'shenzhen': '深圳',
-                    'hangzhou': '杭州'
-                }
+                # 等待发布结果
+                try:
+                    # 等待成功提示
+                    page.wait_for_selector('.publish-success', timeout=10000)
+                except TimeoutError:
+                    # 检查是否有错误提示
+                    error_msg = page.evaluate('() => document.querySelector(".publish-error-msg")?.innerText || "未知错误"')
+                    raise StepError(PLATFORM_REJECTION, f'商品发布失败: {error_msg}')
                 
-                if region in region_mapping:
-                    page.click(f'text="{region_mapping[region]}"')
-                else:
-                    # 随机选择一个城市
-                    cities = page.query_selector_all('.city-item')
-                    import random
-                    random_city = random.choice(cities)
-                    random_city.click()
-            
-            # 点击发布按钮
-            page.click('#J_PublishSubmit')
-            
-            # 等待发布结果
-            try:
-                # 等待成功提示
-                page.wait_for_selector('.publish-success', timeout=10000)
                 # 获取商品ID
                 item_url = page.evaluate('() => document.querySelector(".btn-view").href')
-                item_id = item_url.split('=')[-1]
-                
-                result = {
-                    'success': True,
-                    'message': '商品发布成功',
-                    'item_id': item_id
-                }
-            except TimeoutError:
-                # 检查是否有错误提示
-                error_msg = page.evaluate('() => document.querySelector(".publish-error-msg")?.innerText || "未知错误"')
-                
-                result = {
-                    'success': False,
-                    'message': f'商品发布失败: {error_msg}'
-                }
+                return item_url.split('=')[-1]
+            item_id = policy.run('submit', submit, attempts, retry=False)
             
-            page.close()
-            return result
+            result = {
+                'success': True,
+                'message': '商品发布成功',
+                'item_id': item_id
+            }
+        except StepError as e:
+            result = {
+                'success': False,
+                # 主动抛出的错误本身就是提示信息，页面异常加上前缀
+                'message': f'自动化发布过程出错: {str(e)}' if e.__cause__ else str(e),
+                'error_kind': e.kind,
+                'step': e.step
+            }
         except Exception as e:
-            return {
+            result = {
                 'success': False,
-                'message': f'自动化发布过程出错: {str(e)}'
+                'message': f'自动化发布过程出错: {str(e)}',
+                'error_kind': classify(e)
             }
+        finally:
+            if page is not None:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+        
+        result['attempts'] = attempts
+        return result
+    
+    def _open_page(self, account, attempts, sessions=None):
+        """返回已登录的页面：有会话池时复用账号会话，否则在共享浏览器中新开页面并登录"""
+        if sessions is not None:
+            def login():
+                page, login_result = sessions.new_page(account)
+                if page is None:
+                    raise StepError(login_result.get('kind', AUTH), login_result['message'])
+                return page
+            return self.retry_policy.run('login', login, attempts)
+        
+        page = self._get_browser().new_page()
+        page.set_default_timeout(60000)  # 60秒
+        try:
+            self.retry_policy.run('login', lambda: self._ensure_login(page, account), attempts)
+        except Exception:
+            page.close()
+            raise
+        return page
+    
+    def _check_session(self, page, account, sessions=None):
+        """复用的会话被平台登出时丢弃会话，下次重新登录"""
+        if sessions is not None and sessions.is_logged_out(page):
+            sessions.invalidate(account['_id'])
+            raise StepError(NAVIGATION, '登录状态已失效，将在下次操作时重新登录', 'open')
+    
+    def _ensure_login(self, page, account):
+        """登录失败时按返回的错误类别抛出，供重试策略判断"""
+        login_result = self._login_xianyu(page, account['username'], account['password'])
+        if not login_result['success']:
+            raise StepError(login_result.get('kind', AUTH), login_result['message'])
+        return login_result
     
     def _login_xianyu(self, page, username, password):
         """登录咸鱼账号"""
@@ -446,14 +707,64 @@ class ProductManager:
                     return {'success': True, 'message': '登录成功'}
                 else:
                     error_msg = page.evaluate('() => document.querySelector(".login-error")?.innerText || "登录失败，请检查账号密码"')
-                    return {'success': False, 'message': error_msg}
+                    return {'success': False, 'message': error_msg, 'kind': AUTH}
             except:
-                return {'success': False, 'message': '登录超时或发生未知错误'}
+                return {'success': False, 'message': '登录超时或发生未知错误', 'kind': TIMEOUT}
             
         except Exception as e:
-            return {'success': False, 'message': f'登录过程出错: {str(e)}'}
+            return {'success': False, 'message': f'登录过程出错: {str(e)}', 'kind': classify(e)}
+    
+    def _load_hot_products(self, page, search_url, mode='auto'):
+        """打开搜索页并提取商品，优先解析页面自身的搜索接口，未截获时退回DOM解析"""
+        if mode != 'dom':
+            products = parse_search_items(capture_json(page, search_url, SEARCH_API_PATTERNS))
+            if products:
+                return products[:20]
+        else:
+            page.goto(search_url)
+        
+        page.wait_for_load_state('networkidle')
+        return self._parse_item_cards(page, 20)  # 取前20个结果
     
-    def get_hot_products(self, username, keywords=None):
+    def _parse_item_cards(self, page, limit=None):
+        """从已加载的列表页DOM中提取商品卡片"""
+        products = []
+        product_cards = page.query_selector_all('.item-info')
+        
+        for card in product_cards[:limit]:
+            try:
+                title_el = card.query_selector('.item-title')
+                title = title_el.text_content() if title_el else "无标题"
+                
+                price_el = card.query_selector('.price')
+                price = float(price_el.text_content().replace('¥', '').strip()) if price_el else 0
+                
+                want_count_el = card.query_selector('.want-count')
+                want_count = int(want_count_el.text_content().replace('人想要', '').strip()) if want_count_el else 0
+                
+                link_el = card.query_selector('a.item-link')
+                link = link_el.get_attribute('href') if link_el else ''
+                item_id = ''
+                if link:
+                    item_id = link.split('itemid=')[-1].split('&')[0]
+                
+                image_el = card.query_selector('img.item-pic')
+                image = image_el.get_attribute('src') if image_el else ''
+                
+                products.append({
+                    'title': title,
+                    'price': price,
+                    'want_count': want_count,
+                    'item_id': item_id,
+                    'image': image,
+                    'link': f'https:{link}' if link.startswith('//') else link
+                })
+            except Exception as e:
+                continue
+        
+        return products
+    
+    def get_hot_products(self, username, keywords=None, mode='auto'):
         """获取热门商品"""
         try:
             # 这里实现爬取热门商品的逻辑
@@ -468,47 +779,14 @@ class ProductManager:
             # 添加热门排序参数
             search_url += 'search_type=item&app=listing&orderType=coefp_desc'
             
-            # 访问搜索页面
-            page.goto(search_url)
-            page.wait_for_load_state('networkidle')
-            
-            # 提取商品信息
-            products = []
-            product_cards = page.query_selector_all('.item-info')
-            
-            for card in product_cards[:20]:  # 取前20个结果
-                try:
-                    title_el = card.query_selector('.item-title')
-                    title = title_el.text_content() if title_el else "无标题"
-                    
-                    price_el = card.query_selector('.price')
-                    price = float(price_el.text_content().replace('¥', '').strip()) if price_el else 0
-                    
-                    want_count_el = card.query_selector('.want-count')
-                    want_count = int(want_count_el.text_content().replace('人想要', '').strip()) if want_count_el else 0
-                    
-                    link_el = card.query_selector('a.item-link')
-                    link = link_el.get_attribute('href') if link_el else ''
-                    item_id = ''
-                    if link:
-                        item_id = link.split('itemid=')[-1].split('&')[0]
-                    
-                    image_el = card.query_selector('img.item-pic')
-                    image = image_el.get_attribute('src') if image_el else ''
-                    
-                    products.append({
-                        'title': title,
-                        'price': price,
-                        'want_count': want_count,
-                        'item_id': item_id,
-                        'image': image,
-                        'link': f'https:{link}' if link.startswith('//') else link
-                    })
-                except Exception as e:
-                    continue
+            # 访问搜索页面并提取商品信息
+            products = self._load_hot_products(page, search_url, mode)
             
             page.close()
             
+            # 记录快照用于趋势分析
+            self.hot_trend.record_snapshot(keywords, products)
+            
             return jsonify({
                 'success': True,
                 'products': products
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import threading
+from flask import jsonify
+from pymongo import UpdateOne
+
+SEARCH_VERSION = 1   # 分词规则变化时加一，旧文档会在下次搜索前重建索引
+TEXT_FIELDS = ('title', 'description', 'tags', 'category')
+PRICE_BUCKETS = [0, 50, 100, 200, 500, 1000]
+SORTS = {
+    'updated': [('updated_at', -1), ('_id', -1)],
+    'price_asc': [('price', 1), ('_id', 1)],
+    'price_desc': [('price', -1), ('_id', -1)]
+}
+MAX_PAGE_SIZE = 100
+FACET_LIMIT = 5000   # 分面最多统计的匹配商品数，超出时分面为近似值
+
+_CJK_RUN = re.compile(r'[㐀-鿿]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _cjk_runs(text):
+    return _CJK_RUN.findall(text)
+
+
+def tokenize(text):
+    """文档分词：中文取单字和相邻双字，英文数字按整词"""
+    text = str(text).lower()
+    tokens = set(_WORD.findall(text))
+    for run in _cjk_runs(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_tokens(text):
+    """查询分词：中文只取双字（单字查询除外），要求全部命中"""
+    text = str(text).lower()
+    tokens = set(_WORD.findall(text))
+    for run in _cjk_runs(text):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return sorted(tokens)
+
+
+def index_fields(product):
+    """商品的搜索字段，写入时和文本字段一起 $set"""
+    tokens = set()
+    for field in TEXT_FIELDS:
+        value = product.get(field)
+        if not value:
+            continue
+        for part in (value if isinstance(value, list) else [value]):
+            tokens.update(tokenize(part))
+    return {'search_tokens': sorted(tokens), 'search_version': SEARCH_VERSION}
+
+
+def touches_text(update):
+    """更新内容是否涉及被索引的文本字段"""
+    return any(field in update for field in TEXT_FIELDS)
+
+
+class ProductSearch:
+    """商品库搜索：文档写入n-gram词元数组，靠 (username, search_tokens) 多键索引检索，分面统计一次聚合完成；
+    词元在写入时建立，搜索时不再补建"""
+
+    def __init__(self, db):
+        self.db = db
+        self.thread = None
+
+    def start(self):
+        """启动时在后台为旧文档和分词规则变化后的文档补建一次词元"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.refresh)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def refresh(self, username=None, ids=None, batch_size=1000):
+        """为缺少或过期索引的商品（克隆、改写描述等）补建词元，写入文本字段后调用；不指定用户时处理全部商品"""
+        query = {'search_version': {'$ne': SEARCH_VERSION}}
+        if username:
+            query['username'] = username
+        if ids is not None:
+            query['_id'] = {'$in': list(ids)}
+        cursor = self.db.products.find(query, {field: 1 for field in TEXT_FIELDS}).batch_size(batch_size)
+
+        refreshed = 0
+        operations = []
+        for product in cursor:
+            operations.append(UpdateOne({'_id': product['_id']}, {'$set': index_fields(product)}))
+            if len(operations) >= batch_size:
+                refreshed += self.db.products.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            refreshed += self.db.products.bulk_write(operations, ordered=False).modified_count
+        return refreshed
+
+    def build_query(self, username, keywords='', filters=None):
+        filters = filters or {}
+        query = {'username': username}
+        tokens = query_tokens(keywords) if keywords else []
+        if tokens:
+            query['search_tokens'] = {'$all': tokens}
+        if filters.get('status'):
+            query['status'] = filters['status']
+        if filters.get('category'):
+            query['category'] = filters['category']
+        if filters.get('tag'):
+            query['tags'] = filters['tag']
+        price = {}
+        if filters.get('price_min') is not None:
+            price['$gte'] = float(filters['price_min'])
+        if filters.get('price_max') is not None:
+            price['$lt'] = float(filters['price_max'])
+        if price:
+            query['price'] = price
+        return query
+
+    def facet_pipeline(self, query):
+        """分面只统计前 FACET_LIMIT 个匹配商品并只投影需要的字段，一次聚合得到各项计数"""
+        return [
+            {'$match': query},
+            {'$limit': FACET_LIMIT},
+            {'$project': {'_id': 0, 'status': 1, 'category': 1, 'price': 1}},
+            {'$facet': {
+                'status': [{'$sortByCount': '$status'}],
+                'category': [{'$sortByCount': '$category'}],
+                'price': [{'$bucket': {
+                    'groupBy': '$price',
+                    'boundaries': PRICE_BUCKETS + [float('inf')],
+                    'default': 'other'
+                }}]
+            }}
+        ]
+
+    def query(self, username, args):
+        """执行搜索，返回分页结果、总数和分面"""
+        start = time.perf_counter()
+        page = max(int(args.get('page', 1)), 1)
+        page_size = min(max(int(args.get('page_size', 20)), 1), MAX_PAGE_SIZE)
+
+        query = self.build_query(username, args.get('q', ''), {
+            'status': args.get('status'),
+            'category': args.get('category'),
+            'tag': args.get('tag'),
+            'price_min': args.get('price_min'),
+            'price_max': args.get('price_max')
+        })
+
+        # 结果页走索引排序分页，总数走索引计数，分面单独聚合
+        products = list(self.db.products.find(query, {'search_tokens': 0, 'search_version': 0})
+                        .sort(SORTS.get(args.get('sort'), SORTS['updated']))
+                        .skip((page - 1) * page_size)
+                        .limit(page_size))
+        total = self.db.products.count_documents(query)
+        result = next(self.db.products.aggregate(self.facet_pipeline(query)))
+
+        return {
+            'products': products,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'facets': {
+                'status': {f['_id']: f['count'] for f in result['status'] if f['_id'] is not None},
+                'category': {f['_id']: f['count'] for f in result['category'] if f['_id'] is not None},
+                'price': [{'min': f['_id'], 'count': f['count']} for f in result['price']]
+            },
+            'facets_truncated': total > FACET_LIMIT,
+            'took_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def search(self, username, args):
+        """按关键词搜索标题、描述、标签和分类，返回分页结果和状态、分类、价格区间分面"""
+        try:
+            result = self.query(username, args)
+            result['success'] = True
+            return jsonify(result)
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'搜索商品失败: {str(e)}'
+            }), 500
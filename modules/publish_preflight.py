@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+
+PRICE_MIN = 0.01
+PRICE_MAX = 100000
+MAX_CATEGORY_DEPTH = 4
+UNRESOLVED_DAYS = 7  # 分类选不到的记录有效期，过期后允许重新尝试
+REMOTE_PREFIXES = ('http://', 'https://', '//')
+
+
+def _category_levels(category):
+    return [level.strip() for level in str(category).split('>')]
+
+
+class PublishPreflight:
+    """发布前检查：一次查询取出所选商品，批量校验分类、图片和价格，只有通过的商品进入浏览器发布"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _load(self, username, product_ids):
+        object_ids = []
+        for product_id in product_ids:
+            try:
+                object_ids.append(ObjectId(product_id))
+            except (InvalidId, TypeError):
+                continue
+        cursor = self.db.products.find(
+            {'_id': {'$in': object_ids}, 'username': username},
+            {'title': 1, 'description': 1, 'price': 1, 'category': 1, 'images': 1}
+        )
+        frame = pd.DataFrame(list(cursor), columns=['_id', 'title', 'description', 'price', 'category', 'images'])
+        frame['product_id'] = frame['_id'].astype(str)
+        return frame.set_index('product_id')
+
+    def _unresolved_categories(self, categories):
+        """近期发布时选不到的分类路径"""
+        return {doc['path'] for doc in self.db.category_paths.find({
+            'path': {'$in': list(categories)},
+            'resolved': False,
+            'failed_at': {'$gte': datetime.now() - timedelta(days=UNRESOLVED_DAYS)}
+        }, {'path': 1})}
+
+    def check(self, username, product_ids, price_min=PRICE_MIN, price_max=PRICE_MAX):
+        """返回 (通过的商品ID列表, 每个商品的检查报告)，保持传入顺序"""
+        frame = self._load(username, product_ids)
+        errors = pd.DataFrame(index=frame.index)
+
+        title = frame['title'].fillna('').astype(str).str.strip()
+        errors['标题为空'] = title == ''
+        errors['描述为空'] = frame['description'].fillna('').astype(str).str.strip() == ''
+
+        price = pd.to_numeric(frame['price'].astype(str), errors='coerce')
+        errors['价格无效'] = price.isna()
+        errors[f'价格超出范围 {price_min}-{price_max}'] = price.notna() & ((price < price_min) | (price > price_max))
+
+        category = frame['category'].fillna('').astype(str).str.strip()
+        levels = category.map(_category_levels)
+        errors['缺少分类'] = category == ''
+        errors['分类路径格式错误'] = (category != '') & levels.map(
+            lambda parts: '' in parts or len(parts) > MAX_CATEGORY_DEPTH
+        )
+        normalized = levels.map('>'.join)
+        unresolved = self._unresolved_categories(set(normalized[category != '']))
+        errors['分类路径无法选中'] = normalized.isin(list(unresolved))
+
+        # 本地图片路径去重后检查是否存在
+        images = frame['images'].map(lambda value: value if isinstance(value, list) else [])
+        local_paths = {path for paths in images for path in paths
+                       if path and not str(path).startswith(REMOTE_PREFIXES)}
+        missing = {path for path in local_paths if not os.path.exists(path)}
+        errors['本地图片不存在'] = images.map(lambda paths: any(path in missing for path in paths))
+
+        flags = errors.astype(bool).to_numpy()
+        labels = list(errors.columns)
+        failures = {
+            product_id: [labels[j] for j in row.nonzero()[0]]
+            for product_id, row in zip(errors.index, flags)
+        }
+
+        passed = []
+        report = []
+        for product_id in product_ids:
+            product_id = str(product_id)
+            if product_id not in failures:
+                report.append({'product_id': product_id, 'ok': False, 'errors': ['商品不存在或无权限操作']})
+                continue
+            problems = failures[product_id]
+            report.append({
+                'product_id': product_id,
+                'title': title.get(product_id, ''),
+                'ok': not problems,
+                'errors': problems
+            })
+            if not problems:
+                passed.append(product_id)
+        return passed, report
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from collections import deque
+
+REFRESH_INTERVAL = 30  # 秒，检查模板是否变更的最小间隔
+
+
+class KeywordAutomaton:
+    """Aho-Corasick自动机，匹配耗时只与消息长度相关，与关键词数量无关"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # 每个状态命中的 (模板下标, 关键词长度)
+
+    def add(self, keyword, target):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append((target, len(keyword)))
+
+    def build(self):
+        """广度优先计算失败指针，并把失败链上的输出合并到当前状态"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        return self
+
+    def iter_matches(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield from output[state]
+
+
+class ReplyMatcher:
+    """自动回复模板匹配：每个用户的回复规则编译为一个自动机并缓存在内存中"""
+
+    def __init__(self, db):
+        self.db = db
+        self.compiled = {}  # 用户名 -> {'automaton', 'templates', 'signature', 'checked_at'}
+        self.lock = threading.Lock()
+
+    def _signature(self, username):
+        """模板集合的变更签名：数量和最近更新时间"""
+        query = {'username': username, 'type': 'reply'}
+        latest = self.db.templates.find_one(
+            query, {'updated_at': 1, 'created_at': 1},
+            sort=[('updated_at', -1), ('created_at', -1)]
+        )
+        stamp = None
+        if latest:
+            stamp = latest.get('updated_at') or latest.get('created_at')
+        return self.db.templates.count_documents(query), stamp
+
+    def _compile(self, username):
+        templates = list(self.db.templates.find({'username': username, 'type': 'reply'}))
+        automaton = KeywordAutomaton()
+        for index, template in enumerate(templates):
+            template['_id'] = str(template['_id'])
+            keywords = list(template.get('keywords') or [])
+            for keyword in list(keywords):
+                keywords.extend((template.get('synonyms') or {}).get(keyword, []))
+            if not keywords and template.get('name'):
+                keywords.append(template['name'])
+            for keyword in set(keywords):
+                keyword = keyword.strip().lower()
+                if keyword:
+                    automaton.add(keyword, index)
+
+        return {
+            'automaton': automaton.build(),
+            'templates': templates,
+            'signature': self._signature(username),
+            'checked_at': time.time()
+        }
+
+    def invalidate(self, username):
+        """模板变更后调用，下次匹配时只重建该用户的自动机"""
+        with self.lock:
+            self.compiled.pop(username, None)
+
+    def _get_compiled(self, username):
+        with self.lock:
+            compiled = self.compiled.get(username)
+
+        now = time.time()
+        if compiled and now - compiled['checked_at'] > REFRESH_INTERVAL:
+            # 兜底：其它进程修改了模板时通过签名发现变更
+            if self._signature(username) != compiled['signature']:
+                compiled = None
+            else:
+                compiled['checked_at'] = now
+
+        if compiled is None:
+            compiled = self._compile(username)
+            with self.lock:
+                self.compiled[username] = compiled
+        return compiled
+
+    def match(self, username, message):
+        """为买家消息选择最合适的回复模板，没有命中时返回None"""
+        compiled = self._get_compiled(username)
+        templates = compiled['templates']
+
+        # 每个模板的得分：命中关键词数和命中总长度
+        hits = {}
+        for index, length in compiled['automaton'].iter_matches((message or '').lower()):
+            count, total = hits.get(index, (0, 0))
+            hits[index] = (count + 1, total + length)
+
+        if not hits:
+            return None
+
+        best = max(hits, key=lambda i: (templates[i].get('priority', 0),) + hits[i])
+        return templates[best]
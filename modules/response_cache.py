@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+
+DEFAULT_TTL = 300  # 秒，兜底过期时间（后台任务写入时也能最终刷新）
+
+
+class LocalBackend:
+    """进程内LRU缓存；版本号单独存放，不随缓存条目淘汰，避免被淘汰后从0重新计数命中旧缓存"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def counter(self, key):
+        with self.lock:
+            return self.counters.get(key, 0)
+
+    def incr(self, key):
+        with self.lock:
+            value = self.counters.get(key, 0) + 1
+            self.counters[key] = value
+            return value
+
+
+class RedisBackend:
+    """多进程部署时共享的Redis缓存"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=ttl)
+
+    def counter(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+class ResponseCache:
+    """接口响应缓存：按用户和参数缓存，写操作递增用户的数据版本号使相关缓存失效，并支持ETag"""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls):
+        """设置 CACHE_REDIS_URL 时使用Redis共享缓存，否则使用进程内缓存"""
+        url = os.environ.get('CACHE_REDIS_URL')
+        if url:
+            try:
+                return cls(RedisBackend(url))
+            except ImportError:
+                pass
+        return cls(LocalBackend())
+
+    def _version_key(self, username, scope):
+        return f'ver:{scope}:{username}'
+
+    def version(self, username, scope):
+        return self.backend.counter(self._version_key(username, scope))
+
+    def bump(self, username, *scopes):
+        """数据写入后调用，使该用户依赖这些数据的缓存失效"""
+        for scope in scopes:
+            try:
+                self.backend.incr(self._version_key(username, scope))
+            except Exception:
+                continue
+
+    def cached(self, name, scopes=(), per_user=True, ttl=None):
+        """缓存GET接口的响应，scopes 为该接口依赖的数据范围"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                username = get_jwt_identity() if per_user else '*'
+                versions = ','.join(str(self.version(username, scope)) for scope in scopes)
+                params = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+                view_args = '&'.join(f'{k}={v}' for k, v in sorted(kwargs.items()))
+                key = f'resp:{name}:{username}:{versions}:{view_args}:{params}'
+
+                entry = None
+                try:
+                    entry = self.backend.get(key)
+                except Exception:
+                    pass
+
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha1(body).hexdigest()
+                    }
+                    try:
+                        self.backend.set(key, entry, ttl or self.ttl)
+                    except Exception:
+                        pass
+
+                if request.if_none_match.contains(entry['etag']):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(entry['body'], 200)
+                    response.mimetype = entry['mimetype']
+                response.set_etag(entry['etag'])
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+
+
+# 全局实例，各模块写入数据后调用 response_cache.bump
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from playwright.sync_api import TimeoutError
+
+# 页面自身请求的数据接口
+SEARCH_API_PATTERNS = ('mtop.taobao.idlefish.search', 'mtop.idle.web.xyh.item.list', '/search/api')
+SHOP_API_PATTERNS = ('mtop.idle.web.user.page.items', 'mtop.taobao.idle.user.items', '/personal/api')
+ORDER_API_PATTERNS = ('mtop.idle.trade.sold.list', 'mtop.taobao.idle.trade.order', '/soldlist/api')
+
+ITEM_ID_KEYS = ('itemId', 'item_id', 'itemid')
+ORDER_ID_KEYS = ('bizOrderId', 'orderId', 'order_id')
+
+
+def _decode(text):
+    """解析JSON或JSONP响应体"""
+    text = text.strip()
+    if not text.startswith(('{', '[')):
+        start, end = text.find('('), text.rfind(')')
+        if start < 0 or end <= start:
+            return None
+        text = text[start + 1:end]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def capture_json(page, url, patterns, timeout=15000):
+    """访问页面并截获匹配接口的JSON响应，不等待页面渲染完成"""
+    responses = []
+
+    def on_response(response):
+        if any(pattern in response.url for pattern in patterns):
+            responses.append(response)
+
+    page.on('response', on_response)
+    try:
+        try:
+            with page.expect_response(lambda r: any(p in r.url for p in patterns), timeout=timeout):
+                page.goto(url, wait_until='domcontentloaded')
+        except TimeoutError:
+            pass
+    finally:
+        page.remove_listener('response', on_response)
+
+    payloads = []
+    for response in responses:
+        try:
+            data = _decode(response.text())
+        except Exception:
+            continue
+        if data is not None:
+            payloads.append(data)
+    return payloads
+
+
+def _walk(node):
+    """遍历JSON中的所有对象"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def _first(obj, keys, default=None):
+    for key in keys:
+        value = obj.get(key)
+        if value not in (None, ''):
+            return value
+    return default
+
+
+def _number(value, default=0):
+    if isinstance(value, (int, float)):
+        return float(value)  # 与DOM解析一致，指纹不随整数/小数写法变化
+    if isinstance(value, dict):
+        value = _first(value, ('price', 'value', 'amount'))
+    if isinstance(value, list):
+        value = ''.join(str(part.get('text', '')) if isinstance(part, dict) else str(part) for part in value)
+    try:
+        return float(str(value).replace('¥', '').replace(',', '').strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def _url(value):
+    """图片和链接字段可能是对象或数组，取出其中的地址，取不到时返回空字符串"""
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    if isinstance(value, dict):
+        value = _first(value, ('url', 'src', 'picUrl', 'href'), '')
+    return value if isinstance(value, str) else ''
+
+
+def parse_search_items(payloads):
+    """从搜索接口响应中提取商品，结构与DOM提取一致"""
+    products = []
+    seen = set()
+    for payload in payloads:
+        for obj in _walk(payload):
+            item_id = _first(obj, ITEM_ID_KEYS)
+            title = _first(obj, ('title', 'itemTitle'))
+            if not item_id or not title or str(item_id) in seen:
+                continue
+            seen.add(str(item_id))
+
+            image = _url(_first(obj, ('picUrl', 'mainPic', 'pic', 'image'), ''))
+            link = _url(_first(obj, ('targetUrl', 'itemUrl', 'link'), ''))
+            if not link:
+                link = f'https://2.taobao.com/item.htm?id={item_id}'
+            products.append({
+                'title': str(title),
+                'price': _number(_first(obj, ('price', 'soldPrice', 'priceText'))),
+                'want_count': int(_number(_first(obj, ('wantCount', 'wantNum', 'want_count')))),
+                'item_id': str(item_id),
+                'image': f'https:{image}' if image.startswith('//') else image,
+                'link': f'https:{link}' if link.startswith('//') else link
+            })
+    return products
+
+
+def parse_order_rows(payloads):
+    """从已卖出订单接口响应中提取订单行，字段与DOM提取一致（不含指纹）"""
+    rows = []
+    seen = set()
+    for payload in payloads:
+        for obj in _walk(payload):
+            order_id = _first(obj, ORDER_ID_KEYS)
+            status = _first(obj, ('statusText', 'orderStatusText', 'status'))
+            if not order_id or status is None or str(order_id) in seen:
+                continue
+            seen.add(str(order_id))
+            rows.append({
+                'order_id': str(order_id),
+                'title': str(_first(obj, ('itemTitle', 'title', 'auctionTitle'), '未知商品')),
+                'price': _number(_first(obj, ('actualFee', 'totalFee', 'price'))),
+                'status': str(status),
+                'buyer': str(_first(obj, ('buyerNick', 'buyerName', 'buyer'), '未知买家')),
+                'order_time': str(_first(obj, ('createTime', 'gmtCreate', 'orderTime'), ''))
+            })
+    return rows
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+from playwright.sync_api import TimeoutError, Error as PlaywrightError
+
+# 错误类别
+TIMEOUT = 'timeout'
+NAVIGATION = 'navigation'
+SELECTOR_MISSING = 'selector_missing'
+AUTH = 'auth'
+PLATFORM_REJECTION = 'platform_rejection'
+UNKNOWN = 'unknown'
+
+TRANSIENT = {TIMEOUT, NAVIGATION}   # 只有这些类别会重试
+
+_NAVIGATION_MARKERS = ('net::', 'navigating to', 'navigation', 'load state', 'target closed', 'page closed')
+_WAIT_MARKERS = ('waiting for selector', 'waiting for locator')
+_SELECTOR_MARKERS = ('strict mode violation',)
+
+
+class StepError(Exception):
+    """自动化步骤的已分类错误"""
+
+    def __init__(self, kind, message, step=None):
+        super().__init__(message)
+        self.kind = kind
+        self.step = step
+
+
+def classify(error, attempt=1):
+    """把异常归入错误类别；等待元素超时在第一次尝试时视为页面加载慢，之后才算元素缺失"""
+    if isinstance(error, StepError):
+        return error.kind
+    message = str(error).lower()
+    if isinstance(error, TimeoutError):
+        if any(marker in message for marker in _NAVIGATION_MARKERS):
+            return NAVIGATION
+        if any(marker in message for marker in _WAIT_MARKERS):
+            return TIMEOUT if attempt == 1 else SELECTOR_MISSING
+        if any(marker in message for marker in _SELECTOR_MARKERS):
+            return SELECTOR_MISSING
+        return TIMEOUT
+    if isinstance(error, PlaywrightError):
+        if any(marker in message for marker in _NAVIGATION_MARKERS):
+            return NAVIGATION
+        if any(marker in message for marker in _SELECTOR_MARKERS):
+            return SELECTOR_MISSING
+    if isinstance(error, AttributeError) and 'nonetype' in message:
+        # query_selector 没找到元素后继续调用其方法
+        return SELECTOR_MISSING
+    return UNKNOWN
+
+
+class RetryPolicy:
+    """按错误类别决定是否重试：超时和导航错误在步骤内按带抖动的指数退避重试，其余错误立即失败"""
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """第 attempt 次失败后的等待秒数（full jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def run(self, step, func, attempts, retry=True):
+        """执行一个步骤，失败记录追加到 attempts，最终失败时抛出 StepError；retry=False 用于不可重复的操作"""
+        max_attempts = self.max_attempts if retry else 1
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return func()
+            except Exception as e:
+                kind = classify(e, attempt)
+                attempts.append({'step': step, 'attempt': attempt, 'kind': kind, 'error': str(e)[:200]})
+                if kind in TRANSIENT and attempt < max_attempts:
+                    time.sleep(self.backoff(attempt))
+                    continue
+                if isinstance(e, StepError):
+                    e.step = step
+                    raise
+                raise StepError(kind, str(e), step) from e
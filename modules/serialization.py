@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import base64
+import decimal
+from datetime import datetime, date
+from bson import ObjectId, Decimal128
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # 未安装时退回标准库
+    orjson = None
+
+
+def default(obj):
+    """处理JSON不支持的BSON类型"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f'无法序列化类型: {type(obj).__name__}')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        return json.dumps(obj, default=default, ensure_ascii=False).encode('utf-8')
+
+    loads = json.loads
+
+
+class BSONJSONProvider(JSONProvider):
+    """Flask JSON提供者：直接编码ObjectId、datetime、bytes等类型，接口无需逐条转换"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
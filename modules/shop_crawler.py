@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import queue
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from flask import jsonify
+from pymongo import UpdateOne
+from playwright.sync_api import sync_playwright
+from modules.response_capture import capture_json, parse_search_items, SHOP_API_PATTERNS
+
+SHOP_URL = 'https://2.taobao.com/personal/{shop_id}?page={page}'
+CONCURRENCY = 4      # 同时抓取的页数，每个抓取线程使用独立的浏览器
+MAX_PAGES = 200
+STABLE_PAGES = 2     # 连续多少页与上次列表对齐即认为后续页面只是整体平移
+FULL_CRAWL_DAYS = 7  # 超过该天数强制全量采集一次
+
+
+def item_fingerprint(item):
+    """商品内容指纹，想要人数的波动不算内容变化"""
+    fields = (item.get('item_id'), item.get('title'), item.get('price'), item.get('image'))
+    return hashlib.sha1('|'.join(str(f) for f in fields).encode('utf-8')).hexdigest()[:16]
+
+
+def _align(index, items):
+    """页内商品在上次列表中连续出现时返回起始位置，否则返回 None"""
+    positions = [index.get(item['item_id']) for item in items]
+    start = positions[0]
+    if start is None or positions != list(range(start, start + len(positions))):
+        return None
+    return start
+
+
+class _PageFetcher(threading.Thread):
+    """抓取线程：Playwright同步接口不能跨线程使用，每个线程持有自己的浏览器"""
+
+    def __init__(self, crawler, tasks, results):
+        super().__init__()
+        self.daemon = True
+        self.crawler = crawler
+        self.tasks = tasks
+        self.results = results
+
+    def run(self):
+        playwright = sync_playwright().start()
+        browser = playwright.chromium.launch(headless=True)
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                shop_id, page_no = task
+                try:
+                    items = self.crawler._fetch_page(browser, shop_id, page_no)
+                    self.results.put((shop_id, page_no, items, None))
+                except Exception as e:
+                    self.results.put((shop_id, page_no, None, str(e)))
+        finally:
+            browser.close()
+            playwright.stop()
+
+
+class ShopCrawler:
+    """爆店采集：并发翻页抓取店铺全部商品，按商品ID与上次列表对齐后增量更新，记录下架商品"""
+
+    def __init__(self, db, product_manager):
+        self.db = db
+        self.product_manager = product_manager
+
+    def _fetch_page(self, browser, shop_id, page_no):
+        page = browser.new_page()
+        try:
+            url = SHOP_URL.format(shop_id=shop_id, page=page_no)
+            items = parse_search_items(capture_json(page, url, SHOP_API_PATTERNS))
+            if not items:
+                page.wait_for_load_state('networkidle')
+                items = [item for item in self.product_manager._parse_item_cards(page) if item['item_id']]
+            return items
+        finally:
+            page.close()
+
+    def _stop_point(self, fetched, index, stored_items, first_page=1, full=False):
+        """按页序检查已抓取的连续页，返回 (停止页, 是否到达末页, 未抓取部分在上次列表中的起点)，尚不能确定时返回 None
+
+        页内商品在上次列表中连续出现且内容未变时视为对齐，连续 STABLE_PAGES 页首尾相接地对齐后，
+        后面的商品就是上次列表的剩余部分（整体平移），顶部新增或删除商品不会导致全量采集
+        """
+        streak, expected = 0, None
+        for page_no in range(first_page, MAX_PAGES + 1):
+            if page_no not in fetched:
+                return None
+            items, error = fetched[page_no]
+            if error:
+                streak, expected = 0, None
+                continue
+            if not items:
+                return page_no, True, None
+            if full:
+                continue
+            start = _align(index, items)
+            unchanged = start is not None and all(
+                stored_items.get(item['item_id'], {}).get('fingerprint') == item_fingerprint(item)
+                for item in items
+            )
+            if not unchanged:
+                streak, expected = 0, None
+                continue
+            streak = streak + 1 if expected in (None, start) and streak else 1
+            expected = start + len(items)
+            if streak >= STABLE_PAGES:
+                return page_no, False, expected
+        return MAX_PAGES, False, None
+
+    def _next_result(self, shop_id, results):
+        """取本店铺的下一个抓取结果；上一个店铺出错中断时仍在途的页面结果会留在队列里，直接丢弃"""
+        while True:
+            result_shop_id, page_no, items, error = results.get()
+            if result_shop_id == shop_id:
+                return page_no, items, error
+
+    def _crawl_pages(self, shop_id, tasks, results, fetched, first_page, concurrency, decide):
+        """从 first_page 起按页序并发抓取，decide() 给出结论后不再派发新页，等待已派发的页返回"""
+        next_page, inflight = first_page, 0
+        decision = None
+        while True:
+            while decision is None and inflight < concurrency and next_page <= MAX_PAGES:
+                tasks.put((shop_id, next_page))
+                next_page += 1
+                inflight += 1
+            if inflight == 0:
+                break
+            page_no, items, error = self._next_result(shop_id, results)
+            inflight -= 1
+            fetched[page_no] = (items, error)
+            if decision is None:
+                decision = decide()
+        return decision
+
+    def _tail_unchanged(self, shop_id, tasks, results, fetched, stored_ids, tail_start, stop_page, page_size):
+        """抽查上次列表剩余部分应落在的最后一页，内容一致说明中间没有下架或插入的商品"""
+        remaining = len(stored_ids) - tail_start
+        pages_left = -(-remaining // page_size)
+        if pages_left == 0:
+            sentinel, expected = stop_page + 1, []
+        else:
+            sentinel = stop_page + pages_left
+            expected = stored_ids[tail_start + (pages_left - 1) * page_size:]
+        if sentinel > MAX_PAGES:
+            return True
+        tasks.put((shop_id, sentinel))
+        page_no, items, error = self._next_result(shop_id, results)
+        fetched[page_no] = (items, error)
+        return not error and [item['item_id'] for item in items] == expected
+
+    def crawl_shop(self, username, shop_id, tasks, results, concurrency=CONCURRENCY, full=False):
+        """采集一个店铺，tasks/results 为抓取线程的任务和结果队列"""
+        start = time.time()
+        now = datetime.now()
+        shop = self.db.shops.find_one({'_id': shop_id}) or {}
+        last_full = shop.get('last_full_crawl_at')
+        if not last_full or now - last_full > timedelta(days=FULL_CRAWL_DAYS):
+            full = True
+
+        # 上次采集的完整列表按页存放，拼接后按商品ID定位
+        stored_pages = list(self.db.shop_pages.find({'shop_id': shop_id}).sort('page', 1))
+        stored_ids = [item_id for doc in stored_pages for item_id in doc['item_ids']]
+        index = {item_id: i for i, item_id in enumerate(stored_ids)}
+        stored_items = {
+            doc['item_id']: doc for doc in self.db.shop_items.find(
+                {'shop_id': shop_id}, {'item_id': 1, 'fingerprint': 1, 'status': 1}
+            )
+        }
+
+        # 按页序并发抓取，前面的页面确认与上次列表对齐或到达末页后不再派发新页
+        fetched = {}
+        stop_page, end_reached, tail_start = self._crawl_pages(
+            shop_id, tasks, results, fetched, 1, concurrency,
+            lambda: self._stop_point(fetched, index, stored_items, full=full)
+        )
+
+        if end_reached and stop_page == 1 and stored_ids:
+            # 首页为空多半是被拦截，不能据此把所有商品标记为下架
+            raise Exception('店铺首页没有商品，本次采集结果未写入')
+
+        first_items = fetched[1][0] or []
+        page_size = len(first_items) or (len(stored_pages[0]['item_ids']) if stored_pages else 0)
+        if tail_start is not None and not self._tail_unchanged(
+                shop_id, tasks, results, fetched, stored_ids, tail_start, stop_page, page_size):
+            # 剩余部分有下架或插入，继续抓完后面的页面
+            resume = stop_page + 1
+            stop_page, end_reached, tail_start = self._crawl_pages(
+                shop_id, tasks, results, fetched, resume, concurrency,
+                lambda: self._stop_point(fetched, index, stored_items, resume, full=True)
+            )
+
+        # 当前列表 = 已抓取的前缀页 + 对齐后上次列表的剩余部分
+        prefix_end = stop_page - 1 if end_reached else stop_page
+        complete = not any(fetched.get(page_no, (None, 'missing'))[1] for page_no in range(1, prefix_end + 1))
+        listing = []
+        for page_no in range(1, prefix_end + 1):
+            listing.extend(item['item_id'] for item in fetched[page_no][0] or [])
+        if tail_start is not None:
+            listing.extend(stored_ids[tail_start:])
+        listing = list(dict.fromkeys(listing))  # 翻页期间列表变化可能导致重复
+        current_ids = set(listing)
+
+        # 只写入新增或内容变化的商品
+        item_ops = []
+        written = set()
+        for page_no in sorted(fetched):
+            items, error = fetched[page_no]
+            for item in items or []:
+                if item['item_id'] in written:
+                    continue
+                written.add(item['item_id'])
+                fingerprint = item_fingerprint(item)
+                stored = stored_items.get(item['item_id'])
+                if stored and stored.get('fingerprint') == fingerprint and stored.get('status') == 'active':
+                    continue
+                item_ops.append(UpdateOne(
+                    {'shop_id': shop_id, 'item_id': item['item_id']},
+                    {
+                        '$set': {**item, 'fingerprint': fingerprint, 'status': 'active', 'updated_at': now},
+                        '$unset': {'removed_at': ''},
+                        '$setOnInsert': {'first_seen_at': now}
+                    },
+                    upsert=True
+                ))
+
+        # 有页面抓取失败时列表不完整，保留上次的列表，也不判定下架
+        removed = []
+        page_ops = []
+        if complete:
+            removed = [item_id for item_id, doc in stored_items.items()
+                       if doc.get('status') == 'active' and item_id not in current_ids]
+            page_size = page_size or len(listing)
+            chunks = [listing[i:i + page_size] for i in range(0, len(listing), page_size)] if listing else []
+            for page_no, item_ids in enumerate(chunks, 1):
+                if page_no <= len(stored_pages) and stored_pages[page_no - 1]['item_ids'] == item_ids:
+                    continue
+                page_ops.append(UpdateOne(
+                    {'shop_id': shop_id, 'page': page_no},
+                    {'$set': {'item_ids': item_ids, 'crawled_at': now}},
+                    upsert=True
+                ))
+            if page_ops:
+                self.db.shop_pages.bulk_write(page_ops, ordered=False)
+            self.db.shop_pages.delete_many({'shop_id': shop_id, 'page': {'$gt': len(chunks)}})
+
+        if item_ops:
+            self.db.shop_items.bulk_write(item_ops, ordered=False)
+        if removed:
+            self.db.shop_items.update_many(
+                {'shop_id': shop_id, 'item_id': {'$in': removed}},
+                {'$set': {'status': 'removed', 'removed_at': now, 'updated_at': now}}
+            )
+
+        stats = {
+            'full': full,
+            'pages_fetched': len(fetched),
+            'pages_changed': len(page_ops),
+            'pages_failed': sum(1 for _, error in fetched.values() if error),
+            'complete': complete,
+            'items': len(current_ids),
+            'items_updated': len(item_ops),
+            'items_removed': len(removed),
+            'duration': round(time.time() - start, 2)
+        }
+        update = {'last_crawl_at': now, 'last_stats': stats}
+        if complete:
+            update['item_count'] = len(current_ids)
+        if full and complete:
+            update['last_full_crawl_at'] = now
+        self.db.shops.update_one(
+            {'_id': shop_id},
+            {'$set': update, '$addToSet': {'usernames': username}},
+            upsert=True
+        )
+        return stats
+
+    def run_crawl_task(self, username, shop_ids, full=False, concurrency=CONCURRENCY):
+        """用一组抓取线程依次采集多个店铺"""
+        tasks = queue.Queue()
+        results = queue.Queue()
+        fetchers = [_PageFetcher(self, tasks, results) for _ in range(concurrency)]
+        for fetcher in fetchers:
+            fetcher.start()
+
+        report = {}
+        try:
+            for shop_id in shop_ids:
+                try:
+                    report[shop_id] = self.crawl_shop(username, shop_id, tasks, results, concurrency, full)
+                except Exception as e:
+                    report[shop_id] = {'error': str(e)}
+        finally:
+            for _ in fetchers:
+                tasks.put(None)
+
+        self.db.shop_crawl_tasks.insert_one({
+            'username': username,
+            'shop_ids': shop_ids,
+            'report': report,
+            'created_at': datetime.now()
+        })
+        return report
+
+    def crawl_shops(self, username, data):
+        """后台采集指定店铺"""
+        try:
+            # 去重，同一轮内抓取结果按店铺ID区分
+            shop_ids = list(dict.fromkeys(
+                str(shop_id).strip() for shop_id in data.get('shop_ids', []) if str(shop_id).strip()
+            ))
+            if not shop_ids:
+                return jsonify({
+                    'success': False,
+                    'message': '未提供店铺ID'
+                }), 400
+
+            concurrency = max(1, min(int(data.get('concurrency', CONCURRENCY)), 8))
+            thread = threading.Thread(
+                target=self.run_crawl_task,
+                args=(username, shop_ids, bool(data.get('full')), concurrency)
+            )
+            thread.daemon = True
+            thread.start()
+
+            return jsonify({
+                'success': True,
+                'message': f'已开始采集 {len(shop_ids)} 个店铺'
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'店铺采集失败: {str(e)}'
+            }), 500
+
+    def get_shops(self, username):
+        """获取用户采集过的店铺"""
+        try:
+            shops = list(self.db.shops.find({'usernames': username}, {'usernames': 0}).sort('last_crawl_at', -1))
+            return jsonify({
+                'success': True,
+                'shops': shops
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取店铺失败: {str(e)}'
+            }), 500
+
+    def get_shop_items(self, username, shop_id, status='active'):
+        """获取店铺商品，status 为 active、removed 或 all"""
+        try:
+            if not self.db.shops.count_documents({'_id': shop_id, 'usernames': username}, limit=1):
+                return jsonify({
+                    'success': False,
+                    'message': '店铺未采集'
+                }), 404
+
+            query = {'shop_id': shop_id}
+            if status != 'all':
+                query['status'] = status
+            items = list(self.db.shop_items.find(query, {'fingerprint': 0}).sort('want_count', -1))
+            return jsonify({
+                'success': True,
+                'items': items
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取店铺商品失败: {str(e)}'
+            }), 500
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+POLL_INTERVAL = 5       # 秒，检查到期任务的间隔
+LEASE_SECONDS = 120     # 秒，运行中任务的租约，进程退出后租约过期的任务会被重新认领
+MAX_ATTEMPTS = 3        # 同一任务最多被认领的次数
+JOB_KINDS = ('polish', 'daily')
+
+
+class TaskScheduler:
+    """擦亮/日常任务调度：在时间窗口内为所有账号均匀分布任务，任务计划持久化在数据库中"""
+
+    def __init__(self, db, sessions, max_concurrent=4):
+        self.db = db
+        self.sessions = sessions
+        self.max_concurrent = max_concurrent
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self.running = set()   # 本进程正在执行的任务ID
+        self.running_lock = threading.Lock()
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def schedule(self, username, data):
+        """为账号在时间窗口内排期，同一账号同一天同类任务只会有一条"""
+        try:
+            kind = data.get('kind', 'polish')
+            if kind not in JOB_KINDS:
+                return jsonify({
+                    'success': False,
+                    'message': f'不支持的任务类型: {kind}'
+                }), 400
+
+            day = data.get('date') or datetime.now().strftime('%Y-%m-%d')
+            window_start = datetime.strptime(f"{day} {data.get('window_start', '09:00')}", '%Y-%m-%d %H:%M')
+            window_end = datetime.strptime(f"{day} {data.get('window_end', '21:00')}", '%Y-%m-%d %H:%M')
+            if window_end <= window_start:
+                return jsonify({
+                    'success': False,
+                    'message': '时间窗口结束时间必须晚于开始时间'
+                }), 400
+            jitter = int(data.get('jitter', 300))
+
+            # 窗口已经开始时，只在剩余时间内分布，避免过去的时间点全部堆到当前时刻
+            start = max(window_start, datetime.now())
+            if start >= window_end:
+                return jsonify({
+                    'success': False,
+                    'message': '时间窗口已结束'
+                }), 400
+
+            query = {'username': username}
+            if data.get('account_ids'):
+                query['_id'] = {'$in': [ObjectId(aid) for aid in data['account_ids']]}
+            accounts = list(self.db.accounts.find(query, {'_id': 1}))
+            random.shuffle(accounts)
+
+            # 账号均匀分布在窗口内，再叠加随机抖动
+            span = (window_end - start).total_seconds()
+            slot = span / max(len(accounts), 1)
+            jitter = min(jitter, slot / 2)
+            operations = []
+            for index, account in enumerate(accounts):
+                offset = slot * index + slot / 2 + random.uniform(-jitter, jitter)
+                run_at = start + timedelta(seconds=min(max(offset, 0), span))
+                operations.append(UpdateOne(
+                    {'account_id': str(account['_id']), 'kind': kind, 'date': day},
+                    {'$setOnInsert': {
+                        'username': username,
+                        'account_id': str(account['_id']),
+                        'kind': kind,
+                        'date': day,
+                        'product_ids': data.get('product_ids'),
+                        'window_start': window_start,
+                        'window_end': window_end,
+                        'run_at': run_at,
+                        'status': 'pending',
+                        'created_at': datetime.now()
+                    }},
+                    upsert=True
+                ))
+
+            created = 0
+            if operations:
+                try:
+                    created = self.db.scheduled_jobs.bulk_write(operations, ordered=False).upserted_count
+                except BulkWriteError as e:
+                    created = e.details.get('nUpserted', 0)
+
+            return jsonify({
+                'success': True,
+                'message': f'已排期 {created} 个任务（{len(accounts) - created} 个已存在）',
+                'count': created
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'任务排期失败: {str(e)}'
+            }), 500
+
+    def _loop(self):
+        while not self.stop_event.wait(POLL_INTERVAL):
+            try:
+                self._renew()
+                self._expire()
+                while self._has_capacity():
+                    job = self._claim()
+                    if not job:
+                        break
+                    with self.running_lock:
+                        self.running.add(job['_id'])
+                    self.executor.submit(self._run, job)
+            except Exception:
+                continue
+
+    def _has_capacity(self):
+        with self.running_lock:
+            return len(self.running) < self.max_concurrent
+
+    def _renew(self):
+        """为本进程正在执行的任务续约"""
+        with self.running_lock:
+            job_ids = list(self.running)
+        if job_ids:
+            self.db.scheduled_jobs.update_many(
+                {'_id': {'$in': job_ids}, 'worker': self.worker_id},
+                {'$set': {'lease_until': datetime.now() + timedelta(seconds=LEASE_SECONDS)}}
+            )
+
+    def _expire(self):
+        """租约过期且已达到最大认领次数的任务标记为中断，不再重跑"""
+        now = datetime.now()
+        self.db.scheduled_jobs.update_many(
+            {'status': 'running', 'lease_until': {'$not': {'$gte': now}}, 'attempts': {'$gte': MAX_ATTEMPTS}},
+            {'$set': {'status': 'interrupted', 'finished_at': now}}
+        )
+
+    def _claim(self):
+        """原子认领一个到期任务，或执行进程已退出（租约过期）的运行中任务，多进程部署时也不会重复执行"""
+        now = datetime.now()
+        return self.db.scheduled_jobs.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'run_at': {'$lte': now}},
+                {'status': 'running', 'lease_until': {'$not': {'$gte': now}},
+                 'attempts': {'$not': {'$gte': MAX_ATTEMPTS}}}
+            ]},
+            {
+                '$set': {
+                    'status': 'running',
+                    'started_at': now,
+                    'worker': self.worker_id,
+                    'lease_until': now + timedelta(seconds=LEASE_SECONDS)
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _run(self, job):
+        try:
+            account = self.db.accounts.find_one({'_id': ObjectId(job['account_id'])})
+            if not account:
+                result = {'success': False, 'message': '账号不存在'}
+            else:
+                with self.sessions.account_lock(job['account_id']):
+                    if job['kind'] == 'polish':
+                        result = self._polish(job['username'], account, job.get('product_ids'))
+                    else:
+                        result = self._daily(account)
+        except Exception as e:
+            result = {'success': False, 'message': f'任务执行出错: {str(e)}'}
+        finally:
+            with self.running_lock:
+                self.running.discard(job['_id'])
+
+        # 租约已被其它进程接手时不覆盖结果
+        self.db.scheduled_jobs.update_one(
+            {'_id': job['_id'], 'worker': self.worker_id},
+            {'$set': {
+                'status': 'done' if result['success'] else 'failed',
+                'result': result,
+                'finished_at': datetime.now()
+            }}
+        )
+
+    def _polish(self, username, account, product_ids=None):
+        """擦亮账号下的商品，未指定时擦亮全部在售商品"""
+        page, login_result = self.sessions.new_page(account)
+        if page is None:
+            return login_result
+
+        try:
+            page.goto('https://2.taobao.com/list/list.htm?type=onsale')
+            page.wait_for_load_state('networkidle')
+            if self.sessions.is_logged_out(page):
+                self.sessions.invalidate(account['_id'])
+                return {'success': False, 'message': '登录状态已失效'}
+
+            item_ids = None
+            if product_ids:
+                item_ids = {p['item_id'] for p in self.db.products.find(
+                    {'_id': {'$in': [ObjectId(pid) for pid in product_ids]}, 'username': username,
+                     'item_id': {'$exists': True}},
+                    {'item_id': 1}
+                )}
+
+            polished = 0
+            for item in page.query_selector_all('.item-row'):
+                if item_ids is not None and item.get_attribute('data-item-id') not in item_ids:
+                    continue
+                button = item.query_selector('.polish-btn')
+                if button:
+                    button.click()
+                    page.wait_for_timeout(random.randint(800, 2000))
+                    polished += 1
+
+            return {'success': True, 'message': f'成功擦亮 {polished} 个商品', 'count': polished}
+        finally:
+            page.close()
+
+    def _daily(self, account):
+        """领取日常任务奖励"""
+        page, login_result = self.sessions.new_page(account)
+        if page is None:
+            return login_result
+
+        try:
+            page.goto('https://2.taobao.com/task/index.htm')
+            page.wait_for_load_state('networkidle')
+            if self.sessions.is_logged_out(page):
+                self.sessions.invalidate(account['_id'])
+                return {'success': False, 'message': '登录状态已失效'}
+
+            completed = 0
+            for button in page.query_selector_all('.task-item .btn-receive'):
+                button.click()
+                page.wait_for_timeout(random.randint(800, 2000))
+                completed += 1
+
+            return {'success': True, 'message': f'完成 {completed} 个日常任务', 'count': completed}
+        finally:
+            page.close()
+
+    def get_report(self, username, date=None):
+        """按天和任务类型统计窗口达成情况"""
+        try:
+            day = date or datetime.now().strftime('%Y-%m-%d')
+            rows = self.db.scheduled_jobs.aggregate([
+                {'$match': {'username': username, 'date': day}},
+                {'$group': {
+                    '_id': '$kind',
+                    'total': {'$sum': 1},
+                    'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+                    'running': {'$sum': {'$cond': [{'$eq': ['$status', 'running']}, 1, 0]}},
+                    'done': {'$sum': {'$cond': [{'$eq': ['$status', 'done']}, 1, 0]}},
+                    'failed': {'$sum': {'$cond': [{'$in': ['$status', ['failed', 'interrupted']]}, 1, 0]}},
+                    'in_window': {'$sum': {'$cond': [
+                        {'$and': [
+                            {'$eq': ['$status', 'done']},
+                            {'$lte': ['$finished_at', '$window_end']}
+                        ]}, 1, 0
+                    ]}},
+                    'avg_delay': {'$avg': {'$cond': [
+                        {'$ifNull': ['$started_at', False]},
+                        {'$divide': [{'$subtract': ['$started_at', '$run_at']}, 1000]},
+                        None
+                    ]}},
+                    'max_delay': {'$max': {'$cond': [
+                        {'$ifNull': ['$started_at', False]},
+                        {'$divide': [{'$subtract': ['$started_at', '$run_at']}, 1000]},
+                        None
+                    ]}}
+                }}
+            ])
+
+            report = []
+            for row in rows:
+                row['kind'] = row.pop('_id')
+                row['window_rate'] = round(row['in_window'] / row['total'], 4) if row['total'] else 0
+                report.append(row)
+
+            return jsonify({
+                'success': True,
+                'date': day,
+                'report': report
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'获取调度报告失败: {str(e)}'
+            }), 500
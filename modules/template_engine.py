@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+from string import Formatter
+
+_formatter = Formatter()
+
+
+class CompiledTemplate:
+    """预编译模板：解析一次占位符，渲染时只做字段拼接"""
+
+    def __init__(self, content):
+        self.content = content
+        self.parts = []  # (原文, 字段名, 格式, 转换)
+        for literal, field, spec, conversion in _formatter.parse(content):
+            self.parts.append((literal, field, spec or '', conversion))
+        self.fields = {field for _, field, _, _ in self.parts if field}
+
+    def render(self, values, defaults=None):
+        """渲染模板，缺失字段依次取 defaults 和空字符串"""
+        defaults = defaults or {}
+        chunks = []
+        for literal, field, spec, conversion in self.parts:
+            chunks.append(literal)
+            if field is None:
+                continue
+            value = values.get(field)
+            if value is None:
+                value = defaults.get(field, '')
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            try:
+                chunks.append(format(value, spec))
+            except (ValueError, TypeError):
+                chunks.append(str(value))
+        return ''.join(chunks)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(content):
+    """按模板内容缓存编译结果"""
+    return CompiledTemplate(content)
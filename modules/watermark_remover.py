@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from flask import jsonify
+from modules.process_pool import create_pool
+
+DOWNLOAD_DIR = 'downloads'
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+MASK_SAMPLES = 16
+EDGE_THRESHOLD = 40
+EDGE_RATIO = 0.8
+CHUNK_SIZE = 64        # 同尺寸图片每次放入共享内存的张数
+MASK_FILE_CACHE = 16   # 缓存的掩码文件数
+
+
+def _inpaint_worker(args):
+    """在工作进程中对共享内存里的一帧图像原地去水印，返回耗时"""
+    frames_name, frames_shape, mask_name, mask_shape, index, radius = args
+    start = time.perf_counter()
+
+    frames_shm = shared_memory.SharedMemory(name=frames_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    try:
+        frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=frames_shm.buf)
+        mask = np.ndarray(mask_shape, dtype=np.uint8, buffer=mask_shm.buf)
+        frames[index] = cv2.inpaint(frames[index], mask, radius, cv2.INPAINT_TELEA)
+        del frames, mask
+    finally:
+        frames_shm.close()
+        mask_shm.close()
+
+    return index, time.perf_counter() - start
+
+
+def detect_mask(frames):
+    """根据同尺寸图片中位置固定的边缘检测水印区域（向量化计算）"""
+    sample = frames[:MASK_SAMPLES].astype(np.float32)
+    gray = sample @ np.array([0.114, 0.587, 0.299], dtype=np.float32)  # BGR灰度
+
+    grad = np.zeros_like(gray)
+    grad[:, 1:-1, :] += np.abs(gray[:, 2:, :] - gray[:, :-2, :])
+    grad[:, :, 1:-1] += np.abs(gray[:, :, 2:] - gray[:, :, :-2])
+
+    if len(sample) > 1:
+        # 多张图片中同一位置都有边缘，视为水印
+        mask = (grad > EDGE_THRESHOLD).mean(axis=0) >= EDGE_RATIO
+    else:
+        # 单张图片无法比对，退化为检测高亮且边缘明显的区域
+        mask = (gray[0] > 230) & (grad[0] > EDGE_THRESHOLD)
+
+    mask = mask.astype(np.uint8) * 255
+    return cv2.dilate(mask, np.ones((5, 5), np.uint8), iterations=2)
+
+
+class WatermarkRemover:
+    """批量去水印：每批图片按尺寸检测一次水印掩码，图像分块经共享内存交给进程池修复"""
+
+    def __init__(self, db, image_hash_index=None, workers=None):
+        self.db = db
+        self.image_hash_index = image_hash_index
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.mask_files = OrderedDict()  # (掩码路径, 修改时间) -> 灰度图
+        self.mask_lock = threading.Lock()
+
+    def _get_pool(self):
+        """获取进程池，懒加载模式"""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = create_pool(self.workers)
+            return self.pool
+
+    def _resolve_dir(self, username, folder):
+        """限制只能处理用户自己的下载目录"""
+        base = os.path.realpath(os.path.join(DOWNLOAD_DIR, username))
+        path = os.path.realpath(os.path.join(base, folder or ''))
+        if path != base and not path.startswith(base + os.sep):
+            return None
+        return path
+
+    def _read_mask(self, mask_path):
+        """读取掩码图片，按路径和修改时间缓存（LRU），文件被替换后重新读取；无法读取时返回 None"""
+        key = (mask_path, os.path.getmtime(mask_path))
+        with self.mask_lock:
+            if key in self.mask_files:
+                self.mask_files.move_to_end(key)
+                return self.mask_files[key]
+        mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+        with self.mask_lock:
+            self.mask_files[key] = mask
+            if len(self.mask_files) > MASK_FILE_CACHE:
+                self.mask_files.popitem(last=False)
+        return mask
+
+    def _get_mask(self, frames, mask_path=None):
+        """指定掩码文件时缩放到图片尺寸，否则从本批图片中检测"""
+        h, w = frames.shape[1:3]
+        if not mask_path:
+            return detect_mask(frames)
+        mask = cv2.resize(self._read_mask(mask_path), (w, h), interpolation=cv2.INTER_NEAREST)
+        return np.where(mask > 127, 255, 0).astype(np.uint8)
+
+    def _process_chunk(self, items, mask, output_dir, radius, results):
+        """把一块同尺寸图片放入共享内存交给进程池修复并写出"""
+        pool = self._get_pool()
+        frames_shape = (len(items),) + items[0][1].shape
+        frames_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(frames_shape)))
+        mask_shm = shared_memory.SharedMemory(create=True, size=mask.nbytes)
+        frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=frames_shm.buf)
+        shared_mask = np.ndarray(mask.shape, dtype=np.uint8, buffer=mask_shm.buf)
+        try:
+            for i, (_, img) in enumerate(items):
+                frames[i] = img
+            items = [path for path, _ in items]  # 解码后的图像已复制进共享内存，释放原图
+            shared_mask[:] = mask
+
+            jobs = [(frames_shm.name, frames_shape, mask_shm.name, mask.shape, i, radius)
+                    for i in range(len(items))]
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            for index, elapsed in pool.map(_inpaint_worker, jobs, chunksize=chunksize):
+                path = items[index]
+                cv2.imwrite(os.path.join(output_dir, os.path.basename(path)), frames[index])
+                results[path] = {
+                    'file': os.path.basename(path),
+                    'success': True,
+                    'seconds': round(elapsed, 4)
+                }
+        finally:
+            del frames, shared_mask
+            frames_shm.close()
+            frames_shm.unlink()
+            mask_shm.close()
+            mask_shm.unlink()
+
+    def remove_folder(self, paths, output_dir, radius=3, mask_path=None):
+        """对一组图片去水印，返回每张图片的耗时；同尺寸图片每 CHUNK_SIZE 张处理一次，内存占用不随目录大小增长"""
+        os.makedirs(output_dir, exist_ok=True)
+        groups = {}   # 尺寸 -> 待处理的 (路径, 图像)
+        masks = {}    # 尺寸 -> 本批的掩码，用该尺寸的第一块图片检测
+        results = {}
+
+        def flush(shape):
+            items = groups.pop(shape)
+            if shape not in masks:
+                frames = np.stack([img for _, img in items[:MASK_SAMPLES]])
+                masks[shape] = self._get_mask(frames, mask_path)
+                del frames
+            self._process_chunk(items, masks[shape], output_dir, radius, results)
+
+        for path in paths:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is None:
+                results[path] = {'file': os.path.basename(path), 'success': False, 'message': '无法读取图片'}
+                continue
+            groups.setdefault(img.shape, []).append((path, img))
+            if len(groups[img.shape]) >= CHUNK_SIZE:
+                flush(img.shape)
+        for shape in list(groups):
+            flush(shape)
+
+        return [results[path] for path in paths]
+
+    def batch_remove(self, username, data):
+        """批量去除下载目录中图片的水印"""
+        try:
+            input_dir = self._resolve_dir(username, data.get('input_dir'))
+            output_dir = self._resolve_dir(username, data.get('output_dir') or
+                                           f"{data.get('input_dir', '')}_clean")
+
+            if not input_dir or not output_dir or not os.path.isdir(input_dir):
+                return jsonify({
+                    'success': False,
+                    'message': '目录不存在或无权限访问'
+                }), 404
+
+            paths = sorted(
+                os.path.join(input_dir, name) for name in os.listdir(input_dir)
+                if name.lower().endswith(IMAGE_EXTS)
+            )
+            if not paths:
+                return jsonify({
+                    'success': False,
+                    'message': '目录中没有图片'
+                }), 400
+
+            mask_path = None
+            if data.get('mask_path'):
+                mask_path = self._resolve_dir(username, data['mask_path'])
+                if not mask_path or not os.path.isfile(mask_path):
+                    return jsonify({
+                        'success': False,
+                        'message': '掩码文件不存在或无权限访问'
+                    }), 404
+                if self._read_mask(mask_path) is None:
+                    return jsonify({
+                        'success': False,
+                        'message': '无法读取掩码图片'
+                    }), 400
+
+            start = time.perf_counter()
+            results = self.remove_folder(
+                paths, output_dir,
+                radius=int(data.get('radius', 3)),
+                mask_path=mask_path
+            )
+            elapsed = time.perf_counter() - start
+            success_count = sum(1 for r in results if r['success'])
+
+            now = datetime.now()
+            batch_id = self.db.materials.insert_one({
+                'username': username,
+                'type': 'watermark_batch',
+                'input_dir': input_dir,
+                'output_dir': output_dir,
+                'count': success_count,
+                'seconds': elapsed,
+                'created_at': now
+            }).inserted_id
+
+            # 去水印后的图片作为素材入库并建立相似索引
+            duplicates = {}
+            cleaned = [{
+                'username': username,
+                'type': 'image',
+                'category': 'watermark_clean',
+                'filename': r['file'],
+                'path': os.path.join(output_dir, r['file']),
+                'batch_id': batch_id,
+                'created_at': now
+            } for r in results if r['success']]
+            if cleaned:
+                material_ids = self.db.materials.insert_many(cleaned).inserted_ids
+                if self.image_hash_index is not None:
+                    duplicates = self.image_hash_index.index_materials(
+                        username, [(mid, m['path']) for mid, m in zip(material_ids, cleaned)]
+                    )
+
+            return jsonify({
+                'success': True,
+                'message': f'成功处理 {success_count} 张图片',
+                'seconds': round(elapsed, 3),
+                'images_per_second': round(success_count / elapsed, 2) if elapsed else 0,
+                'results': results,
+                'duplicates': {mid: found for mid, found in duplicates.items() if found}
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'批量去水印失败: {str(e)}'
+            }), 500
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 500     # 单个集合积累到该数量立即写入
+MAX_DELAY = 1.0     # 秒，最长缓冲时间
+MAX_HOLD = 30.0     # 秒，批处理暂缓定时写入时的最长缓冲时间
+
+
+class WriteBuffer:
+    """延迟批量写入：按集合收集写操作，达到数量或时间阈值时以无序 bulk_write 一次写入；
+    批处理期间可用 hold() 暂缓定时写入，批次结束或达到数量时写入"""
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db, max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_hold=MAX_HOLD):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_hold = max_hold
+        self.pending = defaultdict(list)
+        self.first_added = {}
+        self.holds = defaultdict(int)   # 集合 -> 进行中的批处理数
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stats = {
+            'flushes': 0,
+            'operations': 0,
+            'errors': 0,
+            'max_batch': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0
+        }
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls, db):
+        """同一数据库共用一个缓冲区"""
+        with cls._instances_lock:
+            key = id(db)
+            if key not in cls._instances:
+                cls._instances[key] = cls(db)
+            return cls._instances[key]
+
+    def add(self, collection, operation):
+        """加入一个写操作（InsertOne / UpdateOne 等）"""
+        with self.lock:
+            ops = self.pending[collection]
+            ops.append(operation)
+            self.first_added.setdefault(collection, time.time())
+            full = len(ops) >= self.max_batch
+        if full:
+            self.flush(collection)
+
+    @contextmanager
+    def hold(self, collection):
+        """批处理期间暂缓该集合的定时写入（最长 max_hold 秒），结束时写入"""
+        with self.lock:
+            self.holds[collection] += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.holds[collection] -= 1
+                if not self.holds[collection]:
+                    del self.holds[collection]
+            self.flush(collection)
+
+    def flush(self, collection=None):
+        """立即写入指定集合（不指定时为全部集合）的缓冲操作；
+        取出和写入都在 flush_lock 内，先取出的批次一定先写入，同一文档的写操作不会乱序"""
+        with self.flush_lock:
+            with self.lock:
+                names = [collection] if collection else list(self.pending)
+                batches = []
+                for name in names:
+                    ops = self.pending.pop(name, None)
+                    self.first_added.pop(name, None)
+                    if ops:
+                        batches.append((name, ops))
+
+            for name, ops in batches:
+                self._write(name, ops)
+
+    def _write(self, name, ops):
+        start = time.perf_counter()
+        try:
+            self.db[name].bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # 无序写入时单条失败（如唯一索引冲突）不影响其它操作
+            errors = e.details.get('writeErrors', [])
+            self.stats['errors'] += len(errors)
+            logger.warning('批量写入 %s 有 %d 条失败: %s', name, len(errors), '; '.join(
+                f"#{error.get('index')} code={error.get('code')} {error.get('errmsg', '')[:200]}" for error in errors[:5]
+            ))
+        except Exception as e:
+            self.stats['errors'] += len(ops)
+            logger.warning('批量写入 %s 失败: %s', name, e)
+        latency = time.perf_counter() - start
+
+        self.stats['flushes'] += 1
+        self.stats['operations'] += len(ops)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(ops))
+        self.stats['total_latency'] += latency
+        self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+
+    def _loop(self):
+        while not self.stop_event.wait(self.max_delay / 4):
+            now = time.time()
+            with self.lock:
+                due = [name for name, added in self.first_added.items()
+                       if now - added >= (self.max_hold if name in self.holds else self.max_delay)]
+            for name in due:
+                self.flush(name)
+
+    def get_stats(self):
+        flushes = self.stats['flushes']
+        with self.lock:
+            pending = sum(len(ops) for ops in self.pending.values())
+        return {
+            'flushes': flushes,
+            'operations': self.stats['operations'],
+            'errors': self.stats['errors'],
+            'pending': pending,
+            'avg_batch': round(self.stats['operations'] / flushes, 1) if flushes else 0,
+            'max_batch': self.stats['max_batch'],
+            'avg_latency_ms': round(self.stats['total_latency'] / flushes * 1000, 2) if flushes else 0,
+            'max_latency_ms': round(self.stats['max_latency'] * 1000, 2)
+        }
+
+    def close(self):
+        """退出时写入剩余操作"""
+        self.stop_event.set()
+        self.flush()
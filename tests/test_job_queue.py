@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""任务队列多进程测试：需要本地 mongod（MONGO_URI 可覆盖），连接不上时跳过"""
+
+import os
+import sys
+import uuid
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+
+pymongo = pytest.importorskip('pymongo')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.job_queue import JobQueue  # noqa: E402
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+WORKERS = 4
+ACCOUNTS = 6
+JOBS_PER_ACCOUNT = 10
+
+
+@pytest.fixture
+def db():
+    client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except pymongo.errors.PyMongoError:
+        pytest.skip('本地 mongod 不可用')
+    name = f'xianyu_tool_test_{uuid.uuid4().hex[:8]}'
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+def _work(db_name, worker_id, barrier):
+    """子进程：不断认领并完成任务，记录每次认领"""
+    client = pymongo.MongoClient(MONGO_URI)
+    db = client[db_name]
+    queue = JobQueue(db)
+    held = set()
+    barrier.wait()
+    idle = 0
+    while idle < 20:
+        job = queue.claim(worker_id, held)
+        if job is None:
+            idle += 1
+            continue
+        idle = 0
+        held.add(job['account_id'])
+        db.claims.insert_one({'job_id': job['_id'], 'account_id': job['account_id'], 'worker': worker_id})
+        queue.complete(job, True, {'worker': worker_id})
+    client.close()
+
+
+def test_jobs_claimed_once_and_accounts_stay_with_one_worker(db):
+    queue = JobQueue(db)
+    for account in range(ACCOUNTS):
+        for _ in range(JOBS_PER_ACCOUNT):
+            queue.enqueue('publish', 'tester', f'account-{account}', {})
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(WORKERS)
+    processes = [ctx.Process(target=_work, args=(db.name, f'worker-{i}', barrier)) for i in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    claims = list(db.claims.find())
+    assert len(claims) == ACCOUNTS * JOBS_PER_ACCOUNT
+    assert len({claim['job_id'] for claim in claims}) == len(claims)
+    assert db.automation_jobs.count_documents({'status': {'$ne': 'done'}}) == 0
+
+    # 账号租约未过期，同一账号的任务只会交给一个工作进程
+    owners = {}
+    for claim in claims:
+        owners.setdefault(claim['account_id'], set()).add(claim['worker'])
+    assert all(len(workers) == 1 for workers in owners.values())
+
+
+def test_expired_lease_is_reclaimed_and_stale_result_rejected(db):
+    queue = JobQueue(db)
+    queue.enqueue('ship', 'tester', 'account-0', {})
+
+    first = queue.claim('worker-a')
+    assert first is not None
+    assert queue.claim('worker-b') is None
+
+    # 模拟 worker-a 崩溃：任务和账号租约都过期
+    past = datetime.now() - timedelta(seconds=1)
+    db.automation_jobs.update_one({'_id': first['_id']}, {'$set': {'lease_until': past}})
+    db.account_leases.update_one({'_id': 'account-0'}, {'$set': {'lease_until': past}})
+
+    second = queue.claim('worker-b')
+    assert second is not None and second['_id'] == first['_id']
+    assert second['attempts'] == 2
+
+    assert queue.complete(first, True, {}) is False
+    assert queue.complete(second, True, {}) is True
+    assert db.automation_jobs.find_one({'_id': first['_id']})['status'] == 'done'
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""接口截获与DOM解析的夹具测试：同一批商品和订单走两条路径应得到一致的结果"""
+
+import os
+import sys
+from html.parser import HTMLParser
+
+import pytest
+
+pytest.importorskip('playwright')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.response_capture import (_decode, capture_json, parse_search_items, parse_order_rows,  # noqa: E402
+                                      SEARCH_API_PATTERNS)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+VOID_TAGS = {'img', 'br', 'input', 'meta', 'link', 'hr'}
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FakeElement:
+    """支持 tag.class / .class 选择器的最小DOM节点"""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.children = []
+        self.text = []
+        self.parent = parent
+
+    def _matches(self, selector):
+        tag, _, cls = selector.partition('.')
+        return (not tag or tag == self.tag) and (not cls or cls in self.attrs.get('class', '').split())
+
+    def _descendants(self):
+        for child in self.children:
+            yield child
+            yield from child._descendants()
+
+    def query_selector_all(self, selector):
+        return [el for el in self._descendants() if el._matches(selector)]
+
+    def query_selector(self, selector):
+        found = self.query_selector_all(selector)
+        return found[0] if found else None
+
+    def text_content(self):
+        return ''.join(self.text) + ''.join(child.text_content() for child in self.children)
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.root = FakeElement('document', {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = FakeElement(tag, attrs, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_TAGS:
+            self.current = element
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_TAGS and self.current.parent is not None:
+            self.current = self.current.parent
+
+    def handle_data(self, data):
+        self.current.text.append(data)
+
+
+class FakeResponse:
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def text(self):
+        return self.body
+
+
+class FakePage:
+    """模拟页面：goto 时按顺序触发响应事件，DOM 来自 HTML 夹具"""
+
+    def __init__(self, html='', responses=()):
+        builder = _TreeBuilder()
+        builder.feed(html)
+        self.document = builder.root
+        self.responses = list(responses)
+        self.listeners = []
+        self.visited = []
+
+    def on(self, event, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, event, callback):
+        self.listeners.remove(callback)
+
+    def expect_response(self, predicate, timeout=None):
+        page = self
+
+        class _Waiter:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc, tb):
+                if exc_type is None and not any(predicate(r) for r in page.responses):
+                    from playwright.sync_api import TimeoutError
+                    raise TimeoutError('Timeout exceeded while waiting for event "response"')
+                return False
+        return _Waiter()
+
+    def goto(self, url, wait_until=None):
+        self.visited.append(url)
+        for response in self.responses:
+            for callback in list(self.listeners):
+                callback(response)
+
+    def wait_for_load_state(self, state=None, timeout=None):
+        pass
+
+    def query_selector_all(self, selector):
+        return self.document.query_selector_all(selector)
+
+
+def test_search_api_path():
+    page = FakePage(responses=[
+        FakeResponse('https://g.alicdn.com/static/app.js', 'console.log(1)'),
+        FakeResponse('https://h5api.m.goofish.com/h5/mtop.taobao.idlefish.search/1.0/', _fixture('search_api.jsonp'))
+    ])
+    items = parse_search_items(capture_json(page, 'https://2.taobao.com/search.htm?q=x', SEARCH_API_PATTERNS))
+
+    assert [item['item_id'] for item in items] == ['1001', '1002', '1003']
+    keyboard, monitor, no_image = items
+    assert keyboard['price'] == 199.0 and keyboard['want_count'] == 12
+    assert keyboard['image'] == 'https://img.alicdn.com/a.jpg'
+    assert keyboard['link'] == 'https://2.taobao.com/item.htm?id=1001'
+    # 图片和链接为对象或数组时取出地址
+    assert monitor['price'] == 1299.0
+    assert monitor['image'] == 'https://img.alicdn.com/b.jpg'
+    assert monitor['link'] == 'https://2.taobao.com/item.htm?id=1002'
+    # 非字符串且无法取出地址的字段置空，不抛出异常
+    assert no_image['image'] == '' and no_image['price'] == 5.0
+    assert not page.listeners
+
+
+def test_capture_without_matching_response_returns_nothing():
+    page = FakePage(responses=[FakeResponse('https://example.com/other', '{}')])
+    assert capture_json(page, 'https://2.taobao.com/search.htm', SEARCH_API_PATTERNS, timeout=10) == []
+    assert not page.listeners
+
+
+def test_search_dom_fallback_matches_api_fields():
+    for module in ('pandas', 'flask', 'flask_jwt_extended', 'bson', 'pymongo'):
+        pytest.importorskip(module)
+    from modules.product_manager import ProductManager
+
+    manager = ProductManager.__new__(ProductManager)  # 只用到解析方法，不初始化浏览器和数据库
+    page = FakePage(html=_fixture('search_page.html'))
+    products = manager._load_hot_products(page, 'https://2.taobao.com/search.htm?q=x')
+
+    # 没有截获接口响应时退回DOM解析，解析失败的卡片被跳过
+    assert page.visited == ['https://2.taobao.com/search.htm?q=x']
+    assert [p['item_id'] for p in products] == ['1001', '1002']
+    assert products[0] == {
+        'title': '九成新 机械键盘',
+        'price': 199.0,
+        'want_count': 12,
+        'item_id': '1001',
+        'image': 'https://img.alicdn.com/a.jpg',
+        'link': 'https://2.taobao.com/item.htm?itemid=1001&spm=a'
+    }
+    assert products[1]['image'] == '' and products[1]['want_count'] == 0
+
+    api_items = parse_search_items([_decode(_fixture('search_api.jsonp'))])
+    assert set(products[0]) == set(api_items[0])
+
+
+def test_order_api_and_dom_paths_agree():
+    for module in ('pandas', 'flask', 'flask_jwt_extended', 'bson', 'pymongo'):
+        pytest.importorskip(module)
+    from modules.order_processor import OrderProcessor
+
+    processor = OrderProcessor.__new__(OrderProcessor)
+    api_page = FakePage(responses=[
+        FakeResponse('https://h5api.m.goofish.com/h5/mtop.idle.trade.sold.list/1.0/', _fixture('sold_api.json'))
+    ])
+    dom_page = FakePage(html=_fixture('sold_page.html'))
+
+    api_rows = processor._load_sold_rows(api_page)
+    dom_rows = processor._load_sold_rows(dom_page, mode='dom')
+
+    # 没有状态的对象不算订单；两条路径的字段和指纹一致，切换解析方式不会产生虚假的变更
+    assert [row['order_id'] for row in api_rows] == ['3001', '3002']
+    assert api_rows == dom_rows
+
+
+def test_order_rows_require_status():
+    rows = parse_order_rows([{'list': [{'orderId': 1, 'title': 'x'}, {'orderId': 2, 'status': 'ok'}]}])
+    assert [row['order_id'] for row in rows] == ['2']
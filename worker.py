@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import uuid
+import signal
+import socket
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from pymongo import MongoClient
+from modules.product_manager import ProductManager
+from modules.order_processor import OrderProcessor
+from modules.account_sessions import AccountSessions
+from modules.image_hash_index import ImageHashIndex
+from modules.job_queue import JobQueue, LEASE_SECONDS, ACCOUNT_LEASE_SECONDS
+
+logger = logging.getLogger('worker')
+
+
+class AutomationWorker:
+    """自动化工作进程：认领发布、发货、抓单任务并在本机浏览器中执行，可在多台主机上同时运行；
+    持有账号亲和租约期间保留该账号的已登录会话，同一账号的后续任务不再重新登录"""
+
+    def __init__(self, db, concurrency=2):
+        self.db = db
+        self.queue = JobQueue(db)
+        self.concurrency = concurrency
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.product_manager = ProductManager(db)
+        self.order_processor = OrderProcessor(db, self.product_manager)
+        self.sessions = AccountSessions(self.product_manager)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.running = {}        # 任务ID -> 任务
+        self.accounts = {}       # 持有的账号ID -> 最近使用时间
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        logger.info('工作进程 %s 启动，并发数 %d', self.worker_id, self.concurrency)
+        heartbeat = threading.Thread(target=self._heartbeat_loop)
+        heartbeat.daemon = True
+        heartbeat.start()
+
+        try:
+            while not self.stop_event.is_set():
+                with self.lock:
+                    idle = len(self.running) < self.concurrency
+                    held = list(self.accounts)
+                job = self.queue.claim(self.worker_id, held) if idle else None
+                if job is None:
+                    self.stop_event.wait(2)
+                    continue
+                with self.lock:
+                    self.running[job['_id']] = job
+                    self.accounts[job['account_id']] = time.time()
+                self.executor.submit(self._execute, job)
+        finally:
+            self._close_sessions()
+            self.executor.shutdown(wait=True)
+            self.queue.release(self.worker_id)
+            self.product_manager.write_buffer.close()
+            logger.info('批量写入统计: %s', self.product_manager.write_buffer.get_stats())
+            logger.info('工作进程 %s 已退出', self.worker_id)
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def _close_sessions(self):
+        """浏览器按线程持有，须在各执行线程内关闭；屏障让每个线程恰好执行一次关闭"""
+        barrier = threading.Barrier(self.concurrency)
+
+        def close():
+            barrier.wait()
+            self.sessions.close()
+
+        for future in [self.executor.submit(close) for _ in range(self.concurrency)]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning('关闭浏览器失败: %s', e)
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(LEASE_SECONDS / 4):
+            try:
+                now = time.time()
+                with self.lock:
+                    jobs = list(self.running.values())
+                    # 长时间没有任务的账号不再续约，让其它进程可以接手
+                    for account_id, used_at in list(self.accounts.items()):
+                        busy = any(job['account_id'] == account_id for job in jobs)
+                        if not busy and now - used_at > ACCOUNT_LEASE_SECONDS / 2:
+                            del self.accounts[account_id]
+                    accounts = list(self.accounts)
+                self.queue.heartbeat(self.worker_id, jobs, accounts)
+                self.queue.sweep()
+            except Exception as e:
+                logger.warning('续约失败: %s', e)
+
+    def _execute(self, job):
+        try:
+            success, result = self._dispatch(job)
+        except Exception as e:
+            success, result = False, {'message': f'任务执行出错: {str(e)}'}
+        finally:
+            with self.lock:
+                self.running.pop(job['_id'], None)
+                self.accounts[job['account_id']] = time.time()
+
+        if not self.queue.complete(job, success, result):
+            logger.warning('任务 %s 的租约已被其它进程接手，结果未写入', job['_id'])
+
+    def _dispatch(self, job):
+        payload = job.get('payload') or {}
+        account = self.db.accounts.find_one({
+            '_id': ObjectId(job['account_id']),
+            'username': job['username']
+        })
+        if not account:
+            return False, {'message': '账号不存在或无权限使用'}
+
+        # 会话按线程持有浏览器，同一账号的任务串行执行
+        with self.sessions.account_lock(job['account_id']):
+            if job['kind'] == 'publish':
+                results = self.product_manager.run_publish_task(
+                    job['username'], account, payload.get('product_ids', []),
+                    payload.get('region', 'random'), payload.get('delay', 0),
+                    payload.get('fallback_account_ids', []), payload.get('deferrals', 0),
+                    sessions=self.sessions
+                )
+                return True, {'results': results}
+
+            if job['kind'] == 'ship':
+                results = self.order_processor.run_shipping_task(
+                    job['username'], account, payload.get('order_ids', []),
+                    payload.get('logistics_company'), payload.get('logistics_number'),
+                    payload.get('deferrals', 0), sessions=self.sessions
+                )
+                return True, {'results': results}
+
+            if job['kind'] == 'fetch_orders':
+                result = self.order_processor.fetch_orders(job['username'], job['account_id'], sessions=self.sessions)
+                result['orders'] = len(result.get('orders', []))
+                return result['success'], result
+
+        return False, {'message': f"未知的任务类型: {job['kind']}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='咸鱼自动化工作进程')
+    parser.add_argument('--mongo', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('WORKER_CONCURRENCY', 2)))
+    parser.add_argument('--backfill-hashes', nargs='?', const='', metavar='USERNAME',
+                        help='为尚未计算哈希的素材补算哈希后退出，不指定用户时处理全部用户')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    client = MongoClient(args.mongo)
+    if args.backfill_hashes is not None:
+        updated = ImageHashIndex(client['xianyu_tool']).backfill(args.backfill_hashes or None)
+        logger.info('成功补算 %d 个素材的哈希', updated)
+        return 0
+
+    worker = AutomationWorker(client['xianyu_tool'], args.concurrency)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())